@@ -0,0 +1,214 @@
+import ast
+import struct
+import sys
+import zipfile
+from array import array
+
+import cliente_def
+import estoque_def
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# ---------------------------------------------------------------------------
+# Exportação colunar para análise.
+# Em vez de trazer 'mercadoria' e 'estoque' como uma lista de tuplas (um objeto
+# Python por valor), as linhas são lidas em blocos e guardadas coluna a coluna
+# em vetores tipados (array.array): inteiros em 'q', reais em 'd' e textos
+# codificados por dicionário (um vetor de códigos 'I' mais a lista de valores
+# distintos). As funções de soma e agrupamento usam NumPy sempre que ele pode
+# ser importado. Sem ele, elas são laços comuns em Python sobre os vetores
+# tipados: o ganho em relação às tuplas fica só na memória, não no tempo.
+# ---------------------------------------------------------------------------
+
+# Colunas numéricas de cada tabela e o tipo do vetor; as demais são texto
+TIPOS_NUMERICOS = {
+    'mercadoria': {'id': 'q', 'quantidade': 'q', 'valor_unitario': 'd', 'valor_total': 'd'},
+    'estoque': {'quantidade': 'q', 'preco': 'd'},
+}
+
+# ---------------------------------------------------------------------------
+# Classe: ColunaTexto
+# Descrição: Coluna de texto codificada por dicionário: 'codigos[i]' é a posição
+# do valor da linha i em 'valores'.
+# ---------------------------------------------------------------------------
+class ColunaTexto:
+    def __init__(self, codigos=None, valores=None):
+        self.codigos = codigos if codigos is not None else array('I')
+        self.valores = valores if valores is not None else []
+        self._posicoes = {valor: i for i, valor in enumerate(self.valores)}
+
+    def estender(self, textos):
+        posicoes = self._posicoes
+        for texto in set(textos).difference(posicoes):
+            posicoes[texto] = len(self.valores)
+            self.valores.append(texto)
+        self.codigos.extend(map(posicoes.__getitem__, textos))
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def __getitem__(self, i):
+        return self.valores[self.codigos[i]]
+
+# ---------------------------------------------------------------------------
+# Função: exportar_colunas(tabela='mercadoria', colunas=None, tamanho_bloco=50000, canceladas=False)
+# Descrição: Lê a tabela ('mercadoria' ou 'estoque') em blocos de
+# 'tamanho_bloco' linhas e retorna um dicionário nome da coluna -> vetor
+# (array.array para números, ColunaTexto para textos). 'colunas' limita as
+# colunas lidas. A memória usada é a dos vetores, sem tuplas por linha.
+# Vendas canceladas só entram com canceladas=True.
+# ---------------------------------------------------------------------------
+def exportar_colunas(tabela='mercadoria', colunas=None, tamanho_bloco=50000, canceladas=False):
+    if tabela == 'mercadoria':
+        modulo, todas = cliente_def, cliente_def.COLUNAS_MERCADORIA
+    elif tabela == 'estoque':
+        modulo, todas = estoque_def, estoque_def.COLUNAS_ESTOQUE
+    else:
+        raise ValueError(f"Tabela inválida: {tabela}")
+    colunas = tuple(colunas or todas)
+    invalidas = [c for c in colunas if c not in todas]
+    if invalidas:
+        raise ValueError(f"Coluna inválida: {', '.join(invalidas)}")
+
+    tipos = TIPOS_NUMERICOS[tabela]
+    resultado = {c: array(tipos[c]) if c in tipos else ColunaTexto() for c in colunas}
+    vetores = [resultado[c] for c in colunas]
+
+    conn, cursor = modulo.conectar()
+    filtro = " WHERE cancelada_em IS NULL" if tabela == 'mercadoria' and not canceladas else ""
+    cursor.execute(f"SELECT {', '.join(colunas)} FROM {tabela}{filtro}")
+    while True:
+        bloco = cursor.fetchmany(tamanho_bloco)
+        if not bloco:
+            return resultado
+        for vetor, valores in zip(vetores, zip(*bloco)):
+            if isinstance(vetor, ColunaTexto):
+                vetor.estender(valores)
+            elif None not in valores:
+                vetor.extend(valores)
+            else:
+                nulo = float('nan') if vetor.typecode == 'd' else 0
+                vetor.extend(nulo if v is None else v for v in valores)
+
+# ---------------------------------------------------------------------------
+# Função: salvar_colunas(colunas, caminho) / carregar_colunas(caminho)
+# Descrição: Grava e lê um instantâneo colunar no formato .npz do NumPy (um
+# arquivo zip com um .npy por vetor), legível também por numpy.load. Cada
+# coluna numérica vira '<nome>.npy'; uma coluna de texto vira '<nome>.npy'
+# com os códigos e '<nome>.valores.npy' com o dicionário (texto Unicode; a
+# posição de um valor nulo, se houver, fica em '<nome>.nulo.npy'). Os
+# vetores são gravados em little-endian, com a ordem dos bytes no cabeçalho de
+# cada .npy, e convertidos para a ordem da máquina na leitura. Não depende do
+# NumPy.
+# ---------------------------------------------------------------------------
+def salvar_colunas(colunas, caminho):
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_STORED) as arquivo:
+        for nome, vetor in colunas.items():
+            if isinstance(vetor, ColunaTexto):
+                valores = ['' if valor is None else str(valor) for valor in vetor.valores]
+                largura = max(map(len, valores), default=1) or 1
+                textos = b''.join(valor.ljust(largura, '\0').encode('utf-32-le') for valor in valores)
+                arquivo.writestr(f'{nome}.valores.npy', _npy(f'<U{largura}', len(valores), textos))
+                if None in vetor.valores:
+                    arquivo.writestr(f'{nome}.nulo.npy', _npy('<i8', 1, struct.pack('<q', vetor.valores.index(None))))
+                vetor = vetor.codigos
+            if sys.byteorder == 'big':
+                vetor = array(vetor.typecode, vetor)
+                vetor.byteswap()
+            arquivo.writestr(f'{nome}.npy', _npy(f'<{TIPOS_NPY[vetor.typecode]}', len(vetor), vetor.tobytes()))
+
+
+def carregar_colunas(caminho):
+    vetores, dicionarios, nulos = {}, {}, {}
+    with zipfile.ZipFile(caminho) as arquivo:
+        for entrada in arquivo.namelist():
+            nome = entrada[:-len('.npy')]
+            descr, tamanho, dados = _ler_npy(arquivo.read(entrada))
+            if nome.endswith('.valores'):
+                largura = int(descr[2:])
+                textos = dados.decode('utf-32-le' if descr[0] == '<' else 'utf-32-be')
+                dicionarios[nome[:-len('.valores')]] = [textos[i:i + largura].rstrip('\0')
+                                                        for i in range(0, tamanho * largura, largura)]
+                continue
+            if nome.endswith('.nulo'):
+                nulos[nome[:-len('.nulo')]] = struct.unpack(descr[0] + 'q', dados[:8])[0]
+                continue
+            typecode = next((tipo for tipo, codigo in TIPOS_NPY.items() if codigo == descr[1:]), None)
+            if typecode is None:
+                raise ValueError(f"Tipo de coluna não suportado em {entrada}: {descr}")
+            vetor = array(typecode, dados)
+            if descr[0] != ('<' if sys.byteorder == 'little' else '>'):
+                vetor.byteswap()
+            vetores[nome] = vetor
+    for nome, posicao in nulos.items():
+        dicionarios[nome][posicao] = None
+    return {nome: ColunaTexto(vetor, dicionarios[nome]) if nome in dicionarios else vetor
+            for nome, vetor in vetores.items()}
+
+
+# Tipo do array.array -> tipo do NumPy (sem a ordem dos bytes)
+TIPOS_NPY = {'q': 'i8', 'd': 'f8', 'I': 'u4'}
+
+
+def _npy(descr, tamanho, dados):
+    cabecalho = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({tamanho},), }}"
+    cabecalho += ' ' * (-(len(cabecalho) + 11) % 64) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(cabecalho)) + cabecalho.encode('latin-1') + dados
+
+
+def _ler_npy(conteudo):
+    if conteudo[:6] != b'\x93NUMPY':
+        raise ValueError("Arquivo .npy inválido.")
+    versao = conteudo[6]
+    formato, inicio = ('<H', 10) if versao == 1 else ('<I', 12)
+    tamanho_cabecalho = struct.unpack(formato, conteudo[8:inicio])[0]
+    cabecalho = ast.literal_eval(conteudo[inicio:inicio + tamanho_cabecalho].decode('latin-1'))
+    if cabecalho['fortran_order'] or len(cabecalho['shape']) != 1:
+        raise ValueError("Só vetores de uma dimensão são suportados.")
+    return cabecalho['descr'], cabecalho['shape'][0], conteudo[inicio + tamanho_cabecalho:]
+
+# ---------------------------------------------------------------------------
+# Função: somar(vetor)
+# Descrição: Soma um vetor numérico (ex.: receita total = somar(colunas['valor_total'])).
+# ---------------------------------------------------------------------------
+def somar(vetor):
+    if numpy is not None:
+        return numpy.frombuffer(vetor, dtype=vetor.typecode).sum().item()
+    return sum(vetor)
+
+# ---------------------------------------------------------------------------
+# Função: somar_por(chave, valores)
+# Descrição: Agrupa 'valores' (vetor numérico) pela coluna de texto 'chave' e
+# retorna um dicionário valor da chave -> soma. Com NumPy usa bincount sobre
+# os códigos do dicionário, sem laço em Python.
+# ---------------------------------------------------------------------------
+def somar_por(chave, valores):
+    if numpy is not None:
+        codigos = numpy.frombuffer(chave.codigos, dtype=numpy.uint32)
+        pesos = numpy.frombuffer(valores, dtype=valores.typecode)
+        somas = numpy.bincount(codigos, weights=pesos, minlength=len(chave.valores)).tolist()
+    else:
+        somas = [0] * len(chave.valores)
+        for codigo, valor in zip(chave.codigos, valores):
+            somas[codigo] += valor
+    return dict(zip(chave.valores, somas))
+
+# ---------------------------------------------------------------------------
+# Função: receita_por(coluna, colunas=None)
+# Descrição: Atalho para a receita (soma de valor_total) de 'mercadoria'
+# agrupada por uma coluna de texto (tipo, marca, modelo, serie, cpf...).
+# ---------------------------------------------------------------------------
+def receita_por(coluna, colunas=None):
+    colunas = colunas or exportar_colunas('mercadoria', (coluna, 'valor_total'))
+    return somar_por(colunas[coluna], colunas['valor_total'])
+
+# ---------------------------------------------------------------------------
+# Função: quantidade_por(coluna, colunas=None)
+# Descrição: Unidades vendidas (soma de quantidade) agrupadas por uma coluna de texto.
+# ---------------------------------------------------------------------------
+def quantidade_por(coluna, colunas=None):
+    colunas = colunas or exportar_colunas('mercadoria', (coluna, 'quantidade'))
+    return somar_por(colunas[coluna], colunas['quantidade'])
@@ -1,6 +1,7 @@
 
-from cliente_def import cadastrar_produto, listar_produtos_cliente, atualizar_produto, deletar_produto
-from estoque_def import produto_existe, adicionar_produto, listar_produtos as listar_estoque, \
+from cliente_def import iterar_vendas, atualizar_venda, deletar_venda
+from venda_def import vender, cancelar_venda
+from estoque_def import produto_existe, adicionar_produto, iterar_estoque, \
     atualizar_produto as atualizar_estoque, excluir_produto, consultar_produto_por_serie
 from datetime import datetime
 
@@ -21,21 +22,30 @@ def validar_numero_input(prompt, tipo=float, valor_default=None):
             print("Valor inválido. Por favor, insira um número válido.")
 
 # ---------------------------------------------------------------------------
-# Função: cancelar_compra(serie, quantidade_cancelada, preco_unitario)
-# Descrição: Cancela a compra de um produto. Através da série do produto, recupera
-# os dados do estoque, soma a quantidade cancelada de volta ao estoque e atualiza o registro.
+# Função: paginar(linhas, tamanho_pagina=20)
+# Descrição: Imprime as linhas de um iterador em páginas de 'tamanho_pagina'.
+# Ao fim de cada página pergunta se o usuário quer continuar, assim só a página
+# atual é lida do banco. Retorna a quantidade de linhas exibidas.
 # ---------------------------------------------------------------------------
-def cancelar_compra(serie, quantidade_cancelada, preco_unitario):
-    resultado = consultar_produto_por_serie(serie)
-    if resultado:
-        # Estrutura do estoque:
-        # índice 0: série, 1: tipo, 2: marca, 3: modelo, 4: quantidade, 5: preço, 6: data/hora
-        estoque_atual = resultado[4]
-        novo_estoque = estoque_atual + quantidade_cancelada
-        atualizar_estoque(serie, resultado[1], resultado[2], resultado[3], novo_estoque, preco_unitario)
-        print(f"Compra cancelada. {quantidade_cancelada} unidades retornaram ao estoque.")
-    else:
-        print("Erro: Produto não encontrado no estoque.")
+def paginar(linhas, tamanho_pagina=20):
+    exibidas = 0
+    for linha in linhas:
+        print(linha)
+        exibidas += 1
+        if exibidas % tamanho_pagina == 0:
+            if input("Enter para a próxima página, 'q' para sair: ").strip().lower() == "q":
+                break
+    return exibidas
+
+# ---------------------------------------------------------------------------
+# Função: cancelar_compra(id_venda)
+# Descrição: Cancela a compra de id 'id_venda'. A venda é marcada como cancelada
+# e a quantidade volta ao estoque por um movimento de cancelamento, na mesma
+# transação e sem alterar o preço do produto; cancelar de novo a mesma compra
+# não devolve a quantidade outra vez (ver venda_def.cancelar_venda).
+# ---------------------------------------------------------------------------
+def cancelar_compra(id_venda):
+    return cancelar_venda(id_venda)
 
 # ---------------------------------------------------------------------------
 # Função: menu()
@@ -62,18 +72,15 @@ def menu():
 
         # -----------------------------------------------------------------------
         # Opção 1: Venda
-        # Solicita informações do cliente e do produto, valida a existência e quantidade
-        # no estoque e registra a compra utilizando datas no formato DD/MM/AAAA ou
-        # DD/MM/AAAA HH:MM:SS.
+        # Solicita informações do cliente e do produto, mostra o resumo da compra e
+        # registra a venda com vender(), que baixa o estoque e grava a compra em uma
+        # única transação. Datas no formato DD/MM/AAAA ou DD/MM/AAAA HH:MM:SS.
         # -----------------------------------------------------------------------
         if opcao == "1":
             cpf = input("CPF: ").strip()
             nome = input("Nome: ").strip()
             data_nascimento = input("Data de nascimento (DD/MM/AAAA): ").strip()
             serie = input("Série: ").strip()
-            tipo = input("Tipo: ").strip()
-            marca = input("Marca: ").strip()
-            modelo = input("Modelo: ").strip()
 
             quantidade = validar_numero_input("Quantidade (obrigatório): ", tipo=int)
 
@@ -84,7 +91,7 @@ def menu():
                 continue
 
             # Estrutura do estoque: [0]=série, [1]=tipo, [2]=marca, [3]=modelo, [4]=quantidade, [5]=preço, [6]=data/hora
-            preco_unitario_estoque = int(resultado[5])
+            preco_unitario_estoque = resultado[5]
             estoque_atual = resultado[4]
 
             if estoque_atual < quantidade:
@@ -107,23 +114,22 @@ def menu():
             if not data_compra:
                 data_compra = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
 
-            # Registra a compra
-            cadastrar_produto(cpf, nome, serie, tipo, marca, modelo, quantidade, preco_unitario_estoque, data_compra, data_nascimento)
-
-            # Atualiza o estoque
-            atualizar_estoque(serie, tipo, marca, modelo, estoque_atual - quantidade, preco_unitario_estoque)
+            # Registra a compra e baixa o estoque; a quantidade é conferida de novo
+            # dentro da transação, pois outro terminal pode ter vendido nesse meio tempo
+            vender(serie, cpf, nome, data_nascimento, quantidade, data_compra)
 
         # -----------------------------------------------------------------------
-        # Opção 2: Listar produtos do cliente
+        # Opção 2: Listar produtos do cliente (paginado)
         # -----------------------------------------------------------------------
         elif opcao == "2":
-            listar_produtos_cliente()
+            if not paginar(iterar_vendas(tamanho_pagina=20)):
+                print("Nenhum produto encontrado.")
 
         # -----------------------------------------------------------------------
-        # Opção 3: Atualizar produto do cliente
+        # Opção 3: Atualizar venda (pelo id mostrado na listagem)
         # -----------------------------------------------------------------------
         elif opcao == "3":
-            cpf = input("CPF do produto a ser atualizado: ").strip()
+            id_venda = validar_numero_input("ID da venda a ser atualizada: ", tipo=int)
             nome = input("Novo Nome (Enter para manter): ").strip() or None
             data_nascimento = input("Nova Data de Nascimento (DD/MM/AAAA) [Enter para manter]: ").strip() or None
             serie = input("Nova Série (Enter para manter): ").strip() or None
@@ -139,14 +145,14 @@ def menu():
 
             data_compra = input("Nova Data da compra (DD/MM/AAAA HH:MM:SS) [Enter para manter]: ").strip() or None
 
-            atualizar_produto(cpf, nome, data_nascimento, serie, tipo, marca, modelo, quantidade, preco, data_compra)
+            atualizar_venda(id_venda, nome, data_nascimento, serie, tipo, marca, modelo, quantidade, preco, data_compra)
 
         # -----------------------------------------------------------------------
-        # Opção 4: Deletar produto do cliente
+        # Opção 4: Deletar venda (pelo id mostrado na listagem)
         # -----------------------------------------------------------------------
         elif opcao == "4":
-            cpf = input("Digite o CPF do produto a ser excluído: ").strip()
-            deletar_produto(cpf)
+            id_venda = validar_numero_input("Digite o ID da venda a ser excluída: ", tipo=int)
+            deletar_venda(id_venda)
 
         # -----------------------------------------------------------------------
         # Opção 5: Adicionar produto ao estoque
@@ -166,11 +172,10 @@ def menu():
                 adicionar_produto(serie, tipo, marca, modelo, quantidade, preco)
 
         # -----------------------------------------------------------------------
-        # Opção 6: Listar produtos do estoque
+        # Opção 6: Listar produtos do estoque (paginado)
         # -----------------------------------------------------------------------
         elif opcao == "6":
-            produtos = listar_estoque()
-            if not produtos:
+            if not paginar(iterar_estoque(tamanho_pagina=20)):
                 print("Nenhum produto encontrado no estoque.")
 
         # -----------------------------------------------------------------------
@@ -0,0 +1,1327 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# ---------------------------------------------------------------------------
+# Os módulos cliente_def e estoque_def usam 'cliente.db' e 'estoque.db' do
+# diretório atual, ou do diretório em SQL_PROJETO_BANCOS. Para não tocar nos
+# bancos reais, a execução pela linha de comando ignora a variável e roda o
+# benchmark em um diretório temporário, apagado no final (ver __main__).
+# Importar este módulo não muda o diretório atual.
+# ---------------------------------------------------------------------------
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+# ---------------------------------------------------------------------------
+# Função: gerar_vendas(n)
+# Descrição: Gera n registros de venda sintéticos no formato de cadastrar_produto.
+# ---------------------------------------------------------------------------
+def gerar_vendas(n):
+    for i in range(n):
+        yield (f"{i % 100000:011d}", f"CLIENTE {i % 100000}", f"S{i % 500:04d}", "CELULAR", "SAMSUNG",
+               "S23", 1 + i % 5, 1000.0 + i % 50, "31/03/2025 19:47:51", "04/10/2003")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_lote(n)
+# Descrição: Compara linhas por segundo entre cadastrar_produto (um commit por
+# venda) e cadastrar_produtos_em_lote (executemany em uma única transação).
+# ---------------------------------------------------------------------------
+def bench_lote(n):
+    import contextlib
+    import io
+    import cliente_def
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        for venda in gerar_vendas(n):
+            cliente_def.cadastrar_produto(*venda)
+        por_linha = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        cliente_def.cadastrar_produtos_em_lote(gerar_vendas(n))
+        em_lote = time.perf_counter() - inicio
+
+    print(f"cadastrar_produto:          {n / por_linha:12.0f} linhas/s")
+    print(f"cadastrar_produtos_em_lote: {n / em_lote:12.0f} linhas/s")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_estresse_venda(n)
+# Descrição: Vários processos disputam o mesmo produto chamando vender() até o
+# estoque acabar. Confere que nenhuma unidade foi vendida além do estoque e que
+# cada unidade baixada tem exatamente uma venda registrada.
+# ---------------------------------------------------------------------------
+def _vender_ate_acabar(serie):
+    import contextlib
+    import io
+    import venda_def
+
+    vendidas = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while True:
+            resposta = venda_def.vender(serie, "00000000000", "CLIENTE", "01/01/2000", 1, tentativas=50)
+            if resposta.startswith("Venda"):
+                vendidas += 1
+            elif "insuficiente" in resposta:
+                return vendidas
+
+
+def bench_estresse_venda(n, processos=8):
+    import multiprocessing
+    import sqlite3
+    import conexao
+    import venda_def  # noqa: F401
+
+    conexao.preparar('estoque')
+    with sqlite3.connect('estoque.db') as conn:
+        conn.execute("INSERT INTO estoque (serie, tipo, marca, modelo, quantidade, preco) VALUES ('X1', 'T', 'M', 'X', ?, 10.0)", (n,))
+
+    inicio = time.perf_counter()
+    with multiprocessing.Pool(processos) as pool:
+        vendidas = sum(pool.map(_vender_ate_acabar, ['X1'] * processos))
+    duracao = time.perf_counter() - inicio
+
+    restante = sqlite3.connect('estoque.db').execute("SELECT quantidade FROM estoque WHERE serie = 'X1'").fetchone()[0]
+    registradas = sqlite3.connect('cliente.db').execute("SELECT COALESCE(SUM(quantidade), 0) FROM mercadoria WHERE serie = 'X1'").fetchone()[0]
+    print(f"{processos} processos: {vendidas} vendas em {duracao:.2f}s ({vendidas / duracao:.0f} vendas/s)")
+    print(f"estoque inicial={n} restante={restante} vendas registradas={registradas}")
+    if restante != 0 or vendidas != n or registradas != n:
+        sys.exit("Falha: estoque vendido além do disponível ou vendas perdidas!")
+    print("OK: nenhuma venda além do estoque.")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_planos(n)
+# Descrição: Confere que os comandos que os módulos realmente executam usam
+# índice. Com a instrumentação de metricas (limite de consulta lenta 0), roda
+# as operações de cliente_def, estoque_def, venda_def, relatorios e busca
+# sobre n vendas, e cada comando vai para o log com o EXPLAIN QUERY PLAN feito
+# na própria conexão e com os próprios parâmetros. Confere também o corpo de
+# cada gatilho dos dois bancos (NEW./OLD. trocados por parâmetros). Falha se
+# algum comando varrer uma tabela inteira (SCAN), a não ser os de
+# VARREDURAS_ESPERADAS.
+# ---------------------------------------------------------------------------
+# Comandos que percorrem a tabela de propósito (trecho do comando normalizado)
+VARREDURAS_ESPERADAS = (
+    # foto do estoque: copia a quantidade de todos os produtos
+    'INSERT INTO fotos_estoque_itens (id_foto, serie, quantidade) SELECT last_insert_rowid(), serie, quantidade FROM estoque',
+    # resumo com uma linha só
+    'FROM resumo_estoque',
+    # listagem de todos os clientes, do maior para o menor total
+    'FROM resumo_clientes ORDER BY total DESC',
+    # receita agrupada: percorre o resumo diário (uma linha por dia e produto)
+    'FROM resumo_vendas_diario WHERE 1 = 1',
+    # reconciliação: a tabela temporária com o arquivo do fornecedor é percorrida inteira
+    'importacao_estoque',
+    # busca: confere se o índice textual existe (o catálogo não tem índice)
+    'FROM sqlite_master WHERE name = ?',
+)
+
+
+def _exercitar_modulos(n):
+    from datetime import datetime
+    import busca
+    import cliente_def
+    import estoque_def
+    import relatorios
+    import venda_def
+
+    produtos = list(gerar_produtos(max(10, n // 10)))
+    estoque_def.reconciliar_estoque(produtos)
+    estoque_def.adicionar_produto('P1', 'CELULAR', 'SAMSUNG', 'S23', 50, 100.0)
+    estoque_def.atualizar_produto('P1', quantidade=60, preco=110.0)
+    estoque_def.produto_existe('P1')
+    estoque_def.invalidar_cache()
+    estoque_def.consultar_produto_por_serie('P1')
+    estoque_def.consultar_produto_por_tipo('CELULAR')
+    estoque_def.por_periodo('2000-01-01', '2100-01-01')
+    estoque_def.repor_estoque('P1', 5, token='reposicao-1')
+    estoque_def.registrar_movimento('P1', -1)
+    list(estoque_def.iterar_estoque(tamanho_pagina=max(1, len(produtos) // 3)))
+    list(estoque_def.iterar_estoque(tipo='CELULAR'))
+    estoque_def.estoque_em(datetime.now(), 'P1')
+    estoque_def.fotografar_se_preciso(0)
+
+    cliente_def.cadastrar_produtos_em_lote(gerar_vendas(n), tamanho_lote=max(1, n // 2))
+    cliente_def.cadastrar_produto('111', 'ANA', 'P1', 'CELULAR', 'SAMSUNG', 'S23', 1, 100.0, '01/02/2025 10:00:00', '01/01/1990')
+    venda_def.vender('P1', '222', 'BIA', '02/02/1992', 2, token='venda-1')
+    venda_def.vender('P1', '222', 'BIA', '02/02/1992', 2, token='venda-1')
+    id_venda = cliente_def.vendas_do_cliente('222')[-1][0]
+    cliente_def.buscar_venda(id_venda)
+    list(cliente_def.iterar_vendas(tamanho_pagina=max(1, n // 3)))
+    list(cliente_def.iterar_vendas(serie='P1'))
+    cliente_def.por_periodo('01/01/2025', '31/12/2025')
+    cliente_def.atualizar_venda(id_venda, quantidade=3)
+    cliente_def.atualizar_cliente('222', nome='BIA SOUZA')
+    venda_def.cancelar_venda(id_venda)
+    venda_def.cancelar_vendas([id_venda, id_venda + 1])
+    cliente_def.deletar_venda(cliente_def.vendas_do_cliente('111')[0][0])
+
+    relatorios.receita_por_grupo(('tipo', 'marca'), '01/01/2025', '31/12/2025')
+    relatorios.totais_por_cliente('222')
+    relatorios.totais_por_cliente(limite=10)
+    relatorios.valor_estoque()
+    busca.buscar_produtos('samsung')
+    busca.buscar_vendas('cliente')
+    busca.buscar_clientes('bia')
+    estoque_def.excluir_produto('P1')
+
+
+def _planos_dos_gatilhos(conn):
+    import re
+    import sqlite3
+    import metricas
+
+    planos = []
+    for nome, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        corpo = sql[sql.upper().index('BEGIN') + len('BEGIN'):sql.upper().rindex('END')]
+        for comando in filter(None, (parte.strip() for parte in corpo.split(';'))):
+            comando = re.sub(r'\b(NEW|OLD)\.\w+', '?', comando)
+            try:
+                plano = conn.execute('EXPLAIN QUERY PLAN ' + comando, [None] * comando.count('?')).fetchall()
+            except sqlite3.Error as e:
+                planos.append((f"[{nome}] {comando}", [f"(plano indisponível: {e})"]))
+                continue
+            planos.append((f"[{nome}] {metricas.normalizar(comando)}", [linha[-1] for linha in plano]))
+    return planos
+
+
+def bench_planos(n):
+    import contextlib
+    import io
+    import re
+    import sqlite3
+    import cliente_def
+    import conexao
+    import estoque_def
+    import metricas
+
+    diretorio = tempfile.mkdtemp(prefix='planos_', dir='.')
+    conexao.configurar(diretorio)
+    estoque_def.invalidar_cache()
+    # As migrações rodam antes da instrumentação: só os comandos dos módulos são conferidos
+    cliente_def.conectar()
+    estoque_def.conectar()
+    log = os.path.join(diretorio, 'comandos.log')
+    metricas.ativar(limite_lento_ms=0, arquivo_lento=log)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            _exercitar_modulos(n)
+    finally:
+        metricas.desativar()
+
+    planos = {}
+    with open(log, encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            if linha.startswith('    '):
+                planos[comando].append(linha.strip())
+            else:
+                comando = re.match(r'\S+ \S+ [\d.]+ ms (.*)$', linha.rstrip('\n')).group(1)
+                planos[comando] = []
+    for nome in ('cliente', 'estoque'):
+        with sqlite3.connect(conexao.BANCOS[nome]) as conn:
+            planos.update(_planos_dos_gatilhos(conn))
+
+    falhas = 0
+    for comando, plano in sorted(planos.items()):
+        if not plano:
+            continue
+        # Subconsultas materializadas já foram filtradas pelos seus próprios passos
+        intermediarias = {passo.split(' ', 1)[1] for passo in plano if passo.startswith(('MATERIALIZE ', 'CO-ROUTINE '))}
+        varreduras = [passo for passo in plano if passo.startswith('SCAN ')
+                      and passo[5:] not in intermediarias
+                      and 'VIRTUAL TABLE' not in passo and 'CONSTANT ROW' not in passo]
+        esperada = any(trecho in comando for trecho in VARREDURAS_ESPERADAS)
+        falhas += bool(varreduras) and not esperada
+        situacao = 'OK   ' if not varreduras else 'ESPER' if esperada else 'SCAN '
+        print(f"{situacao} {comando[:150]}\n      {'; '.join(plano)}")
+    print(f"{len(planos)} comandos distintos conferidos")
+    if falhas:
+        sys.exit(f"Falha: {falhas} comando(s) sem índice.")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_memoria_listagem(n)
+# Descrição: Mede o pico de memória Python (tracemalloc) ao percorrer 'mercadoria'
+# com iterar_vendas com n // 10 vendas e depois com n vendas (1 milhão pela
+# linha de comando), e com fetchall() na base menor, para comparação. Com a
+# paginação o pico não depende de n: falha se o pico com n vendas passar de
+# MEMORIA_LISTAGEM_CRESCIMENTO vezes o da base menor ou de MEMORIA_LISTAGEM_MAXIMA.
+# ---------------------------------------------------------------------------
+MEMORIA_LISTAGEM_CRESCIMENTO = 1.5
+MEMORIA_LISTAGEM_MAXIMA = 4 * 2 ** 20
+
+
+def _pico_memoria(percorrer):
+    import tracemalloc
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    linhas = percorrer()
+    duracao = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return linhas, duracao, pico
+
+
+def bench_memoria_listagem(n):
+    import contextlib
+    import io
+    from itertools import islice
+    import cliente_def
+
+    vendas = gerar_vendas(n)
+    picos = []
+    cadastradas = 0
+    for tamanho in (n // 10, n):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cliente_def.cadastrar_produtos_em_lote(islice(vendas, tamanho - cadastradas), tamanho_lote=10000)
+        cadastradas = tamanho
+        medicoes = [('iterar_vendas', lambda: sum(1 for _ in cliente_def.iterar_vendas()))]
+        if not picos:
+            medicoes.append(('fetchall', lambda: len(cliente_def.conectar()[1].execute("SELECT * FROM mercadoria").fetchall())))
+        for nome, percorrer in medicoes:
+            linhas, duracao, pico = _pico_memoria(percorrer)
+            print(f"{nome:14} {linhas} linhas em {duracao:.2f}s, pico de memória {pico / 2 ** 20:.1f} MiB")
+            if nome == 'iterar_vendas':
+                picos.append(pico)
+
+    if picos[1] > picos[0] * MEMORIA_LISTAGEM_CRESCIMENTO or picos[1] > MEMORIA_LISTAGEM_MAXIMA:
+        sys.exit(f"Falha: pico de iterar_vendas foi de {picos[0] / 2 ** 20:.1f} MiB ({n // 10} vendas) "
+                 f"para {picos[1] / 2 ** 20:.1f} MiB ({n} vendas)!")
+    print("OK: pico de iterar_vendas não cresce com o número de vendas.")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_leitura_threads(n)
+# Descrição: Mede consultas por segundo de consultar_produto_por_serie com 1, 2,
+# 4 e 8 threads, cada uma usando a sua conexão do gerenciador (conexao.py).
+# ---------------------------------------------------------------------------
+def bench_leitura_threads(n):
+    import random
+    import sqlite3
+    from concurrent.futures import ThreadPoolExecutor
+    import conexao
+    import estoque_def
+
+    conexao.preparar('estoque')
+    with sqlite3.connect('estoque.db') as conn:
+        conn.executemany("INSERT INTO estoque (serie, tipo, marca, modelo, quantidade, preco) VALUES (?, 'T', 'M', 'X', 10, 1.0)",
+                         ((f"S{i:07d}",) for i in range(n)))
+
+    def consultar(quantidade):
+        series = [f"S{random.randrange(n):07d}" for _ in range(quantidade)]
+        for serie in series:
+            estoque_def.consultar_produto_por_serie(serie)
+
+    consultas = 20000
+    for threads in (1, 2, 4, 8):
+        with ThreadPoolExecutor(threads) as executor:
+            inicio = time.perf_counter()
+            list(executor.map(consultar, [consultas // threads] * threads))
+            duracao = time.perf_counter() - inicio
+        print(f"{threads} thread(s): {consultas / duracao:10.0f} consultas/s")
+
+
+# ---------------------------------------------------------------------------
+# Função: percentil(valores, p)
+# Descrição: Retorna o percentil p (0-100) de uma lista de valores.
+# ---------------------------------------------------------------------------
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_escritor(n)
+# Descrição: 32 threads cadastram n produtos no estoque, primeiro com um commit por
+# operação e depois pelo escritor agrupado com janelas de 0, 1, 5 e 20 ms. Mostra
+# vazão e latência (p50/p99) por operação. O escritor roda com wal=True, que só
+# é seguro aqui porque o banco do benchmark não participa de vendas.
+# ---------------------------------------------------------------------------
+def bench_escritor(n, threads=32):
+    import contextlib
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+    import estoque_def
+    from escritor import EscritorAgrupado
+
+    def rodar(nome, executar):
+        latencias = []
+
+        def cadastrar(parte):
+            for i in range(parte, n, threads):
+                inicio = time.perf_counter()
+                executar(estoque_def.adicionar_produto, f"{nome}-{i}", "T", "M", "X", 1, 1.0)
+                latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(threads) as executor:
+            list(executor.map(cadastrar, range(threads)))
+        duracao = time.perf_counter() - inicio
+        print(f"{nome:16} {n / duracao:9.0f} ops/s   p50={percentil(latencias, 50) * 1000:7.2f} ms"
+              f"   p99={percentil(latencias, 99) * 1000:7.2f} ms")
+
+    rodar('commit por op', lambda funcao, *args: funcao(*args))
+    for janela in (0, 1, 5, 20):
+        escritor = EscritorAgrupado('estoque', janela_ms=janela, wal=True)
+        rodar(f'janela {janela} ms', escritor.executar)
+        escritor.parar()
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_crash_escritor(n)
+# Descrição: Um processo filho envia n operações ao escritor agrupado e anota em
+# um arquivo cada série cujo Future foi confirmado; no meio do caminho ele morre
+# com os._exit, sem fechar nada. Depois confere que o banco está íntegro e que
+# toda operação confirmada ao chamador está gravada.
+# ---------------------------------------------------------------------------
+def _escrever_e_morrer(n):
+    import contextlib
+    import io
+    import estoque_def
+    from escritor import EscritorAgrupado
+
+    escritor = EscritorAgrupado('estoque', janela_ms=2, wal=True)
+    with open('confirmadas.txt', 'w') as confirmadas, contextlib.redirect_stdout(io.StringIO()):
+        futuros = [(f"C{i}", escritor.enviar(estoque_def.adicionar_produto, f"C{i}", "T", "M", "X", 1, 1.0))
+                   for i in range(n)]
+        for serie, futuro in futuros[:n // 2]:
+            futuro.result()
+            confirmadas.write(serie + "\n")
+            confirmadas.flush()
+    os._exit(1)
+
+
+def bench_crash_escritor(n):
+    import multiprocessing
+    import sqlite3
+    import estoque_def  # noqa: F401
+
+    processo = multiprocessing.Process(target=_escrever_e_morrer, args=(n,))
+    processo.start()
+    processo.join()
+
+    conn = sqlite3.connect('estoque.db')
+    integridade = conn.execute('PRAGMA integrity_check').fetchone()[0]
+    gravadas = {serie for (serie,) in conn.execute("SELECT serie FROM estoque WHERE serie LIKE 'C%'")}
+    confirmadas = set(open('confirmadas.txt').read().split())
+    perdidas = confirmadas - gravadas
+    print(f"integridade={integridade} confirmadas={len(confirmadas)} gravadas={len(gravadas)} perdidas={len(perdidas)}")
+    if integridade != 'ok' or perdidas:
+        sys.exit("Falha: operação confirmada ao chamador não foi gravada!")
+    print("OK: todas as operações confirmadas sobreviveram à queda.")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_cache(n)
+# Descrição: Simula as consultas de estoque de n vendas (consultar_produto_por_serie
+# seguido de produto_existe, como no menu) sobre séries com popularidade desigual,
+# com o cache desligado e ligado em cada modo de coerência. Mostra o tempo de
+# consulta por venda e as estatísticas do cache.
+# ---------------------------------------------------------------------------
+def bench_cache(n):
+    import random
+    import sqlite3
+    import conexao
+    import estoque_def
+
+    conexao.preparar('estoque')
+    produtos = 10000
+    with sqlite3.connect('estoque.db') as conn:
+        conn.executemany("INSERT INTO estoque (serie, tipo, marca, modelo, quantidade, preco) VALUES (?, 'T', 'M', 'X', 10, 1.0)",
+                         ((f"S{i:07d}",) for i in range(produtos)))
+    series = [f"S{int(random.paretovariate(1.2)) % produtos:07d}" for _ in range(n)]
+
+    for nome, opcoes in [('sem cache', dict(tamanho_maximo=0)),
+                         ('data_version', dict(coerencia='data_version')),
+                         ('ttl', dict(coerencia='ttl'))]:
+        estoque_def.configurar_cache(**opcoes)
+        inicio = time.perf_counter()
+        for serie in series:
+            estoque_def.consultar_produto_por_serie(serie)
+            estoque_def.produto_existe(serie)
+        duracao = time.perf_counter() - inicio
+        print(f"{nome:13} {duracao / n * 1e6:7.2f} us/venda   {estoque_def.estatisticas_cache()}")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_relatorios(n)
+# Descrição: Com n vendas cadastradas, compara o tempo da receita por tipo lida
+# do resumo (relatorios) com o GROUP BY direto sobre 'mercadoria'.
+# ---------------------------------------------------------------------------
+def bench_relatorios(n):
+    import contextlib
+    import io
+    import cliente_def
+    import relatorios
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        cliente_def.cadastrar_produtos_em_lote(gerar_vendas(n), tamanho_lote=10000)
+    cursor = cliente_def.conectar()[1]
+
+    for nome, consultar in [
+        ('resumo', lambda: relatorios.receita_por_grupo(['tipo', 'marca'])),
+        ('varredura', lambda: cursor.execute("SELECT tipo, marca, COUNT(*), SUM(quantidade), SUM(valor_total) "
+                                             "FROM mercadoria GROUP BY tipo, marca").fetchall()),
+    ]:
+        inicio = time.perf_counter()
+        for _ in range(20):
+            consultar()
+        print(f"{nome:10} {(time.perf_counter() - inicio) / 20 * 1000:9.3f} ms por relatório")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_analise(n)
+# Descrição: Gera n vendas e calcula a receita por marca e a quantidade por
+# série de duas formas: percorrendo as tuplas do SELECT em Python e pela
+# exportação colunar (analise). Mostra tempo e pico de memória de cada uma.
+# ---------------------------------------------------------------------------
+def bench_analise(n):
+    import contextlib
+    import io
+    import tracemalloc
+    import analise
+    import cliente_def
+
+    conn, cursor = cliente_def.conectar()
+    vendas = (v[:4] + (f"MARCA{int(v[2][1:]) % 40}",) + v[5:] for v in gerar_vendas(n))
+    with contextlib.redirect_stdout(io.StringIO()):
+        cliente_def.cadastrar_produtos_em_lote(vendas, tamanho_lote=100000)
+
+    def por_linha():
+        receita, quantidade = {}, {}
+        for serie, marca, qtd, total in cursor.execute("SELECT serie, marca, quantidade, valor_total FROM mercadoria").fetchall():
+            receita[marca] = receita.get(marca, 0) + total
+            quantidade[serie] = quantidade.get(serie, 0) + qtd
+        return receita, quantidade
+
+    def colunar():
+        colunas = analise.exportar_colunas('mercadoria', ('serie', 'marca', 'quantidade', 'valor_total'))
+        return colunar_analise(colunas)
+
+    def colunar_analise(colunas):
+        return analise.receita_por('marca', colunas), analise.quantidade_por('serie', colunas)
+
+    print(f"NumPy: {'sim' if analise.numpy is not None else 'não (vetores array.array)'}")
+    inicio = time.perf_counter()
+    por_linha()
+    print(f"por linha            {time.perf_counter() - inicio:7.2f}s")
+    inicio = time.perf_counter()
+    colunas = analise.exportar_colunas('mercadoria', ('serie', 'marca', 'quantidade', 'valor_total'))
+    exportacao = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    colunar_analise(colunas)
+    print(f"colunar              {exportacao + time.perf_counter() - inicio:7.2f}s "
+          f"(exportação {exportacao:.2f}s, análise {time.perf_counter() - inicio:.2f}s)")
+
+    for nome, calcular in [('por linha', por_linha), ('colunar', colunar)]:
+        tracemalloc.start()
+        calcular()
+        print(f"{nome:10} pico de memória {tracemalloc.get_traced_memory()[1] / 2 ** 20:8.1f} MiB")
+        tracemalloc.stop()
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_metricas(n)
+# Descrição: Mede o custo da instrumentação (metricas) em n consultas por série
+# (cache desligado) e n cadastros: com ela desativada (conexão comum, medida
+# duas vezes para mostrar o ruído) e ativada.
+# ---------------------------------------------------------------------------
+def bench_metricas(n):
+    import contextlib
+    import sqlite3
+    import conexao
+    import estoque_def
+    import metricas
+
+    conexao.preparar('estoque')
+    with sqlite3.connect('estoque.db') as conn:
+        conn.executemany("INSERT INTO estoque (serie, tipo, marca, modelo, quantidade, preco) VALUES (?, 'T', 'M', 'X', 10, 1.0)",
+                         ((f"S{i:07d}",) for i in range(1000)))
+    estoque_def.configurar_cache(tamanho_maximo=0)
+    metricas.CONFIGURACAO['arquivo_lento'] = os.devnull
+
+    for rodada, (nome, ligar) in enumerate([('desativada', metricas.desativar), ('desativada', metricas.desativar),
+                                            ('ativada', metricas.ativar)]):
+        ligar()
+        inicio = time.perf_counter()
+        for i in range(n):
+            estoque_def.consultar_produto_por_serie(f"S{i % 1000:07d}")
+        leitura = time.perf_counter() - inicio
+        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+            inicio = time.perf_counter()
+            for i in range(n // 10):
+                estoque_def.adicionar_produto(f"R{rodada}-{i}", "T", "M", "X", 1, 1.0)
+            escrita = time.perf_counter() - inicio
+        print(f"{nome:11} consulta {leitura / n * 1e6:7.2f} us   cadastro {escrita / (n // 10) * 1e6:8.2f} us")
+    metricas.desativar()
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_cli(n)
+# Descrição: Cadastra n produtos no estoque de três formas, cada uma em bancos
+# novos: pelo menu do app.py (opção 5, respostas pela entrada padrão), com
+# uma chamada de cli.py por produto (limitada a 200 chamadas) e com um único
+# cli.py --batch. Mostra produtos por segundo de cada uma.
+# ---------------------------------------------------------------------------
+def bench_cli(n):
+    import subprocess
+
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    ambiente = dict(os.environ, PYTHONPATH=pasta)
+    produtos = list(gerar_produtos(n))
+
+    def executar(nome, comandos, entrada=None):
+        diretorio = tempfile.mkdtemp(prefix='cli_', dir='.')
+        inicio = time.perf_counter()
+        for comando in comandos:
+            subprocess.run(comando, input=entrada, cwd=diretorio, env=ambiente, text=True,
+                           stdout=subprocess.DEVNULL, check=True)
+        duracao = time.perf_counter() - inicio
+        quantidade = len(comandos) if entrada is None else n
+        print(f"{nome:22} {quantidade:6} produtos em {duracao:7.2f} s  ({quantidade / duracao:9.1f} produtos/s)")
+
+    menu = ''.join(f"5\n{tipo}\n{marca}\n{modelo}\n{serie}\n{quantidade}\n{preco}\n"
+                   for serie, tipo, marca, modelo, quantidade, preco in produtos) + "9\n"
+    executar('menu (app.py)', [[sys.executable, os.path.join(pasta, 'app.py')]], menu)
+
+    avulsos = [[sys.executable, os.path.join(pasta, 'cli.py'), 'estoque', 'add', '--serie', serie, '--tipo', tipo,
+                '--marca', marca, '--modelo', modelo, '--quantidade', str(quantidade), '--preco', str(preco)]
+               for serie, tipo, marca, modelo, quantidade, preco in produtos[:200]]
+    executar('cli.py por comando', avulsos)
+
+    lote = ''.join(f"estoque add --serie {serie} --tipo {tipo} --marca {marca} --modelo '{modelo}' "
+                   f"--quantidade {quantidade} --preco {preco}\n"
+                   for serie, tipo, marca, modelo, quantidade, preco in produtos)
+    executar('cli.py --batch', [[sys.executable, os.path.join(pasta, 'cli.py'), '--batch', '-']], lote)
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_servico(n, conexoes=64)
+# Descrição: Teste de carga do servico.py: sobe o serviço em outro processo e
+# abre 'conexoes' conexões HTTP keep-alive simultâneas que fazem n requisições
+# no total, 90% consultas a 20 séries "quentes" e 10% vendas. Mostra vazão,
+# p50/p95/p99 por tipo de requisição e os status recebidos, e confere que o
+# estoque baixado é igual ao vendido.
+# ---------------------------------------------------------------------------
+def bench_servico(n, conexoes=64):
+    import asyncio
+    import socket
+    import sqlite3
+    import subprocess
+    import conexao
+    import estoque_def  # noqa: F401
+    import venda_def  # noqa: F401
+
+    conexao.preparar('estoque')
+    with sqlite3.connect('estoque.db') as conn:
+        conn.executemany("INSERT INTO estoque (serie, tipo, marca, modelo, quantidade, preco) VALUES (?, ?, ?, ?, ?, ?)",
+                         ((serie, tipo, marca, modelo, 10 ** 6, preco)
+                          for serie, tipo, marca, modelo, _, preco in gerar_produtos(1000)))
+    with socket.socket() as livre:
+        livre.bind(('127.0.0.1', 0))
+        porta = livre.getsockname()[1]
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    servidor = subprocess.Popen([sys.executable, os.path.join(pasta, 'servico.py'), '--porta', str(porta)],
+                                env=dict(os.environ, PYTHONPATH=pasta), stderr=subprocess.DEVNULL)
+
+    async def requisitar(leitor, escritor, metodo, caminho, corpo=b''):
+        escritor.write(f"{metodo} {caminho} HTTP/1.1\r\nHost: local\r\nContent-Length: {len(corpo)}\r\n\r\n".encode() + corpo)
+        await escritor.drain()
+        status = int((await leitor.readline()).split()[1])
+        tamanho = 0
+        while (linha := await leitor.readline()) != b'\r\n':
+            if linha.lower().startswith(b'content-length:'):
+                tamanho = int(linha.split(b':')[1])
+        return status, await leitor.readexactly(tamanho)
+
+    async def cliente(parte, latencias, status):
+        aleatorio = random.Random(parte)
+        leitor, escritor = await asyncio.open_connection('127.0.0.1', porta)
+        for i in range(parte, n, conexoes):
+            serie = f"S{aleatorio.randrange(20):07d}"
+            if aleatorio.random() < 0.1:
+                tipo = 'venda'
+                corpo = json.dumps({'serie': serie, 'cpf': f"{i:011d}", 'nome': f"CLIENTE {i}",
+                                    'data_nascimento': '01/01/1990', 'quantidade': 1}).encode()
+                pedido = ('POST', '/vendas', corpo)
+            else:
+                tipo, pedido = 'consulta', ('GET', f'/estoque/{serie}')
+            inicio = time.perf_counter()
+            codigo, _ = await requisitar(leitor, escritor, *pedido)
+            latencias.setdefault(tipo, []).append(time.perf_counter() - inicio)
+            status[codigo] = status.get(codigo, 0) + 1
+        escritor.close()
+
+    async def carga():
+        for _ in range(100):
+            try:
+                _, escritor = await asyncio.open_connection('127.0.0.1', porta)
+                escritor.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+        latencias, status = {}, {}
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(parte, latencias, status) for parte in range(conexoes)))
+        return time.perf_counter() - inicio, latencias, status
+
+    try:
+        duracao, latencias, status = asyncio.run(carga())
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+    print(f"{conexoes} conexões: {n} requisições em {duracao:.2f}s ({n / duracao:.0f} req/s)   status {status}")
+    for tipo, valores in sorted(latencias.items()):
+        print(f"{tipo:9} {len(valores):7}   p50={percentil(valores, 50) * 1000:7.2f} ms"
+              f"   p95={percentil(valores, 95) * 1000:7.2f} ms   p99={percentil(valores, 99) * 1000:7.2f} ms")
+    baixado = sqlite3.connect('estoque.db').execute("SELECT SUM(? - quantidade) FROM estoque", (10 ** 6,)).fetchone()[0]
+    vendido = sqlite3.connect('cliente.db').execute("SELECT COALESCE(SUM(quantidade), 0) FROM mercadoria").fetchone()[0]
+    print(f"estoque baixado={baixado} vendido={vendido}")
+    if baixado != vendido or vendido != status.get(201, 0):
+        sys.exit("Falha: estoque e vendas não conferem!")
+
+
+# ---------------------------------------------------------------------------
+# Harness de CRUD.
+# Para cada tamanho de base, cria bancos novos em um subdiretório temporário
+# (com conexao.configurar), gera produtos e vendas sintéticos e mede a
+# latência de cada função de cliente_def e estoque_def. Os resultados
+# (p50/p95/p99 em ms e ops/s) vão para um JSON; com --comparar, os p50 são
+# confrontados com um resultado anterior e regressões acima da tolerância
+# fazem o benchmark terminar com erro.
+# ---------------------------------------------------------------------------
+TIPOS = ('CELULAR', 'TV', 'NOTEBOOK', 'TABLET', 'FONE', 'RELOGIO')
+MARCAS = ('SAMSUNG', 'APPLE', 'LG', 'MOTOROLA', 'XIAOMI', 'SONY')
+
+
+# ---------------------------------------------------------------------------
+# Função: gerar_produtos(n, semente=0)
+# Descrição: Gera n produtos (serie, tipo, marca, modelo, quantidade, preco).
+# ---------------------------------------------------------------------------
+def gerar_produtos(n, semente=0):
+    aleatorio = random.Random(semente)
+    for i in range(n):
+        yield (f"S{i:07d}", aleatorio.choice(TIPOS), aleatorio.choice(MARCAS), f"MODELO {i % 300}",
+               aleatorio.randint(1, 1000), round(aleatorio.uniform(50, 10000), 2))
+
+
+# ---------------------------------------------------------------------------
+# Função: gerar_vendas_realistas(m, produtos, semente=0)
+# Descrição: Gera m vendas no formato de cadastrar_produto sobre a lista de
+# produtos, com popularidade desigual das séries (poucas séries concentram a
+# maior parte das vendas, distribuição de Pareto) e ~m/3 clientes distintos.
+# ---------------------------------------------------------------------------
+def gerar_vendas_realistas(m, produtos, semente=0):
+    aleatorio = random.Random(semente)
+    clientes = max(1, m // 3)
+    for _ in range(m):
+        serie, tipo, marca, modelo, _, preco = produtos[int(aleatorio.paretovariate(1.16)) % len(produtos)]
+        cliente = aleatorio.randrange(clientes)
+        data = f"{aleatorio.randint(1, 28):02d}/{aleatorio.randint(1, 12):02d}/2025 {aleatorio.randint(0, 23):02d}:00:00"
+        yield (f"{cliente:011d}", f"CLIENTE {cliente}", serie, tipo, marca, modelo,
+               aleatorio.randint(1, 3), preco, data, "01/01/1990")
+
+
+# ---------------------------------------------------------------------------
+# Função: medir(funcao, chamadas)
+# Descrição: Chama funcao(*args) para cada args de 'chamadas' e retorna as
+# estatísticas de latência: p50/p95/p99 em milissegundos e operações por segundo.
+# ---------------------------------------------------------------------------
+def medir(funcao, chamadas):
+    latencias = []
+    for args in chamadas:
+        inicio = time.perf_counter()
+        funcao(*args)
+        latencias.append(time.perf_counter() - inicio)
+    return {
+        'operacoes': len(latencias),
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p95_ms': percentil(latencias, 95) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'ops_s': len(latencias) / sum(latencias),
+    }
+
+
+def _medir_crud(tamanho, operacoes):
+    import contextlib
+    import cliente_def
+    import conexao
+    import estoque_def
+
+    diretorio = tempfile.mkdtemp(prefix=f'crud_{tamanho}_', dir='.')
+    conexao.configurar(diretorio)
+    estoque_def.invalidar_cache()
+
+    produtos = list(gerar_produtos(max(10, tamanho // 10)))
+    vendas = list(gerar_vendas_realistas(tamanho, produtos))
+    conn = estoque_def.conectar()[0]
+    conn.executemany("INSERT INTO estoque (serie, tipo, marca, modelo, quantidade, preco) VALUES (?, ?, ?, ?, ?, ?)", produtos)
+    conn.commit()
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        cliente_def.cadastrar_produtos_em_lote(vendas, tamanho_lote=10000)
+
+    aleatorio = random.Random(1)
+    ids = [aleatorio.randint(1, tamanho) for _ in range(operacoes)]
+    novas = list(gerar_vendas_realistas(operacoes, produtos, semente=2))
+    novos_produtos = [(f"N{i:07d}",) + p[1:] for i, p in enumerate(gerar_produtos(operacoes, semente=3))]
+    listagens = max(1, min(operacoes, 200000 // max(1, len(produtos))))
+
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        return {
+            'cadastrar_produto': medir(cliente_def.cadastrar_produto, novas),
+            'buscar_venda': medir(cliente_def.buscar_venda, [(id_venda,) for id_venda in ids]),
+            'atualizar_venda': medir(cliente_def.atualizar_venda, [(id_venda, None, None, None, None, None, None, 2) for id_venda in ids]),
+            'adicionar_produto': medir(estoque_def.adicionar_produto, novos_produtos),
+            'consultar_produto_por_tipo': medir(estoque_def.consultar_produto_por_tipo, [(aleatorio.choice(TIPOS),) for _ in range(listagens)]),
+            'listar_produtos': medir(estoque_def.listar_produtos, [()] * listagens),
+            'deletar_venda': medir(cliente_def.deletar_venda, [(id_venda,) for id_venda in ids]),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_crud(n, tamanhos=None, saida=None, comparar=None, tolerancia=0.2)
+# Descrição: Roda o harness de CRUD para cada tamanho de base (por padrão n/100,
+# n/10 e n vendas), com n/10 operações por função (no máximo 2000). Grava o
+# resultado em 'saida' e, com 'comparar', acusa as funções cujo p50 piorou mais
+# que 'tolerancia' (0.2 = 20%) em relação ao arquivo anterior.
+# ---------------------------------------------------------------------------
+def bench_crud(n, tamanhos=None, saida=None, comparar=None, tolerancia=0.2):
+    import platform
+    import sqlite3
+
+    tamanhos = tamanhos or sorted({max(100, n // 100), max(100, n // 10), n})
+    operacoes = max(10, min(2000, n // 10))
+    resultado = {
+        'data': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'tamanhos': {},
+    }
+    for tamanho in tamanhos:
+        resultado['tamanhos'][str(tamanho)] = medidas = _medir_crud(tamanho, operacoes)
+        for funcao, estatisticas in medidas.items():
+            print(f"{tamanho:>9} {funcao:28} p50={estatisticas['p50_ms']:8.3f} ms  p95={estatisticas['p95_ms']:8.3f} ms"
+                  f"  p99={estatisticas['p99_ms']:8.3f} ms  {estatisticas['ops_s']:10.0f} ops/s")
+
+    if saida:
+        with open(saida, 'w') as arquivo:
+            json.dump(resultado, arquivo, indent=2)
+        print(f"Resultados gravados em {saida}")
+
+    if comparar:
+        with open(comparar) as arquivo:
+            anterior = json.load(arquivo)['tamanhos']
+        regressoes = []
+        for tamanho, medidas in resultado['tamanhos'].items():
+            for funcao, estatisticas in medidas.items():
+                base = anterior.get(tamanho, {}).get(funcao)
+                # diferenças abaixo de 0,05 ms são ruído de medição, mesmo que proporcionalmente grandes
+                if base and estatisticas['p50_ms'] > max(base['p50_ms'] * (1 + tolerancia), base['p50_ms'] + 0.05):
+                    regressoes.append(f"{tamanho} {funcao}: p50 {base['p50_ms']:.3f} -> {estatisticas['p50_ms']:.3f} ms")
+        for regressao in regressoes:
+            print("REGRESSÃO", regressao)
+        if regressoes:
+            sys.exit(f"Falha: {len(regressoes)} regressão(ões) acima de {tolerancia:.0%}.")
+        print("Nenhuma regressão em relação a", comparar)
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_busca(n)
+# Descrição: Monta um catálogo de n produtos (use -n 1000000 para o catálogo de
+# 1M) com os gatilhos de busca ativos e compara o tempo médio de busca pelo
+# índice FTS5 (busca.buscar_produtos) com LIKE '%palavra%' (busca.buscar_like)
+# para alguns textos, inclusive um raro e um inexistente, e a busca aproximada.
+# Mostra também a busca que só ordena os 2000 primeiros candidatos (candidatos=2000).
+# Com LIMIT o LIKE para cedo em palavras comuns; nas raras ele percorre a tabela.
+# ---------------------------------------------------------------------------
+MODELOS = ('GALAXY', 'ULTRA', 'PRO', 'MAX', 'LITE', 'PLUS', 'NOTE', 'MINI', 'AIR', 'EDGE', 'NEO', 'FOLD')
+
+
+def bench_busca(n, repeticoes=20):
+    import sqlite3
+    import busca
+    import conexao
+    import estoque_def  # noqa: F401
+
+    conexao.preparar('estoque')
+    aleatorio = random.Random(0)
+    inicio = time.perf_counter()
+    with sqlite3.connect('estoque.db') as conn:
+        conn.executemany("INSERT INTO estoque (serie, tipo, marca, modelo, quantidade, preco) VALUES (?, ?, ?, ?, ?, ?)",
+                         ((f"S{i:07d}", aleatorio.choice(TIPOS), aleatorio.choice(MARCAS),
+                           f"{aleatorio.choice(MODELOS)} {aleatorio.choice(MODELOS)} {i % 997}",
+                           1, 10.0) for i in range(n)))
+        conn.execute("INSERT INTO estoque (serie, tipo, marca, modelo, quantidade, preco) VALUES ('RARO1', 'CELULAR', 'ASUS', 'ZENFONE 10', 1, 10.0)")
+    print(f"catálogo de {n} produtos gravado (com índice de busca) em {time.perf_counter() - inicio:.1f}s")
+
+    for texto in ('samsung', 'gal', 'ultra pro', 'celular apple max', 'zenfone', 'inexistente'):
+        tempos = {}
+        for nome, buscar in (('fts5', lambda: busca.buscar_produtos(texto, aproximada=False)),
+                             ('fts5_2000', lambda: busca.buscar_produtos(texto, aproximada=False, candidatos=2000)),
+                             ('like', lambda: busca.buscar_like('estoque', texto))):
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                encontrados = len(buscar())
+            tempos[nome] = (time.perf_counter() - inicio) / repeticoes * 1000
+        print(f"{texto:20} fts5 {tempos['fts5']:9.3f} ms   fts5 (2000 candidatos) {tempos['fts5_2000']:9.3f} ms"
+              f"   like {tempos['like']:9.3f} ms"
+              f"   ({tempos['like'] / tempos['fts5']:6.1f}x)  {encontrados} resultados")
+
+    inicio = time.perf_counter()
+    resultados = busca.buscar_produtos('zenfome')
+    print(f"aproximada 'zenfome' -> {len(resultados)} resultado(s) em {(time.perf_counter() - inicio) * 1000:.3f} ms")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_movimentos(n)
+# Descrição: Registra n vendas e cancela metade delas uma a uma e metade com
+# cancelar_vendas (uma transação), comparando os tempos. Confere que repetir
+# vendas (mesmo token) e cancelamentos não altera o estoque de novo e que o
+# estoque bate com o livro de movimentos. Mede estoque_em só com a foto
+# inicial (refazendo o livro inteiro) e com uma foto recente.
+# ---------------------------------------------------------------------------
+def bench_movimentos(n, produtos=100):
+    import contextlib
+    import io
+    import sqlite3
+    import estoque_def
+    import venda_def
+    from datetime import datetime
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(produtos):
+            estoque_def.adicionar_produto(f"M{i:04d}", "CELULAR", "SAMSUNG", "S23", 10 * n, 100.0)
+        for i in range(n):
+            venda_def.vender(f"M{i % produtos:04d}", f"{i:011d}", f"CLIENTE {i}", "01/01/1990", 1 + i % 3,
+                             token=f"venda:{i}")
+        repetida = venda_def.vender("M0000", "00000000000", "CLIENTE 0", "01/01/1990", 1, token="venda:0")
+    ids = [linha[0] for linha in sqlite3.connect('cliente.db').execute("SELECT id FROM mercadoria ORDER BY id")]
+    metade = len(ids) // 2
+
+    def quantidades():
+        return dict(sqlite3.connect('estoque.db').execute("SELECT serie, quantidade FROM estoque"))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        for id_venda in ids[:metade]:
+            venda_def.cancelar_venda(id_venda)
+        uma_a_uma = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        venda_def.cancelar_vendas(ids[metade:])
+        em_lote = time.perf_counter() - inicio
+        antes = quantidades()
+        venda_def.cancelar_vendas(ids)
+        repetidos = venda_def.cancelar_venda(ids[0])
+    print(f"cancelar_venda (uma a uma): {metade / uma_a_uma:10.0f} cancelamentos/s")
+    print(f"cancelar_vendas (lote):     {(len(ids) - metade) / em_lote:10.0f} cancelamentos/s")
+
+    falhas = []
+    if not repetida.startswith("Venda já") or len(ids) != n:
+        falhas.append("venda repetida com o mesmo token foi registrada de novo")
+    if quantidades() != antes or not repetidos.startswith("Venda já"):
+        falhas.append("cancelamento repetido devolveu estoque de novo")
+    if any(quantidade != 10 * n for quantidade in antes.values()):
+        falhas.append("estoque não voltou ao inicial depois de cancelar todas as vendas")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(n):
+            venda_def.vender(f"M{i % produtos:04d}", f"{i:011d}", f"CLIENTE {i}", "01/01/1990", 1)
+    agora = datetime.now()
+    inicio = time.perf_counter()
+    sem_foto = estoque_def.estoque_em(agora)
+    duracao_sem_foto = time.perf_counter() - inicio
+    with contextlib.redirect_stdout(io.StringIO()):
+        estoque_def.tirar_foto_estoque()
+    inicio = time.perf_counter()
+    com_foto = estoque_def.estoque_em(datetime.now())
+    duracao_com_foto = time.perf_counter() - inicio
+    movimentos = sqlite3.connect('estoque.db').execute("SELECT COUNT(*) FROM movimentos_estoque").fetchone()[0]
+    print(f"estoque_em com a foto inicial ({movimentos} movimentos): {duracao_sem_foto * 1000:8.2f} ms")
+    print(f"estoque_em com foto recente:                         {duracao_com_foto * 1000:8.2f} ms")
+    if sem_foto != quantidades() or com_foto != quantidades():
+        falhas.append("estoque_em não bate com o estoque atual")
+
+    if falhas:
+        sys.exit("Falha: " + "; ".join(falhas))
+    print("OK: livro de movimentos consistente com o estoque.")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_normalizacao(n)
+# Descrição: Grava n vendas no esquema antigo (tabela 'mercadoria' com os dados
+# do cliente e do produto em cada linha, versão 5) e migra para o normalizado
+# (clientes, produtos e vendas, versão 6). Compara o tamanho do arquivo e das
+# tabelas de vendas (via dbstat, se disponível) e o tempo médio das mesmas
+# consultas antes e depois; no esquema novo elas passam pela view 'mercadoria'.
+# ---------------------------------------------------------------------------
+def _tamanho_tabelas(conn, tabelas):
+    import sqlite3
+
+    marcas = ', '.join('?' * len(tabelas))
+    try:
+        return conn.execute(f"""SELECT SUM(pgsize) FROM dbstat WHERE name IN
+                                (SELECT name FROM sqlite_master WHERE tbl_name IN ({marcas}))""", tabelas).fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+def _medir_consultas(conn, consultas):
+    tempos = {}
+    for nome, consulta, parametros in consultas:
+        inicio = time.perf_counter()
+        for argumentos in parametros:
+            conn.execute(consulta, argumentos).fetchall()
+        tempos[nome] = (time.perf_counter() - inicio) / len(parametros) * 1000
+    return tempos
+
+
+def bench_normalizacao(n, repeticoes=200):
+    import sqlite3
+    import cliente_def
+    from migracoes import aplicar_migracoes, dividir_comandos, tem_fts5
+
+    produtos = list(gerar_produtos(max(10, n // 100)))
+    conn = sqlite3.connect('normalizacao.db')
+    conn.execute(cliente_def.SQL_TABELA_MERCADORIA)
+    aplicar_migracoes(conn, cliente_def.MIGRACOES[:5])
+    conn.executemany("""INSERT INTO mercadoria (cpf, nome, data_nascimento, data_compra, data_compra_iso, serie, tipo,
+                        marca, modelo, quantidade, valor_unitario, valor_total) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                     ((v[0], v[1], v[9], v[8], cliente_def.data_iso(v[8]), v[2], v[3], v[4], v[5], v[6], v[7], v[6] * v[7])
+                      for v in gerar_vendas_realistas(n, produtos)))
+    script = cliente_def.SQL_RECONSTRUIR_RESUMOS + (cliente_def.SQL_RECONSTRUIR_BUSCA if tem_fts5(conn) else '')
+    for comando in dividir_comandos(script):
+        conn.execute(comando)
+    conn.commit()
+
+    aleatorio = random.Random(1)
+    dias = [f"2025-{aleatorio.randint(1, 12):02d}-{aleatorio.randint(1, 28):02d}" for _ in range(repeticoes)]
+    cpfs = [linha[0] for linha in conn.execute("SELECT cpf FROM mercadoria ORDER BY random() LIMIT ?", (repeticoes,))]
+    consultas = [
+        ('venda por id', "SELECT * FROM mercadoria WHERE id = ?", [(aleatorio.randint(1, n),) for _ in range(repeticoes)]),
+        ('vendas do cpf', "SELECT * FROM mercadoria WHERE cpf = ?", [(cpf,) for cpf in cpfs]),
+        ('vendas da série', "SELECT id, quantidade FROM mercadoria WHERE serie = ? LIMIT 100",
+         [(aleatorio.choice(produtos)[0],) for _ in range(repeticoes)]),
+        ('vendas de um dia', "SELECT * FROM mercadoria WHERE data_compra_iso BETWEEN ? AND ?",
+         [(dia, dia + ' 23:59:59') for dia in dias]),
+        ('total por cpf (varredura)', "SELECT cpf, SUM(valor_total) FROM mercadoria GROUP BY cpf", [()]),
+    ]
+
+    medidas = {}
+    for esquema, tabelas in (('antes', ('mercadoria',)), ('depois', ('clientes', 'produtos', 'vendas'))):
+        if esquema == 'depois':
+            inicio = time.perf_counter()
+            aplicar_migracoes(conn, cliente_def.MIGRACOES)
+            print(f"migração de {n} vendas: {time.perf_counter() - inicio:.2f}s")
+        conn.execute('VACUUM')
+        medidas[esquema] = (os.path.getsize('normalizacao.db'), _tamanho_tabelas(conn, tabelas), _medir_consultas(conn, consultas))
+
+    (arquivo_antes, tabelas_antes, tempos_antes), (arquivo_depois, tabelas_depois, tempos_depois) = medidas['antes'], medidas['depois']
+    print(f"arquivo                    {arquivo_antes / 2 ** 20:9.2f} MiB -> {arquivo_depois / 2 ** 20:9.2f} MiB")
+    if tabelas_antes and tabelas_depois:
+        print(f"tabelas e índices de venda {tabelas_antes / 2 ** 20:9.2f} MiB -> {tabelas_depois / 2 ** 20:9.2f} MiB"
+              f"  ({tabelas_depois / tabelas_antes:.0%})")
+    for nome in tempos_antes:
+        print(f"{nome:26} {tempos_antes[nome]:9.3f} ms  -> {tempos_depois[nome]:9.3f} ms")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_importacao(n, repeticoes=10)
+# Descrição: Mede a partida de um processo que importa os módulos do sistema,
+# em processos novos com os bancos em SQL_PROJETO_BANCOS: o tempo de
+# importação de cada módulo (python -X importtime) e as medianas do tempo de
+# importar tudo e da primeira consulta, que é quem abre os bancos e confere o
+# esquema (antes isso acontecia já na importação). Confere também que
+# importar não cria bancos no diretório atual.
+# ---------------------------------------------------------------------------
+def bench_importacao(n, repeticoes=10):
+    import statistics
+    import subprocess
+
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    modulos = ('cliente_def', 'estoque_def', 'venda_def', 'relatorios', 'busca', 'cli')
+    importar = 'import ' + ', '.join(modulos)
+    medir_partida = (f'import time; inicio = time.perf_counter(); {importar}; importado = time.perf_counter(); '
+                     'estoque_def.produto_existe("X"); cliente_def.buscar_venda(0); '
+                     'print(importado - inicio, time.perf_counter() - importado)')
+    bancos = tempfile.mkdtemp(prefix='importacao_', dir='.')
+    vazio = tempfile.mkdtemp(prefix='importacao_vazio_', dir='.')
+    ambiente = dict(os.environ, PYTHONPATH=raiz, SQL_PROJETO_BANCOS=os.path.abspath(bancos))
+
+    def rodar(codigo, *opcoes):
+        return subprocess.run([sys.executable, *opcoes, '-c', codigo], cwd=vazio, env=ambiente,
+                              capture_output=True, text=True, check=True)
+
+    # Cria os bancos e aplica as migrações antes de medir
+    rodar(medir_partida)
+
+    acumulado = {}
+    for linha in rodar(importar, '-X', 'importtime').stderr.splitlines():
+        partes = [parte.strip() for parte in linha.split('|')]
+        if len(partes) == 3 and partes[2] in modulos:
+            acumulado[partes[2]] = int(partes[1]) / 1000
+    for modulo in modulos:
+        print(f"importtime {modulo:14} {acumulado.get(modulo, 0):8.2f} ms (acumulado)")
+
+    tempos = [[float(valor) for valor in rodar(medir_partida).stdout.split()[-2:]] for _ in range(repeticoes)]
+    print(f"importar os módulos        {statistics.median(t[0] for t in tempos) * 1000:8.2f} ms (mediana de {repeticoes} processos)")
+    print(f"primeira consulta          {statistics.median(t[1] for t in tempos) * 1000:8.2f} ms (abre os bancos e confere o esquema)")
+
+    criados = [arquivo for arquivo in os.listdir(vazio) if arquivo.endswith('.db')]
+    if criados:
+        sys.exit(f"Falha: importar os módulos criou {', '.join(criados)} no diretório atual!")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_manutencao(n, repeticoes=20)
+# Descrição: Monta bancos novos com n vendas espalhadas por 2023, 2024 e 2025 e
+# mede as consultas que percorrem a tabela de vendas antes e depois de arquivar
+# as vendas anteriores a 2025 (manutencao.arquivar_vendas) e compactar o banco.
+# Depois, durante a cópia de segurança (manutencao.copiar_bancos), uma thread
+# continua cadastrando vendas, mostrando que os escritores não ficam parados. Confere que
+# a view do histórico tem todas as vendas e que os resumos batem com as tabelas.
+# ---------------------------------------------------------------------------
+def bench_manutencao(n, repeticoes=20):
+    import contextlib
+    import io
+    import threading
+    import cliente_def
+    import conexao
+    import manutencao
+    import relatorios
+
+    diretorio = tempfile.mkdtemp(prefix='manutencao_', dir='.')
+    conexao.configurar(diretorio)
+    produtos = list(gerar_produtos(max(10, n // 100)))
+    vendas = [venda[:8] + (venda[8].replace('2025', str(2023 + 3 * i // n)),) + venda[9:]
+              for i, venda in enumerate(gerar_vendas_realistas(n, produtos))]
+    with contextlib.redirect_stdout(io.StringIO()):
+        cliente_def.cadastrar_produtos_em_lote(vendas, tamanho_lote=10000)
+
+    aleatorio = random.Random(3)
+    clientes = [venda[0] for venda in aleatorio.sample(vendas, min(len(vendas), repeticoes))]
+    consultas = [
+        ('varredura de mercadoria', "SELECT COUNT(*), SUM(valor_total) FROM mercadoria", [()] * 3),
+        ('total por cpf', "SELECT cpf, SUM(valor_total) FROM mercadoria GROUP BY cpf", [()] * 3),
+        ('vendas de um cliente', "SELECT * FROM mercadoria WHERE cpf = ?", [(cpf,) for cpf in clientes]),
+        ('vendas de um dia', "SELECT * FROM mercadoria WHERE data_compra_iso BETWEEN ? AND ?",
+         [('2025-06-10', '2025-06-10 23:59:59')] * repeticoes),
+    ]
+    conn = cliente_def.conectar()[0]
+    antes = _medir_consultas(conn, consultas)
+    tamanho_antes = os.path.getsize(conexao.BANCOS['cliente'])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        arquivadas = manutencao.arquivar_vendas('01/01/2025')
+        arquivamento = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        manutencao.compactar('cliente')
+        compactacao = time.perf_counter() - inicio
+    print(f"{arquivadas} vendas arquivadas em {arquivamento:.2f}s; compactação em {compactacao:.2f}s")
+    depois = _medir_consultas(conn, consultas)
+    tamanho_depois = os.path.getsize(conexao.BANCOS['cliente'])
+
+    print(f"{'cliente.db':26} {tamanho_antes / 2 ** 20:9.2f} MiB -> {tamanho_depois / 2 ** 20:9.2f} MiB")
+    for nome in antes:
+        print(f"{nome:26} {antes[nome]:9.3f} ms  -> {depois[nome]:9.3f} ms")
+
+    latencias, parar = [], threading.Event()
+
+    def escrever():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for venda in gerar_vendas_realistas(10 ** 9, produtos, semente=4):
+                if parar.is_set():
+                    return
+                inicio = time.perf_counter()
+                cliente_def.cadastrar_produto(*venda)
+                latencias.append(time.perf_counter() - inicio)
+
+    escritor = threading.Thread(target=escrever)
+    escritor.start()
+    time.sleep(0.2)
+    gravadas = len(latencias)
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        manutencao.copiar_bancos(os.path.join(diretorio, 'copia'))
+    duracao = time.perf_counter() - inicio
+    durante = latencias[gravadas:]
+    parar.set()
+    escritor.join()
+    print(f"cópia de segurança em {duracao:.2f}s; {len(durante)} vendas gravadas durante a cópia, "
+          f"latência p50={percentil(durante or [0], 50) * 1000:.2f} ms máx={max(durante or [0]) * 1000:.1f} ms")
+
+    historico = manutencao.conectar_historico()
+    total = historico.execute("SELECT COUNT(*) FROM vendas_historico").fetchone()[0]
+    historico.close()
+    with contextlib.redirect_stdout(io.StringIO()):
+        divergencias = relatorios.verificar_resumos()
+    if total != n + len(latencias) or divergencias:
+        sys.exit(f"Falha: histórico com {total} vendas (esperadas {n + len(latencias)}), {len(divergencias)} divergências nos resumos!")
+    print(f"OK: {total} vendas no histórico (atuais + arquivadas), resumos conferem.")
+
+
+# ---------------------------------------------------------------------------
+# Função: bench_reconciliacao(n, limite_por_item=2000)
+# Descrição: Monta um estoque com n produtos e um arquivo CSV do fornecedor com
+# produtos novos, quantidades, preços e descrições alteradas e produtos que
+# saíram de linha. Compara o caminho antigo, um produto por vez como a opção 5
+# do menu (cli.adicionar_ou_atualizar, em uma cópia do banco e limitado a
+# 'limite_por_item' registros), com a reconciliação em lote
+# (estoque_def.reconciliar_estoque), em simulação e gravando. Confere que o
+# estoque ficou igual ao arquivo, que o livro de movimentos bate com as
+# quantidades e que o índice de busca continua íntegro.
+# ---------------------------------------------------------------------------
+def bench_reconciliacao(n, limite_por_item=2000):
+    import contextlib
+    import csv
+    import io
+    import cli
+    import conexao
+    import estoque_def
+    import manutencao
+
+    diretorio = tempfile.mkdtemp(prefix='reconciliacao_', dir='.')
+    conexao.configurar(diretorio)
+    produtos = list(gerar_produtos(n))
+    with contextlib.redirect_stdout(io.StringIO()):
+        estoque_def.reconciliar_estoque(produtos)
+
+    # Arquivo do fornecedor: 5% saem de linha, 20% mudam a quantidade, 5% o preço,
+    # 2% a descrição e entram n/10 produtos novos
+    aleatorio = random.Random(5)
+    fornecedor = []
+    for serie, tipo, marca, modelo, quantidade, preco in produtos:
+        sorteio = aleatorio.random()
+        if sorteio < 0.05:
+            continue
+        if sorteio < 0.25:
+            quantidade = aleatorio.randint(0, 1000)
+        elif sorteio < 0.30:
+            preco = round(preco * 1.1, 2)
+        elif sorteio < 0.32:
+            modelo += ' PLUS'
+        fornecedor.append((serie, tipo, marca, modelo, quantidade, preco))
+    fornecedor += [(f"N{i:07d}", aleatorio.choice(TIPOS), aleatorio.choice(MARCAS), f"MODELO {i % 300}",
+                    aleatorio.randint(1, 1000), round(aleatorio.uniform(50, 10000), 2)) for i in range(n // 10)]
+    aleatorio.shuffle(fornecedor)
+    esperados = {produto[0]: produto for produto in fornecedor}
+    arquivo = os.path.join(diretorio, 'fornecedor.csv')
+    with open(arquivo, 'w', newline='', encoding='utf-8') as destino:
+        escritor = csv.writer(destino)
+        escritor.writerow(estoque_def.CAMPOS_ESTOQUE)
+        escritor.writerows(fornecedor)
+
+    # Caminho antigo, um produto por vez, em uma cópia do banco
+    copia = os.path.join(diretorio, 'por_item')
+    os.makedirs(copia)
+    with contextlib.redirect_stdout(io.StringIO()):
+        manutencao.copiar_banco('estoque', os.path.join(copia, os.path.basename(conexao.BANCOS['estoque'])))
+    conexao.configurar(copia)
+    estoque_def.invalidar_cache()
+    parte = fornecedor[:limite_por_item]
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        for produto in parte:
+            cli.adicionar_ou_atualizar(*produto)
+        por_item = time.perf_counter() - inicio
+    conexao.configurar(diretorio)
+    estoque_def.invalidar_cache()
+
+    conn = estoque_def.conectar()[0]
+    antes = conn.execute("SELECT COUNT(*), SUM(quantidade), SUM(preco) FROM estoque").fetchone()
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        simulado = estoque_def.reconciliar_estoque(arquivo, simular=True)
+        simulacao = time.perf_counter() - inicio
+    if conn.execute("SELECT COUNT(*), SUM(quantidade), SUM(preco) FROM estoque").fetchone() != antes:
+        sys.exit("Falha: a simulação alterou o estoque!")
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        resultado = estoque_def.reconciliar_estoque(arquivo, remover_ausentes=True)
+        reconciliacao = time.perf_counter() - inicio
+
+    taxa = len(parte) / por_item
+    print(f"{len(fornecedor)} registros no arquivo: {resultado['inseridos']} inseridos, {resultado['atualizados']} atualizados, "
+          f"{resultado['inalterados']} inalterados, {resultado['ausentes']} ausentes")
+    print(f"por item (opção 5)         {taxa:10.0f} registros/s  ({len(parte)} registros em {por_item:.2f}s; "
+          f"estimado para o arquivo todo: {len(fornecedor) / taxa:.1f}s)")
+    print(f"reconciliação (simulação)  {len(fornecedor) / simulacao:10.0f} registros/s  ({simulacao:.2f}s)")
+    print(f"reconciliação              {len(fornecedor) / reconciliacao:10.0f} registros/s  ({reconciliacao:.2f}s, "
+          f"{len(fornecedor) / reconciliacao / taxa:.0f}x)")
+
+    contagens = {chave: simulado[chave] for chave in ('inseridos', 'atualizados', 'inalterados', 'ausentes')}
+    if contagens != {chave: resultado[chave] for chave in contagens}:
+        sys.exit(f"Falha: simulação ({contagens}) diferente da reconciliação!")
+    estoque = {linha[0]: linha for linha in conn.execute("SELECT serie, tipo, marca, modelo, quantidade, preco FROM estoque")}
+    if estoque != esperados:
+        sys.exit(f"Falha: {len(set(estoque.items()) ^ set(esperados.items()))} produtos diferentes do arquivo do fornecedor!")
+    divergentes = conn.execute('''
+        SELECT COUNT(*) FROM estoque e
+        WHERE e.quantidade <> (SELECT COALESCE(SUM(delta), 0) FROM movimentos_estoque m WHERE m.serie = e.serie)
+    ''').fetchone()[0]
+    if divergentes:
+        sys.exit(f"Falha: {divergentes} produtos com quantidade diferente do livro de movimentos!")
+    conn.execute("INSERT INTO busca_estoque (busca_estoque, rank) VALUES ('integrity-check', 1)")
+    print("OK: estoque igual ao arquivo, livro de movimentos e índice de busca conferem.")
+
+
+BENCHMARKS = {
+    'lote': bench_lote,
+    'estresse_venda': bench_estresse_venda,
+    'planos': bench_planos,
+    'memoria_listagem': bench_memoria_listagem,
+    'leitura_threads': bench_leitura_threads,
+    'escritor': bench_escritor,
+    'crash_escritor': bench_crash_escritor,
+    'cache': bench_cache,
+    'relatorios': bench_relatorios,
+    'analise': bench_analise,
+    'crud': bench_crud,
+    'metricas': bench_metricas,
+    'cli': bench_cli,
+    'servico': bench_servico,
+    'busca': bench_busca,
+    'movimentos': bench_movimentos,
+    'normalizacao': bench_normalizacao,
+    'importacao': bench_importacao,
+    'manutencao': bench_manutencao,
+    'reconciliacao': bench_reconciliacao,
+}
+
+# Quantidade de registros de cada benchmark quando -n não é informado (os demais usam 2000)
+N_PADRAO = {
+    'memoria_listagem': 1000000,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do sistema de vendas e estoque.")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('-n', type=int, help="quantidade de registros (padrão em N_PADRAO ou 2000)")
+    parser.add_argument('--tamanhos', type=int, nargs='+', help="crud: tamanhos de base a medir")
+    parser.add_argument('--saida', help="crud: arquivo JSON para gravar os resultados")
+    parser.add_argument('--comparar', help="crud: JSON de uma execução anterior para detectar regressões")
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="crud: piora aceita no p50 (0.2 = 20%%)")
+    args = parser.parse_args()
+    # Os arquivos da linha de comando são relativos ao diretório de onde o benchmark foi chamado
+    saida = args.saida and os.path.abspath(args.saida)
+    comparar = args.comparar and os.path.abspath(args.comparar)
+    os.environ.pop('SQL_PROJETO_BANCOS', None)
+    anterior = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='bench_') as diretorio:
+        os.chdir(diretorio)
+        try:
+            n = args.n or N_PADRAO.get(args.benchmark, 2000)
+            if args.benchmark == 'crud':
+                bench_crud(n, args.tamanhos, saida, comparar, args.tolerancia)
+            else:
+                BENCHMARKS[args.benchmark](n)
+        finally:
+            os.chdir(anterior)
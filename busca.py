@@ -0,0 +1,192 @@
+import argparse
+import difflib
+import re
+
+import cliente_def
+import estoque_def
+from migracoes import dividir_comandos, tem_fts5
+
+# ---------------------------------------------------------------------------
+# Busca textual em produtos e vendas.
+# Usa os índices FTS5 'busca_estoque' (série, tipo, marca, modelo) e
+# 'busca_vendas' (nome, tipo, marca, modelo), mantidos por gatilhos em
+# estoque_def e cliente_def. Cada palavra digitada é buscada como prefixo
+# ("sams gal" encontra SAMSUNG GALAXY), sem diferenciar maiúsculas e acentos,
+# e os resultados vêm ordenados por relevância (bm25). Com aproximada=True, as
+# palavras que não existem no índice são trocadas pelos termos indexados mais
+# parecidos ("samsumg" -> "samsung"). Se o SQLite não tiver FTS5, as buscas
+# usam LIKE '%palavra%', percorrendo a tabela.
+# ---------------------------------------------------------------------------
+
+# Colunas pesquisadas em cada tabela (as mesmas dos índices FTS5)
+COLUNAS_BUSCA = {
+    'estoque': ('serie', 'tipo', 'marca', 'modelo'),
+    'mercadoria': ('nome', 'tipo', 'marca', 'modelo'),
+}
+
+# Semelhança mínima (0 a 1) para um termo indexado substituir a palavra digitada
+SEMELHANCA_MINIMA = 0.75
+
+# ---------------------------------------------------------------------------
+# Função: palavras(texto)
+# Descrição: Separa o texto digitado em palavras em minúsculas.
+# ---------------------------------------------------------------------------
+def palavras(texto):
+    return re.findall(r'\w+', texto.lower())
+
+# ---------------------------------------------------------------------------
+# Função: montar_consulta(termos, colunas=None)
+# Descrição: Monta a expressão MATCH do FTS5: todas as palavras (E), cada uma
+# como prefixo. Cada item de 'termos' é uma palavra ou uma lista de
+# alternativas (OU). 'colunas' restringe a busca a essas colunas.
+# ---------------------------------------------------------------------------
+def montar_consulta(termos, colunas=None):
+    filtro = '{' + ' '.join(colunas) + '} : ' if colunas else ''
+    partes = []
+    for termo in termos:
+        alternativas = [termo] if isinstance(termo, str) else termo
+        partes.append(filtro + '(' + ' OR '.join(f'"{alternativa}"*' for alternativa in alternativas) + ')')
+    return ' AND '.join(partes)
+
+# ---------------------------------------------------------------------------
+# Função: termos_proximos(conn, tabela_termos, palavra, limite=3)
+# Descrição: Retorna os termos do índice mais parecidos com 'palavra', entre os
+# que começam pela mesma letra. Se algum termo começar pela palavra inteira,
+# retorna só a palavra (a busca por prefixo já a encontra).
+# ---------------------------------------------------------------------------
+def termos_proximos(conn, tabela_termos, palavra, limite=3):
+    fim = palavra[:-1] + chr(ord(palavra[-1]) + 1)
+    if conn.execute(f"SELECT 1 FROM {tabela_termos} WHERE term >= ? AND term < ? LIMIT 1", (palavra, fim)).fetchone():
+        return [palavra]
+    inicial = palavra[0]
+    candidatos = [linha[0] for linha in conn.execute(
+        f"SELECT term FROM {tabela_termos} WHERE term >= ? AND term < ?", (inicial, chr(ord(inicial) + 1)))]
+    return difflib.get_close_matches(palavra, candidatos, n=limite, cutoff=SEMELHANCA_MINIMA)
+
+
+def _tem_indice(conn, indice):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (indice,)).fetchone() is not None
+
+
+def _buscar(modulo, tabela, chave, indice, texto, limite, aproximada, colunas=None, candidatos=None):
+    termos = palavras(texto)
+    if not termos:
+        return []
+    conn, cursor = modulo.conectar()
+    if not _tem_indice(conn, indice):
+        return buscar_like(tabela, texto, limite, colunas)
+
+    consulta = f"""
+        SELECT t.* FROM (
+            SELECT rowid, rank FROM (SELECT rowid, rank FROM {indice} WHERE {indice} MATCH ? LIMIT ?)
+            ORDER BY rank LIMIT ?
+        ) encontrados JOIN {tabela} t ON t.{chave} = encontrados.rowid
+        ORDER BY encontrados.rank
+    """
+    candidatos = candidatos or -1
+    cursor.execute(consulta, (montar_consulta(termos, colunas), candidatos, limite))
+    resultados = cursor.fetchall()
+    if resultados or not aproximada:
+        return resultados
+
+    alternativas = [termos_proximos(conn, indice + '_termos', termo) for termo in termos]
+    if not all(alternativas) or alternativas == [[termo] for termo in termos]:
+        return []
+    cursor.execute(consulta, (montar_consulta(alternativas, colunas), candidatos, limite))
+    return cursor.fetchall()
+
+# ---------------------------------------------------------------------------
+# Função: buscar_produtos(texto, limite=20, aproximada=True, candidatos=None)
+# Descrição: Busca produtos do estoque por série, tipo, marca e modelo.
+# Retorna as linhas de 'estoque' (como SELECT *) mais relevantes. Calcular o
+# bm25 de todos os documentos de uma palavra muito comum ("samsung" em um
+# catálogo grande) custa centenas de ms; com 'candidatos' só os primeiros
+# documentos encontrados (na ordem do índice, não da relevância) são
+# ordenados, trocando precisão por tempo.
+# ---------------------------------------------------------------------------
+def buscar_produtos(texto, limite=20, aproximada=True, candidatos=None):
+    return _buscar(estoque_def, 'estoque', 'rowid', 'busca_estoque', texto, limite, aproximada, candidatos=candidatos)
+
+# ---------------------------------------------------------------------------
+# Função: buscar_vendas(texto, limite=20, aproximada=True, candidatos=None)
+# Descrição: Busca vendas por nome do cliente, tipo, marca e modelo.
+# Retorna as linhas de 'mercadoria' (como SELECT *) mais relevantes.
+# 'candidatos' como em buscar_produtos.
+# ---------------------------------------------------------------------------
+def buscar_vendas(texto, limite=20, aproximada=True, candidatos=None):
+    return _buscar(cliente_def, 'mercadoria', 'id', 'busca_vendas', texto, limite, aproximada, candidatos=candidatos)
+
+# ---------------------------------------------------------------------------
+# Função: buscar_clientes(texto, limite=20, aproximada=True, candidatos=None)
+# Descrição: Busca clientes pelo nome. Retorna (cpf, nome) sem repetições, na
+# ordem de relevância das vendas encontradas. 'candidatos' como em buscar_produtos.
+# ---------------------------------------------------------------------------
+def buscar_clientes(texto, limite=20, aproximada=True, candidatos=None):
+    clientes = {}
+    for venda in _buscar(cliente_def, 'mercadoria', 'id', 'busca_vendas', texto, limite * 10, aproximada, ('nome',), candidatos):
+        clientes.setdefault((venda[1], venda[2]), None)
+        if len(clientes) == limite:
+            break
+    return list(clientes)
+
+# ---------------------------------------------------------------------------
+# Função: buscar_like(tabela, texto, limite=20, colunas=None)
+# Descrição: Busca sem o índice: cada palavra deve aparecer (LIKE '%palavra%')
+# em alguma das colunas. Percorre a tabela inteira; usada quando não há FTS5
+# e como referência no benchmark.
+# ---------------------------------------------------------------------------
+def buscar_like(tabela, texto, limite=20, colunas=None):
+    modulo = estoque_def if tabela == 'estoque' else cliente_def
+    colunas = colunas or COLUNAS_BUSCA[tabela]
+    termos = palavras(texto)
+    if not termos:
+        return []
+    condicao = ' AND '.join('(' + ' OR '.join(f"{coluna} LIKE ?" for coluna in colunas) + ')' for _ in termos)
+    parametros = [f'%{termo}%' for termo in termos for _ in colunas]
+    conn, cursor = modulo.conectar()
+    cursor.execute(f"SELECT * FROM {tabela} WHERE {condicao} LIMIT ?", (*parametros, limite))
+    return cursor.fetchall()
+
+# ---------------------------------------------------------------------------
+# Função: reconstruir_busca()
+# Descrição: Refaz os índices de busca a partir de 'estoque' e 'mercadoria',
+# criando-os se ainda não existirem (ex.: banco migrado sem FTS5). Use depois
+# de alterar as tabelas sem os gatilhos ou de um VACUUM completo.
+# ---------------------------------------------------------------------------
+def reconstruir_busca():
+    for modulo in (estoque_def, cliente_def):
+        conn, cursor = modulo.conectar()
+        if not tem_fts5(conn):
+            print("Erro: O SQLite em uso não tem suporte a FTS5.")
+            return
+        try:
+            for comando in dividir_comandos(modulo.SQL_BUSCA + modulo.SQL_RECONSTRUIR_BUSCA):
+                cursor.execute(comando)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    print("Índices de busca reconstruídos com sucesso!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Busca textual em produtos, vendas e clientes.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    for nome, ajuda in (('produtos', "busca no estoque"), ('vendas', "busca nas vendas"), ('clientes', "busca clientes pelo nome")):
+        comando = comandos.add_parser(nome, help=ajuda)
+        comando.add_argument('texto')
+        comando.add_argument('--limite', type=int, default=20)
+        comando.add_argument('--exata', action='store_true', help="não troca palavras inexistentes pelas mais parecidas")
+        comando.add_argument('--candidatos', type=int, help="ordena só os N primeiros documentos encontrados (mais rápido, menos preciso)")
+    comandos.add_parser('reconstruir', help="refaz os índices de busca")
+    args = parser.parse_args()
+
+    if args.comando == 'reconstruir':
+        reconstruir_busca()
+    else:
+        buscar = {'produtos': buscar_produtos, 'vendas': buscar_vendas, 'clientes': buscar_clientes}[args.comando]
+        resultados = buscar(args.texto, args.limite, aproximada=not args.exata, candidatos=args.candidatos)
+        for linha in resultados:
+            print(linha)
+        if not resultados:
+            print("Nenhum resultado encontrado.")
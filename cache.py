@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+# ---------------------------------------------------------------------------
+# Classe: CacheLRU
+# Descrição: Cache em memória com limite de itens e validade opcional.
+# Quando cheio, descarta o item usado há mais tempo (LRU); itens com mais de
+# 'ttl' segundos são tratados como ausentes. Guarda também valores None, para
+# que buscas por chaves inexistentes não voltem ao banco. Pode ser usado por
+# várias threads ao mesmo tempo e conta acertos e faltas. 'geracao' aumenta a
+# cada invalidação: quem lê do banco anota a geração antes da leitura e a passa
+# a guardar, que descarta o valor se houve invalidação no meio (o valor lido
+# pode ser anterior à alteração que invalidou o cache).
+# ---------------------------------------------------------------------------
+class CacheLRU:
+    def __init__(self, tamanho_maximo=4096, ttl=None):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self.acertos = 0
+        self.faltas = 0
+        self.geracao = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    # -----------------------------------------------------------------------
+    # Método: obter(chave)
+    # Descrição: Retorna (True, valor) se a chave estiver no cache e válida,
+    # senão (False, None).
+    # -----------------------------------------------------------------------
+    def obter(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None and (self.ttl is None or time.monotonic() - item[1] < self.ttl):
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return True, item[0]
+            if item is not None:
+                del self._itens[chave]
+            self.faltas += 1
+            return False, None
+
+    # -----------------------------------------------------------------------
+    # Método: guardar(chave, valor, geracao=None)
+    # Descrição: Guarda o valor, descartando o item menos usado se o cache encher.
+    # Com 'geracao', não guarda nada se o cache foi invalidado depois dela.
+    # -----------------------------------------------------------------------
+    def guardar(self, chave, valor, geracao=None):
+        if self.tamanho_maximo <= 0:
+            return
+        with self._trava:
+            if geracao is not None and geracao != self.geracao:
+                return
+            self._itens[chave] = (valor, time.monotonic())
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    # -----------------------------------------------------------------------
+    # Método: remover(chave) / limpar()
+    # Descrição: Invalida uma chave ou o cache inteiro.
+    # -----------------------------------------------------------------------
+    def remover(self, chave):
+        with self._trava:
+            self.geracao += 1
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._trava:
+            self.geracao += 1
+            self._itens.clear()
+
+    # -----------------------------------------------------------------------
+    # Método: estatisticas()
+    # Descrição: Retorna um dicionário com acertos, faltas, taxa de acerto e tamanho.
+    # -----------------------------------------------------------------------
+    def estatisticas(self):
+        consultas = self.acertos + self.faltas
+        return {
+            'acertos': self.acertos,
+            'faltas': self.faltas,
+            'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+            'tamanho': len(self._itens),
+        }
@@ -0,0 +1,262 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import shlex
+import sqlite3
+import sys
+
+import cliente_def
+import estoque_def
+import relatorios
+import venda_def
+from conexao import marcar_grupo
+
+# ---------------------------------------------------------------------------
+# Linha de comando não interativa.
+# Oferece as operações do menu (app.py) como subcomandos, com saída em JSON
+# (uma linha por comando). Exemplos:
+#     python cli.py vender --serie S001 --cpf 123 --nome "ANA" --nascimento 01/01/1990 --quantidade 2
+#     python cli.py estoque add --serie S001 --tipo CELULAR --marca SAMSUNG --modelo S23 --quantidade 10 --preco 4000
+#     python cli.py estoque import produtos.csv --simular
+#     python cli.py vendas export --saida vendas.jsonl
+#     python cli.py relatorio receita --por tipo marca
+#     python cli.py --batch comandos.txt      (ou --batch - para ler da entrada padrão)
+# No modo --batch cada linha do arquivo é um comando com a mesma sintaxe acima.
+# Os comandos consecutivos que escrevem no mesmo banco são agrupados em uma
+# transação (até --grupo comandos), cada um dentro do seu SAVEPOINT, e o
+# resultado de cada comando só é impresso depois do commit do seu grupo.
+# ---------------------------------------------------------------------------
+
+# ---------------------------------------------------------------------------
+# Função: criar_parser()
+# Descrição: Monta o argparse com todos os subcomandos.
+# ---------------------------------------------------------------------------
+def criar_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description="Vendas e estoque pela linha de comando.")
+    parser.add_argument('--batch', metavar='ARQUIVO', help="executa os comandos do arquivo ('-' para a entrada padrão)")
+    parser.add_argument('--grupo', type=int, default=500, help="comandos por transação no modo --batch")
+    comandos = parser.add_subparsers(dest='comando')
+
+    vender = comandos.add_parser('vender', help="registra uma venda")
+    vender.add_argument('--serie', required=True)
+    vender.add_argument('--cpf', required=True)
+    vender.add_argument('--nome', required=True)
+    vender.add_argument('--nascimento', required=True, help="DD/MM/AAAA")
+    vender.add_argument('--quantidade', type=int, required=True)
+    vender.add_argument('--data', help="data da compra, DD/MM/AAAA HH:MM:SS (padrão: agora)")
+    vender.set_defaults(executar=_vender, banco='venda')
+
+    estoque = comandos.add_parser('estoque', help="operações de estoque").add_subparsers(dest='acao', required=True)
+    adicionar = estoque.add_parser('add', help="adiciona o produto ou atualiza se a série já existir")
+    for campo in ('serie', 'tipo', 'marca', 'modelo'):
+        adicionar.add_argument('--' + campo, required=True)
+    adicionar.add_argument('--quantidade', type=int, required=True)
+    adicionar.add_argument('--preco', type=float, required=True)
+    adicionar.set_defaults(executar=_estoque_add, banco='estoque')
+    importar = estoque.add_parser('import', help="reconcilia o estoque com um arquivo CSV ou JSONL do fornecedor")
+    importar.add_argument('arquivo')
+    importar.add_argument('--simular', action='store_true', help="só conta as diferenças, sem gravar nada")
+    importar.add_argument('--remover-ausentes', action='store_true',
+                          help="exclui os produtos do estoque que não estão no arquivo")
+    importar.set_defaults(executar=_estoque_import, banco='estoque')
+
+    vendas = comandos.add_parser('vendas', help="operações de vendas").add_subparsers(dest='acao', required=True)
+    exportar = vendas.add_parser('export', help="exporta as vendas em JSON lines ou CSV")
+    exportar.add_argument('--saida', help="arquivo de saída (padrão: saída padrão; obrigatório no modo --batch)")
+    exportar.add_argument('--formato', choices=('jsonl', 'csv'), default='jsonl')
+    exportar.add_argument('--cpf')
+    exportar.add_argument('--serie')
+    exportar.set_defaults(executar=_vendas_export, banco=None)
+
+    relatorio = comandos.add_parser('relatorio', help="relatórios").add_subparsers(dest='acao', required=True)
+    receita = relatorio.add_parser('receita', help="receita agrupada")
+    receita.add_argument('--por', nargs='+', default=['tipo'], choices=relatorios.GRUPOS_RECEITA)
+    receita.add_argument('--inicio')
+    receita.add_argument('--fim')
+    receita.set_defaults(executar=_relatorio, banco=None)
+    clientes = relatorio.add_parser('clientes', help="totais por cliente")
+    clientes.add_argument('--limite', type=int, default=20)
+    clientes.set_defaults(executar=_relatorio, banco=None)
+    relatorio.add_parser('estoque', help="valor do estoque").set_defaults(executar=_relatorio, banco=None)
+    return parser
+
+
+def _vender(args, saida):
+    return venda_def.vender(args.serie, args.cpf, args.nome, args.nascimento, args.quantidade, args.data)
+
+
+# ---------------------------------------------------------------------------
+# Função: adicionar_ou_atualizar(serie, tipo, marca, modelo, quantidade, preco)
+# Descrição: Mesma regra da opção 5 do menu: atualiza o produto se a série já
+# existir no estoque, senão o adiciona.
+# ---------------------------------------------------------------------------
+def adicionar_ou_atualizar(serie, tipo, marca, modelo, quantidade, preco):
+    if estoque_def.produto_existe(serie):
+        estoque_def.atualizar_produto(serie, tipo, marca, modelo, quantidade, preco)
+    else:
+        estoque_def.adicionar_produto(serie, tipo, marca, modelo, quantidade, preco)
+
+
+def _estoque_add(args, saida):
+    adicionar_ou_atualizar(args.serie, args.tipo, args.marca, args.modelo, args.quantidade, args.preco)
+
+
+def _estoque_import(args, saida):
+    resultado = estoque_def.reconciliar_estoque(args.arquivo, simular=args.simular,
+                                                remover_ausentes=args.remover_ausentes)
+    resultado['erros'] = [{'registro': indice, 'erro': erro} for indice, erro in resultado['erros']]
+    return resultado
+
+
+def _vendas_export(args, saida):
+    if not args.saida and saida is None:
+        raise ValueError("no modo --batch, vendas export precisa de --saida")
+    filtros = {campo: valor for campo, valor in (('cpf', args.cpf), ('serie', args.serie)) if valor}
+    destino = open(args.saida, 'w', newline='', encoding='utf-8') if args.saida else saida
+    try:
+        escritor = csv.writer(destino) if args.formato == 'csv' else None
+        if escritor:
+            escritor.writerow(cliente_def.COLUNAS_MERCADORIA)
+        exportadas = 0
+        for venda in cliente_def.iterar_vendas(tamanho_pagina=5000, **filtros):
+            if escritor:
+                escritor.writerow(venda)
+            else:
+                destino.write(json.dumps(dict(zip(cliente_def.COLUNAS_MERCADORIA, venda)), ensure_ascii=False) + '\n')
+            exportadas += 1
+    finally:
+        if args.saida:
+            destino.close()
+    return {'exportadas': exportadas}
+
+
+def _relatorio(args, saida):
+    if args.acao == 'receita':
+        return [list(linha) for linha in relatorios.receita_por_grupo(args.por, args.inicio, args.fim)]
+    if args.acao == 'clientes':
+        return [list(linha) for linha in relatorios.totais_por_cliente(limite=args.limite)]
+    return dict(zip(('produtos', 'quantidade', 'valor'), relatorios.valor_estoque()))
+
+
+# ---------------------------------------------------------------------------
+# Função: executar_comando(args, lote=False)
+# Descrição: Executa um comando já interpretado pelo parser e retorna o
+# resultado como dicionário: 'ok', 'mensagem' (o que a função imprimiu) e,
+# quando houver, 'dados'. As mensagens das funções começadas por "Erro" e
+# qualquer exceção do comando marcam o comando como falho. Com lote=True
+# (modo --batch) a saída padrão é só dos resultados em JSON, então o comando
+# não recebe a saída padrão para escrever.
+# ---------------------------------------------------------------------------
+def executar_comando(args, lote=False):
+    saida = None if lote else sys.stdout
+    capturado = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(capturado):
+            dados = args.executar(args, saida)
+    except Exception as e:
+        return {'ok': False, 'mensagem': f"Erro: {e}"}
+    mensagem = capturado.getvalue().strip()
+    if isinstance(dados, str):
+        mensagem, dados = dados, None
+    resultado = {'ok': not mensagem.startswith('Erro') and '\nErro' not in mensagem, 'mensagem': mensagem}
+    if dados is not None:
+        resultado['dados'] = dados
+    return resultado
+
+
+def _conexao_do_banco(banco):
+    if banco == 'venda':
+        return venda_def.conectar_venda()
+    if banco == 'estoque':
+        return estoque_def.conectar()[0]
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Função: executar_lote(linhas, tamanho_grupo=500)
+# Descrição: Executa uma sequência de linhas de comando, agrupando os comandos
+# consecutivos que escrevem no mesmo banco em transações de até 'tamanho_grupo'
+# comandos, todas pela mesma conexão aberta. Gera um dicionário de resultado
+# por comando (com o número da linha), na ordem, depois do commit do grupo.
+# ---------------------------------------------------------------------------
+def executar_lote(linhas, tamanho_grupo=500):
+    parser = criar_parser()
+    aberta = None
+    pendentes = []
+
+    def fechar_grupo():
+        nonlocal aberta
+        if aberta is None:
+            return []
+        try:
+            aberta.commit()
+        except sqlite3.Error as e:
+            aberta.rollback()
+            for resultado in pendentes:
+                resultado.update(ok=False, mensagem=f"Erro: {e}")
+        aberta = None
+        estoque_def.invalidar_cache()
+        concluidos = list(pendentes)
+        pendentes.clear()
+        return concluidos
+
+    try:
+        for numero, linha in enumerate(linhas, start=1):
+            linha = linha.strip()
+            if not linha or linha.startswith('#'):
+                continue
+            try:
+                with contextlib.redirect_stderr(io.StringIO()):
+                    args = parser.parse_args(shlex.split(linha))
+            except (SystemExit, ValueError):
+                args = None
+            if args is None or args.comando is None:
+                yield from fechar_grupo()
+                yield {'linha': numero, 'ok': False, 'mensagem': f"Erro: comando inválido: {linha}"}
+                continue
+
+            conn = _conexao_do_banco(args.banco)
+            if aberta is not None and (conn is not aberta or len(pendentes) >= tamanho_grupo):
+                yield from fechar_grupo()
+            if conn is None:
+                yield {'linha': numero, **executar_comando(args, lote=True)}
+                continue
+
+            if aberta is None:
+                conn.execute('BEGIN IMMEDIATE')
+                aberta = conn
+            marcar_grupo(True)
+            try:
+                conn.execute('SAVEPOINT operacao')
+                resultado = executar_comando(args, lote=True)
+                if not resultado['ok']:
+                    conn.execute('ROLLBACK TO operacao')
+                conn.execute('RELEASE operacao')
+            finally:
+                marcar_grupo(False)
+            pendentes.append({'linha': numero, **resultado})
+        yield from fechar_grupo()
+    finally:
+        if aberta is not None and aberta.in_transaction:
+            aberta.rollback()
+
+
+if __name__ == "__main__":
+    parser = criar_parser()
+    args = parser.parse_args()
+    if args.batch:
+        entrada = sys.stdin if args.batch == '-' else open(args.batch, encoding='utf-8')
+        falhas = 0
+        with entrada:
+            for resultado in executar_lote(entrada, args.grupo):
+                falhas += not resultado['ok']
+                print(json.dumps(resultado, ensure_ascii=False))
+        sys.exit(1 if falhas else 0)
+    if args.comando is None:
+        parser.print_help()
+        sys.exit(2)
+    resultado = executar_comando(args)
+    print(json.dumps(resultado, ensure_ascii=False))
+    sys.exit(0 if resultado['ok'] else 1)
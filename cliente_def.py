@@ -1,12 +1,24 @@
+import csv
+import json
 import sqlite3
-from datetime import datetime
+from datetime import date, datetime
+from itertools import islice
 
-# Conectar ao banco de dados 'cliente.db' e criar um cursor para executar comandos SQL
-conn = sqlite3.connect('cliente.db')
-cursor = conn.cursor()
+import estoque_def
+from conexao import confirmar, desfazer, obter_conexao, registrar_preparo
+from migracoes import aplicar_migracoes, dividir_comandos, migracao_fts5, tem_fts5
 
-# Criar a tabela 'mercadoria' se ela não existir
-cursor.execute(''' 
+
+# Função: conectar
+# Descrição: Retorna a conexão da thread atual com 'cliente.db' (ver conexao.py) e um cursor novo.
+def conectar():
+    conn = obter_conexao('cliente')
+    return conn, conn.cursor()
+
+
+# Tabela original das vendas, com os dados do cliente e do produto repetidos em cada linha.
+# A migração 6 a troca pela view 'mercadoria' sobre clientes, produtos e vendas (ver abaixo).
+SQL_TABELA_MERCADORIA = '''
     CREATE TABLE IF NOT EXISTS mercadoria (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         cpf VARCHAR(14) NOT NULL,
@@ -21,8 +33,394 @@ cursor.execute('''
         valor_unitario REAL NOT NULL,
         valor_total REAL NOT NULL
     )
-''')
-conn.commit()
+'''
+
+
+# Função: criar_tabela
+# Descrição: Cria a tabela 'mercadoria' se ela não existir (banco novo); as migrações levam
+# o banco ao esquema atual. Em um banco já migrado 'mercadoria' é uma view e nada muda.
+def criar_tabela():
+    conn, cursor = conectar()
+    cursor.execute(SQL_TABELA_MERCADORIA)
+    conn.commit()
+
+
+# Esquema normalizado das vendas (migração 6):
+#   clientes - um registro por CPF, com nome e data de nascimento
+#   produtos - um registro por série vendida, com tipo, marca e modelo. Faz o papel
+#              de chave estrangeira para estoque.serie, que fica em outro arquivo
+#              (o SQLite não valida chaves entre bancos diferentes)
+#   vendas   - cada venda aponta para o cliente e o produto pelo id inteiro. A data
+#              fica só em ISO (data_compra_iso); data_compra_texto guarda o texto
+#              original apenas quando ele não pôde ser convertido. O valor total é
+#              quantidade * valor_unitario, calculado na leitura.
+# 'mercadoria' passa a ser uma view com as mesmas colunas de antes, então as leituras
+# (iterar_vendas, relatorios, analise, busca) não mudam; as escritas vão para as tabelas.
+SQL_TABELAS_VENDAS = '''
+    CREATE TABLE IF NOT EXISTS clientes (
+        id INTEGER PRIMARY KEY,
+        cpf TEXT NOT NULL UNIQUE,
+        nome TEXT NOT NULL,
+        data_nascimento TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS produtos (
+        id INTEGER PRIMARY KEY,
+        serie TEXT NOT NULL UNIQUE,
+        tipo TEXT NOT NULL,
+        marca TEXT NOT NULL,
+        modelo TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS vendas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_cliente INTEGER NOT NULL REFERENCES clientes (id),
+        id_produto INTEGER NOT NULL REFERENCES produtos (id),
+        quantidade INTEGER NOT NULL,
+        valor_unitario REAL NOT NULL,
+        data_compra_iso TEXT,
+        cancelada_em TEXT,
+        data_compra_texto TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_vendas_cliente ON vendas (id_cliente);
+    CREATE INDEX IF NOT EXISTS idx_vendas_produto ON vendas (id_produto);
+    CREATE INDEX IF NOT EXISTS idx_vendas_data_compra_iso ON vendas (data_compra_iso);
+    CREATE TRIGGER IF NOT EXISTS trg_clientes_cpf BEFORE UPDATE OF cpf ON clientes BEGIN
+        SELECT RAISE(ABORT, 'o CPF de um cliente não pode ser alterado');
+    END;
+'''
+SQL_VIEW_MERCADORIA = '''
+    CREATE VIEW IF NOT EXISTS mercadoria AS
+    SELECT v.id, c.cpf, c.nome, c.data_nascimento,
+           COALESCE(v.data_compra_texto, strftime('%d/%m/%Y %H:%M:%S', v.data_compra_iso)) AS data_compra,
+           p.serie, p.tipo, p.marca, p.modelo, v.quantidade, v.valor_unitario,
+           v.quantidade * v.valor_unitario AS valor_total, v.data_compra_iso, v.cancelada_em
+    FROM vendas v JOIN clientes c ON c.id = v.id_cliente JOIN produtos p ON p.id = v.id_produto;
+'''
+# Gravação de uma venda: o cliente e o produto são criados na primeira venda e a venda aponta
+# para os dois. Uma venda nova não altera o cadastro (nome do cliente, descrição do produto),
+# que vale também para as vendas anteriores; ele só muda pelas edições explícitas
+# (atualizar_cliente e atualizar_venda, com SQL_EDITAR_CLIENTE e SQL_EDITAR_PRODUTO).
+SQL_SALVAR_CLIENTE = '''
+    INSERT INTO clientes (cpf, nome, data_nascimento) VALUES (?, ?, ?)
+    ON CONFLICT (cpf) DO NOTHING
+'''
+SQL_SALVAR_PRODUTO = '''
+    INSERT INTO produtos (serie, tipo, marca, modelo) VALUES (?, ?, ?, ?)
+    ON CONFLICT (serie) DO NOTHING
+'''
+SQL_EDITAR_CLIENTE = '''
+    INSERT INTO clientes (cpf, nome, data_nascimento) VALUES (?, ?, ?)
+    ON CONFLICT (cpf) DO UPDATE SET nome = excluded.nome, data_nascimento = excluded.data_nascimento
+    WHERE nome <> excluded.nome OR data_nascimento <> excluded.data_nascimento
+'''
+SQL_EDITAR_PRODUTO = '''
+    INSERT INTO produtos (serie, tipo, marca, modelo) VALUES (?, ?, ?, ?)
+    ON CONFLICT (serie) DO UPDATE SET tipo = excluded.tipo, marca = excluded.marca, modelo = excluded.modelo
+    WHERE tipo <> excluded.tipo OR marca <> excluded.marca OR modelo <> excluded.modelo
+'''
+SQL_INSERIR_VENDA = '''
+    INSERT INTO vendas (id_cliente, id_produto, quantidade, valor_unitario, data_compra_iso, data_compra_texto)
+    VALUES ((SELECT id FROM clientes WHERE cpf = ?), (SELECT id FROM produtos WHERE serie = ?), ?, ?, ?, ?)
+'''
+
+
+# Tabelas de resumo das vendas, lidas pelo módulo relatorios:
+#   resumo_vendas_diario - vendas, unidades e receita por dia, tipo, marca e modelo
+#   resumo_clientes      - vendas, unidades e total gasto por CPF
+# Os gatilhos abaixo somam cada venda inserida e subtraem cada venda removida
+# (uma alteração conta como remoção da versão antiga e inserção da nova), então
+# um relatório lê uma linha por grupo em vez de percorrer as vendas.
+# Vendas canceladas (cancelada_em preenchida) não entram nos resumos.
+_SQL_SOMAR_VENDA = '''
+    INSERT INTO resumo_vendas_diario (dia, tipo, marca, modelo, vendas, quantidade, receita)
+    SELECT COALESCE(substr(NEW.data_compra_iso, 1, 10), ''), tipo, marca, modelo, 1, NEW.quantidade,
+           NEW.quantidade * NEW.valor_unitario
+    FROM produtos WHERE id = NEW.id_produto
+    ON CONFLICT (dia, tipo, marca, modelo) DO UPDATE SET
+        vendas = vendas + 1, quantidade = quantidade + excluded.quantidade, receita = receita + excluded.receita;
+    INSERT INTO resumo_clientes (cpf, vendas, quantidade, total)
+    SELECT cpf, 1, NEW.quantidade, NEW.quantidade * NEW.valor_unitario FROM clientes WHERE id = NEW.id_cliente
+    ON CONFLICT (cpf) DO UPDATE SET
+        vendas = vendas + 1, quantidade = quantidade + excluded.quantidade, total = total + excluded.total;
+'''
+_SQL_GRUPO_ANTIGO = '''dia = COALESCE(substr(OLD.data_compra_iso, 1, 10), '')
+        AND tipo = (SELECT tipo FROM produtos WHERE id = OLD.id_produto)
+        AND marca = (SELECT marca FROM produtos WHERE id = OLD.id_produto)
+        AND modelo = (SELECT modelo FROM produtos WHERE id = OLD.id_produto)'''
+_SQL_SUBTRAIR_VENDA = f'''
+    UPDATE resumo_vendas_diario SET
+        vendas = vendas - 1, quantidade = quantidade - OLD.quantidade, receita = receita - OLD.quantidade * OLD.valor_unitario
+    WHERE {_SQL_GRUPO_ANTIGO};
+    DELETE FROM resumo_vendas_diario WHERE {_SQL_GRUPO_ANTIGO} AND vendas = 0;
+    UPDATE resumo_clientes SET
+        vendas = vendas - 1, quantidade = quantidade - OLD.quantidade, total = total - OLD.quantidade * OLD.valor_unitario
+    WHERE cpf = (SELECT cpf FROM clientes WHERE id = OLD.id_cliente);
+    DELETE FROM resumo_clientes WHERE cpf = (SELECT cpf FROM clientes WHERE id = OLD.id_cliente) AND vendas = 0;
+'''
+SQL_TABELAS_RESUMO = '''
+    CREATE TABLE IF NOT EXISTS resumo_vendas_diario (
+        dia TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        marca TEXT NOT NULL,
+        modelo TEXT NOT NULL,
+        vendas INTEGER NOT NULL,
+        quantidade INTEGER NOT NULL,
+        receita REAL NOT NULL,
+        PRIMARY KEY (dia, tipo, marca, modelo)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS resumo_clientes (
+        cpf TEXT PRIMARY KEY,
+        vendas INTEGER NOT NULL,
+        quantidade INTEGER NOT NULL,
+        total REAL NOT NULL
+    ) WITHOUT ROWID;
+'''
+# Mudar tipo, marca ou modelo de um produto leva as vendas dele para o novo grupo.
+# Os dias afetados saem das vendas do produto (índice por id_produto), sem varrer o resumo.
+SQL_GATILHO_RESUMO_PRODUTOS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_produtos_update AFTER UPDATE OF tipo, marca, modelo ON produtos BEGIN
+        UPDATE resumo_vendas_diario SET
+            vendas = vendas - movidas.n, quantidade = quantidade - movidas.q, receita = receita - movidas.r
+        FROM (SELECT COALESCE(substr(data_compra_iso, 1, 10), '') AS d, COUNT(*) AS n, SUM(quantidade) AS q,
+                     SUM(quantidade * valor_unitario) AS r
+              FROM vendas WHERE id_produto = OLD.id AND cancelada_em IS NULL GROUP BY 1) AS movidas
+        WHERE dia = movidas.d AND tipo = OLD.tipo AND marca = OLD.marca AND modelo = OLD.modelo;
+        DELETE FROM resumo_vendas_diario
+        WHERE dia IN (SELECT COALESCE(substr(data_compra_iso, 1, 10), '') FROM vendas
+                      WHERE id_produto = OLD.id AND cancelada_em IS NULL)
+          AND tipo = OLD.tipo AND marca = OLD.marca AND modelo = OLD.modelo AND vendas = 0;
+        INSERT INTO resumo_vendas_diario (dia, tipo, marca, modelo, vendas, quantidade, receita)
+        SELECT COALESCE(substr(data_compra_iso, 1, 10), ''), NEW.tipo, NEW.marca, NEW.modelo, COUNT(*), SUM(quantidade),
+               SUM(quantidade * valor_unitario)
+        FROM vendas WHERE id_produto = NEW.id AND cancelada_em IS NULL GROUP BY 1
+        ON CONFLICT (dia, tipo, marca, modelo) DO UPDATE SET
+            vendas = vendas + excluded.vendas, quantidade = quantidade + excluded.quantidade,
+            receita = receita + excluded.receita;
+    END;
+'''
+# Uma alteração é tratada por dois gatilhos: um subtrai a versão antiga (se ela
+# contava) e outro soma a nova (se ela conta); cancelar uma venda só subtrai.
+SQL_GATILHOS_RESUMO = f'''
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_vendas_insert AFTER INSERT ON vendas WHEN NEW.cancelada_em IS NULL BEGIN
+        {_SQL_SOMAR_VENDA}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_vendas_delete AFTER DELETE ON vendas WHEN OLD.cancelada_em IS NULL BEGIN
+        {_SQL_SUBTRAIR_VENDA}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_vendas_update
+    AFTER UPDATE OF id_cliente, id_produto, quantidade, valor_unitario, data_compra_iso, cancelada_em ON vendas
+    WHEN OLD.cancelada_em IS NULL BEGIN
+        {_SQL_SUBTRAIR_VENDA}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_vendas_update_nova
+    AFTER UPDATE OF id_cliente, id_produto, quantidade, valor_unitario, data_compra_iso, cancelada_em ON vendas
+    WHEN NEW.cancelada_em IS NULL BEGIN
+        {_SQL_SOMAR_VENDA}
+    END;
+''' + SQL_GATILHO_RESUMO_PRODUTOS
+# Recalcula os resumos a partir das vendas (usado na migração e por relatorios)
+SQL_RECONSTRUIR_RESUMOS = '''
+    DELETE FROM resumo_vendas_diario;
+    INSERT INTO resumo_vendas_diario (dia, tipo, marca, modelo, vendas, quantidade, receita)
+    SELECT COALESCE(substr(data_compra_iso, 1, 10), ''), tipo, marca, modelo, COUNT(*), SUM(quantidade), SUM(valor_total)
+    FROM mercadoria WHERE cancelada_em IS NULL GROUP BY 1, 2, 3, 4;
+    DELETE FROM resumo_clientes;
+    INSERT INTO resumo_clientes (cpf, vendas, quantidade, total)
+    SELECT cpf, COUNT(*), SUM(quantidade), SUM(valor_total) FROM mercadoria WHERE cancelada_em IS NULL GROUP BY cpf;
+'''
+
+# Índice de busca textual (FTS5) sobre nome do cliente, tipo, marca e modelo das
+# vendas, usado pelo módulo busca. Não guarda cópia dos textos
+# (content='mercadoria'); os gatilhos em vendas, clientes e produtos o mantêm
+# sincronizado: mudar o nome de um cliente ou a descrição de um produto
+# reindexa as vendas deles.
+SQL_TABELA_BUSCA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS busca_vendas USING fts5(
+        nome, tipo, marca, modelo,
+        content='mercadoria', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS busca_vendas_termos USING fts5vocab(busca_vendas, 'row');
+'''
+SQL_GATILHOS_BUSCA = '''
+    CREATE TRIGGER IF NOT EXISTS trg_busca_vendas_insert AFTER INSERT ON vendas BEGIN
+        INSERT INTO busca_vendas (rowid, nome, tipo, marca, modelo)
+        SELECT NEW.id, c.nome, p.tipo, p.marca, p.modelo FROM clientes c, produtos p
+        WHERE c.id = NEW.id_cliente AND p.id = NEW.id_produto;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_busca_vendas_delete AFTER DELETE ON vendas BEGIN
+        INSERT INTO busca_vendas (busca_vendas, rowid, nome, tipo, marca, modelo)
+        SELECT 'delete', OLD.id, c.nome, p.tipo, p.marca, p.modelo FROM clientes c, produtos p
+        WHERE c.id = OLD.id_cliente AND p.id = OLD.id_produto;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_busca_vendas_update AFTER UPDATE OF id_cliente, id_produto ON vendas BEGIN
+        INSERT INTO busca_vendas (busca_vendas, rowid, nome, tipo, marca, modelo)
+        SELECT 'delete', OLD.id, c.nome, p.tipo, p.marca, p.modelo FROM clientes c, produtos p
+        WHERE c.id = OLD.id_cliente AND p.id = OLD.id_produto;
+        INSERT INTO busca_vendas (rowid, nome, tipo, marca, modelo)
+        SELECT NEW.id, c.nome, p.tipo, p.marca, p.modelo FROM clientes c, produtos p
+        WHERE c.id = NEW.id_cliente AND p.id = NEW.id_produto;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_busca_clientes_update AFTER UPDATE OF nome ON clientes BEGIN
+        INSERT INTO busca_vendas (busca_vendas, rowid, nome, tipo, marca, modelo)
+        SELECT 'delete', v.id, OLD.nome, p.tipo, p.marca, p.modelo
+        FROM vendas v JOIN produtos p ON p.id = v.id_produto WHERE v.id_cliente = OLD.id;
+        INSERT INTO busca_vendas (rowid, nome, tipo, marca, modelo)
+        SELECT v.id, NEW.nome, p.tipo, p.marca, p.modelo
+        FROM vendas v JOIN produtos p ON p.id = v.id_produto WHERE v.id_cliente = NEW.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_busca_produtos_update AFTER UPDATE OF tipo, marca, modelo ON produtos BEGIN
+        INSERT INTO busca_vendas (busca_vendas, rowid, nome, tipo, marca, modelo)
+        SELECT 'delete', v.id, c.nome, OLD.tipo, OLD.marca, OLD.modelo
+        FROM vendas v JOIN clientes c ON c.id = v.id_cliente WHERE v.id_produto = OLD.id;
+        INSERT INTO busca_vendas (rowid, nome, tipo, marca, modelo)
+        SELECT v.id, c.nome, NEW.tipo, NEW.marca, NEW.modelo
+        FROM vendas v JOIN clientes c ON c.id = v.id_cliente WHERE v.id_produto = NEW.id;
+    END;
+'''
+SQL_BUSCA = SQL_TABELA_BUSCA + SQL_GATILHOS_BUSCA
+# Refaz o índice de busca a partir da view 'mercadoria' (usado na migração e por busca)
+SQL_RECONSTRUIR_BUSCA = "INSERT INTO busca_vendas (busca_vendas) VALUES ('rebuild');"
+
+# Cópia da tabela 'mercadoria' antiga para o esquema normalizado (migração 6).
+# Em ordem de id, então os dados da venda mais recente de cada CPF e série são os que ficam
+# ('WHERE true' evita a ambiguidade do ON CONFLICT logo após o SELECT).
+SQL_COPIAR_CLIENTES = '''
+    INSERT INTO clientes (cpf, nome, data_nascimento)
+    SELECT cpf, nome, data_nascimento FROM mercadoria WHERE true ORDER BY id
+    ON CONFLICT (cpf) DO UPDATE SET nome = excluded.nome, data_nascimento = excluded.data_nascimento
+'''
+SQL_COPIAR_PRODUTOS = '''
+    INSERT INTO produtos (serie, tipo, marca, modelo)
+    SELECT serie, tipo, marca, modelo FROM mercadoria WHERE true ORDER BY id
+    ON CONFLICT (serie) DO UPDATE SET tipo = excluded.tipo, marca = excluded.marca, modelo = excluded.modelo
+'''
+SQL_COPIAR_VENDAS = '''
+    INSERT INTO vendas (id, id_cliente, id_produto, quantidade, valor_unitario, data_compra_iso, cancelada_em, data_compra_texto)
+    SELECT m.id, c.id, p.id, m.quantidade, m.valor_unitario, m.data_compra_iso, m.cancelada_em,
+           CASE WHEN m.data_compra_iso IS NULL THEN m.data_compra END
+    FROM mercadoria m JOIN clientes c ON c.cpf = m.cpf JOIN produtos p ON p.serie = m.serie
+'''
+
+
+# Função: normalizar_vendas
+# Descrição: Migração 6. Cria clientes, produtos e vendas e copia a tabela 'mercadoria' para elas
+# (um INSERT ... SELECT por tabela, sem trazer as linhas para o Python), mantendo os ids das vendas
+# e a sequência do AUTOINCREMENT. Depois troca a tabela pela view 'mercadoria' e cria os gatilhos
+# dos resumos e da busca sobre as novas tabelas.
+# Tudo roda em uma única transação, a de aplicar_migracoes: o bloqueio de escrita fica preso e o
+# journal cresce com a tabela inteira até o commit, mas uma falha não deixa o banco pela metade.
+# Em bancos grandes, abra o banco pela primeira vez (o que aplica a migração) fora do horário de uso.
+def normalizar_vendas(conn):
+    for comando in dividir_comandos(SQL_TABELAS_VENDAS):
+        conn.execute(comando)
+    conn.execute(SQL_COPIAR_CLIENTES)
+    conn.execute(SQL_COPIAR_PRODUTOS)
+    conn.execute(SQL_COPIAR_VENDAS)
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'vendas'")
+    conn.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'vendas', seq FROM sqlite_sequence WHERE name = 'mercadoria'")
+
+    conn.execute("DROP TABLE mercadoria")
+    script = SQL_VIEW_MERCADORIA + SQL_GATILHOS_RESUMO + SQL_RECONSTRUIR_RESUMOS
+    if tem_fts5(conn):
+        script += SQL_BUSCA + SQL_RECONSTRUIR_BUSCA
+    for comando in dividir_comandos(script):
+        conn.execute(comando)
+
+
+# Migrações de esquema da 'cliente.db', aplicadas em ordem conforme PRAGMA user_version.
+# Novas alterações de esquema entram sempre no final da lista.
+MIGRACOES = [
+    # 1: índices para as buscas por CPF (buscar/atualizar/deletar) e por série
+    '''
+    CREATE INDEX IF NOT EXISTS idx_mercadoria_cpf ON mercadoria (cpf);
+    CREATE INDEX IF NOT EXISTS idx_mercadoria_serie ON mercadoria (serie);
+    ''',
+    # 2: data da compra em ISO-8601 (AAAA-MM-DD HH:MM:SS), que ordena cronologicamente,
+    # para consultas por período; preenchida para linhas antigas por migrar_datas_compra()
+    '''
+    ALTER TABLE mercadoria ADD COLUMN data_compra_iso TEXT;
+    CREATE INDEX IF NOT EXISTS idx_mercadoria_data_compra_iso ON mercadoria (data_compra_iso);
+    ''',
+    # 3: tabelas de resumo usadas pelo módulo relatorios (os gatilhos e o cálculo
+    # inicial ficam na migração 6, sobre as tabelas normalizadas)
+    SQL_TABELAS_RESUMO,
+    # 4: índice de busca textual usado pelo módulo busca (ignorado se o SQLite não tiver
+    # FTS5); os gatilhos e a indexação das vendas ficam na migração 6
+    migracao_fts5(SQL_TABELA_BUSCA),
+    # 5: cancelamento de vendas: data do cancelamento (a venda fica registrada, mas sai dos resumos)
+    'ALTER TABLE mercadoria ADD COLUMN cancelada_em TEXT;',
+    # 6: clientes, produtos e vendas normalizados, com 'mercadoria' como view (ver normalizar_vendas)
+    normalizar_vendas,
+    # 7: gatilho de mudança de descrição do produto que apaga os grupos zerados pelos
+    # dias das vendas do produto, sem varrer resumo_vendas_diario
+    'DROP TRIGGER IF EXISTS trg_resumo_produtos_update;' + SQL_GATILHO_RESUMO_PRODUTOS,
+]
+
+# Formatos aceitos para datas de compra; o primeiro é o usado pelo menu
+FORMATOS_DATA = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d')
+
+
+# Função: data_iso
+# Descrição: Converte uma data (datetime, date ou texto em um dos FORMATOS_DATA) para o formato
+# ISO 'AAAA-MM-DD HH:MM:SS' (um date vira meia-noite). Retorna None se o texto não estiver em
+# nenhum formato conhecido.
+def data_iso(data):
+    if isinstance(data, date):
+        return data.strftime('%Y-%m-%d %H:%M:%S')
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(data.strip(), formato).strftime('%Y-%m-%d %H:%M:%S')
+        except (AttributeError, ValueError):
+            continue
+    return None
+
+
+# Função: sem_horario
+# Descrição: Diz se a data (como aceita por data_iso) traz só o dia, sem horário: um date que
+# não é datetime ou um texto de até 10 caracteres (DD/MM/AAAA ou AAAA-MM-DD). Usada para incluir
+# o dia inteiro no fim de um período.
+def sem_horario(data):
+    if isinstance(data, str):
+        return len(data.strip()) <= 10
+    return isinstance(data, date) and not isinstance(data, datetime)
+
+
+# Função: migrar_datas_compra
+# Descrição: Preenche data_compra_iso das vendas gravadas antes da migração 2, a partir do texto
+# guardado em data_compra_texto (que é limpo depois de convertido). Percorre a tabela por id em
+# blocos de 'tamanho_lote' linhas, com um commit por bloco, para não segurar o bloqueio de escrita
+# por muito tempo. Datas em formato desconhecido ficam só em data_compra_texto.
+# Retorna a quantidade de linhas convertidas.
+def migrar_datas_compra(tamanho_lote=1000):
+    conn, cursor = conectar()
+    convertidas = 0
+    ultimo_id = 0
+    while True:
+        cursor.execute(
+            "SELECT id, data_compra_texto FROM vendas WHERE data_compra_iso IS NULL AND id > ? ORDER BY id LIMIT ?",
+            (ultimo_id, tamanho_lote))
+        linhas = cursor.fetchall()
+        if not linhas:
+            return convertidas
+        ultimo_id = linhas[-1][0]
+        datas = [(data_iso(data_compra), id_) for id_, data_compra in linhas]
+        datas = [(data, id_) for data, id_ in datas if data]
+        cursor.executemany("UPDATE vendas SET data_compra_iso = ?, data_compra_texto = NULL WHERE id = ?", datas)
+        conn.commit()
+        convertidas += len(datas)
+
+
+# Função: preparar_banco
+# Descrição: Garante que a tabela exista, que o esquema esteja atualizado e que as datas antigas
+# estejam convertidas. Não roda ao importar o módulo: conexao a chama uma vez por processo,
+# antes da primeira conexão com cada arquivo 'cliente.db' (ver conexao.registrar_preparo).
+def preparar_banco():
+    criar_tabela()
+    aplicar_migracoes(conectar()[0], MIGRACOES)
+    migrar_datas_compra()
+
+
+registrar_preparo('cliente', preparar_banco)
 
 
 # Função: cadastrar_produto
@@ -30,6 +428,7 @@ conn.commit()
 # estão preenchidos, se os valores informados (quantidade e valor_unitário) são positivos e realiza
 # o cálculo do valor_total antes de inserir no banco de dados.
 def cadastrar_produto(cpf, nome, serie, tipo, marca, modelo, quantidade, valor_unitario, data_compra=None, data_nascimento=None):
+    conn, cursor = conectar()
     if not all([cpf, nome, data_nascimento, serie, tipo, marca, modelo, quantidade, valor_unitario]):
         print("Erro: Todos os campos são obrigatórios.")
         return "Erro: Dados obrigatórios não preenchidos."
@@ -42,97 +441,287 @@ def cadastrar_produto(cpf, nome, serie, tipo, marca, modelo, quantidade, valor_u
     if not data_compra:
         data_compra = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
 
-    # Calcula o valor total da compra
-    valor_total = valor_unitario * quantidade
-
     try:
-        cursor.execute(''' 
-            INSERT INTO mercadoria (cpf, nome, data_nascimento, data_compra, serie, tipo, marca, modelo, quantidade, valor_unitario, valor_total)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (cpf, nome, data_nascimento, data_compra, serie, tipo, marca, modelo, quantidade, valor_unitario, valor_total))
-        conn.commit()
+        inserir_venda(cursor, cpf, nome, data_nascimento, serie, tipo, marca, modelo, data_compra, quantidade, valor_unitario)
+        confirmar(conn)
         print("Produto cadastrado com sucesso!")
         return "Produto cadastrado com sucesso!"
-    except sqlite3.IntegrityError:
-        print(f"Erro: Produto com CPF {cpf} já existe.")
-        return f"Erro: Produto com CPF {cpf} já existe."
     except Exception as e:
+        desfazer(conn)
         print(f"Erro inesperado: {e}")
         return f"Erro inesperado: {e}"
 
 
+# Função: inserir_venda
+# Descrição: Grava uma venda pelo cursor (ou conexão) informado, sem commit: cria o cliente (pelo
+# CPF) e o produto (pela série), se ainda não existirem, e insere a venda apontando para eles; um
+# cadastro existente não é alterado (ver SQL_SALVAR_CLIENTE). O valor total é
+# quantidade * valor_unitario. Retorna o id da venda.
+def inserir_venda(cursor, cpf, nome, data_nascimento, serie, tipo, marca, modelo, data_compra, quantidade, valor_unitario):
+    cursor.execute(SQL_SALVAR_CLIENTE, (cpf, nome, data_nascimento))
+    cursor.execute(SQL_SALVAR_PRODUTO, (serie, tipo, marca, modelo))
+    data_compra_iso = data_iso(data_compra)
+    return cursor.execute(SQL_INSERIR_VENDA, (cpf, serie, quantidade, valor_unitario, data_compra_iso,
+                                              None if data_compra_iso else data_compra)).lastrowid
+
+
+# Campos de uma venda, na mesma ordem dos parâmetros de cadastrar_produto
+CAMPOS_VENDA = ('cpf', 'nome', 'serie', 'tipo', 'marca', 'modelo', 'quantidade', 'valor_unitario', 'data_compra', 'data_nascimento')
+
+
+# Função: ler_registros_venda
+# Descrição: Lê vendas de um arquivo CSV (com cabeçalho) ou JSONL, uma por vez, convertendo
+# quantidade e valor_unitario para número. Cada registro é devolvido como dicionário.
+def ler_registros_venda(caminho):
+    with open(caminho, newline='', encoding='utf-8') as arquivo:
+        if caminho.lower().endswith('.csv'):
+            linhas = csv.DictReader(arquivo)
+        else:
+            linhas = (json.loads(linha) for linha in arquivo if linha.strip())
+        for linha in linhas:
+            yield linha
+
+
+# Função: validar_registro_venda
+# Descrição: Aplica as mesmas validações de cadastrar_produto a um registro (dicionário ou tupla).
+# Retorna a tupla de parâmetros na ordem de inserir_venda (após o cursor) ou a mensagem de erro.
+def validar_registro_venda(registro):
+    if not isinstance(registro, dict):
+        registro = dict(zip(CAMPOS_VENDA, registro))
+    cpf, nome, serie, tipo, marca, modelo, quantidade, valor_unitario, data_compra, data_nascimento = (
+        registro.get(campo) for campo in CAMPOS_VENDA)
+
+    try:
+        quantidade = int(quantidade) if quantidade not in (None, '') else None
+        valor_unitario = float(valor_unitario) if valor_unitario not in (None, '') else None
+    except (TypeError, ValueError):
+        return None, "Erro: Quantidade ou valor unitário inválido."
+
+    if not all([cpf, nome, data_nascimento, serie, tipo, marca, modelo, quantidade, valor_unitario]):
+        return None, "Erro: Dados obrigatórios não preenchidos."
+
+    if quantidade <= 0 or valor_unitario <= 0:
+        return None, "Erro: Quantidade ou valor unitário inválido."
+
+    if not data_compra:
+        data_compra = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+
+    return (cpf, nome, data_nascimento, serie, tipo, marca, modelo, data_compra, quantidade, valor_unitario), None
+
+
+# Função: cadastrar_produtos_em_lote
+# Descrição: Cadastra várias vendas de uma vez. Aceita um iterável de dicionários/tuplas ou o caminho
+# de um arquivo CSV/JSONL. Os registros são validados em blocos de 'tamanho_lote' e cada bloco é
+# gravado com um executemany para clientes, um para produtos e um para as vendas; tudo roda em uma
+# única transação, com um único commit no final.
+# Retorna uma lista de tuplas (índice, aceito, mensagem), uma por registro recebido.
+def cadastrar_produtos_em_lote(registros, tamanho_lote=1000):
+    conn, cursor = conectar()
+    if isinstance(registros, str):
+        registros = ler_registros_venda(registros)
+
+    resultados = []
+    registros = iter(registros)
+    indice = 0
+    try:
+        while True:
+            bloco = list(islice(registros, tamanho_lote))
+            if not bloco:
+                break
+            validos = []
+            for registro in bloco:
+                parametros, erro = validar_registro_venda(registro)
+                if erro:
+                    resultados.append((indice, False, erro))
+                else:
+                    validos.append(parametros)
+                    resultados.append((indice, True, "Produto cadastrado com sucesso!"))
+                indice += 1
+            cursor.executemany(SQL_SALVAR_CLIENTE, (venda[0:3] for venda in validos))
+            cursor.executemany(SQL_SALVAR_PRODUTO, (venda[3:7] for venda in validos))
+            datas = [data_iso(venda[7]) for venda in validos]
+            cursor.executemany(SQL_INSERIR_VENDA, ((venda[0], venda[3], venda[8], venda[9], data, None if data else venda[7])
+                                                   for venda, data in zip(validos, datas)))
+        confirmar(conn)
+    except Exception as e:
+        desfazer(conn)
+        print(f"Erro inesperado: {e}")
+        return [(i, False, f"Erro inesperado: {e}") if aceito else (i, aceito, msg)
+                for i, aceito, msg in resultados]
+
+    aceitos = sum(1 for _, aceito, _ in resultados if aceito)
+    print(f"{aceitos} de {len(resultados)} produtos cadastrados com sucesso!")
+    return resultados
+
+
+# Colunas da view 'mercadoria', na ordem do SELECT *
+COLUNAS_MERCADORIA = ('id', 'cpf', 'nome', 'data_nascimento', 'data_compra', 'serie', 'tipo', 'marca', 'modelo',
+                      'quantidade', 'valor_unitario', 'valor_total', 'data_compra_iso', 'cancelada_em')
+
+
+# Função: iterar_vendas
+# Descrição: Percorre as vendas da tabela 'mercadoria' em ordem de id, uma página de 'tamanho_pagina'
+# linhas por vez (paginação por chave: WHERE id > último id lido), sem carregar a tabela toda na memória.
+# 'colunas' limita as colunas retornadas e os filtros nomeados (ex.: cpf='123', serie='S001') são
+# comparados por igualdade. Com 'apos', começa depois desse id (o último de uma página anterior).
+# Gera uma tupla por venda.
+def iterar_vendas(colunas=None, tamanho_pagina=500, apos=None, **filtros):
+    colunas = tuple(colunas or COLUNAS_MERCADORIA)
+    invalidas = [c for c in colunas + tuple(filtros) if c not in COLUNAS_MERCADORIA]
+    if invalidas:
+        raise ValueError(f"Coluna inválida: {', '.join(invalidas)}")
+
+    selecionadas = colunas if 'id' in colunas else colunas + ('id',)
+    posicao_id = selecionadas.index('id')
+    consulta = f"SELECT {', '.join(selecionadas)} FROM mercadoria WHERE id > ?"
+    consulta += ''.join(f" AND {coluna} = ?" for coluna in filtros)
+    consulta += " ORDER BY id LIMIT ?"
+
+    conn, cursor = conectar()
+    ultimo_id = apos or 0
+    while True:
+        cursor.execute(consulta, (ultimo_id, *filtros.values(), tamanho_pagina))
+        pagina = cursor.fetchall()
+        if not pagina:
+            return
+        ultimo_id = pagina[-1][posicao_id]
+        for linha in pagina:
+            yield linha if len(selecionadas) == len(colunas) else linha[:-1]
+        if len(pagina) < tamanho_pagina:
+            return
+
+
 # Função: listar_produtos_cliente
-# Descrição: Consulta e imprime todos os registros da tabela 'mercadoria'. Caso nenhum produto seja encontrado,
-# informa que nenhum produto foi encontrado.
+# Descrição: Imprime todos os registros da tabela 'mercadoria', lidos página a página por iterar_vendas.
+# Caso nenhum produto seja encontrado, informa que nenhum produto foi encontrado.
 def listar_produtos_cliente():
-    cursor.execute("SELECT * FROM mercadoria")
-    produtos = cursor.fetchall()
-    if produtos:
-        for produto in produtos:
-            print(produto)
-    else:
+    encontrados = 0
+    for produto in iterar_vendas():
+        print(produto)
+        encontrados += 1
+    if not encontrados:
         print("Nenhum produto encontrado.")
 
 
-# Função: buscar_produto
-# Descrição: Busca um produto específico na tabela 'mercadoria' com base no CPF informado.
-# Caso o produto seja encontrado, ele é impresso e retornado; caso contrário, é exibida uma mensagem de erro.
-def buscar_produto(cpf):
-    cursor.execute("SELECT * FROM mercadoria WHERE cpf = ?", (cpf,))
-    produto = cursor.fetchone()
-    if produto:
-        print(produto)
-        return produto
+# Função: buscar_venda
+# Descrição: Busca a venda de id 'id_venda' (uma linha de 'mercadoria').
+# Caso a venda seja encontrada, ela é impressa e retornada; caso contrário, é exibida uma mensagem de erro.
+def buscar_venda(id_venda):
+    conn, cursor = conectar()
+    cursor.execute("SELECT * FROM mercadoria WHERE id = ?", (id_venda,))
+    venda = cursor.fetchone()
+    if venda:
+        print(venda)
+        return venda
     else:
-        print("Produto não encontrado.")
-        return "Produto não encontrado."
-
-
-# Função: atualizar_produto
-# Descrição: Atualiza os dados de um produto existente na tabela 'mercadoria' com base no CPF.
-# Apenas os campos informados serão atualizados; os demais permanecem com os valores atuais.
-def atualizar_produto(cpf, nome=None, data_nascimento=None, serie=None, tipo=None, marca=None, modelo=None, quantidade=None, valor_unitario=None, data_compra=None):
-    cursor.execute("SELECT * FROM mercadoria WHERE cpf = ?", (cpf,))
-    produto = cursor.fetchone()
-    if not produto:
-        print("Produto não encontrado.")
-        return "Produto não encontrado."
-
-    # Se algum valor não for informado, mantém o valor que já está no registro
-    nome = nome if nome is not None else produto[2]
-    data_nascimento = data_nascimento if data_nascimento is not None else produto[3]
-    data_compra = data_compra if data_compra is not None else produto[4]
-    serie = serie if serie is not None else produto[5]
-    tipo = tipo if tipo is not None else produto[6]
-    marca = marca if marca is not None else produto[7]
-    modelo = modelo if modelo is not None else produto[8]
-    quantidade = quantidade if quantidade is not None else produto[9]
-    valor_unitario = valor_unitario if valor_unitario is not None else produto[10]
-
-    # Recalcula o valor total com base na quantidade e valor unitário
-    valor_total = valor_unitario * quantidade
-
-    cursor.execute(''' 
-        UPDATE mercadoria
-        SET nome = ?, data_nascimento = ?, data_compra = ?, serie = ?, tipo = ?, marca = ?, modelo = ?, quantidade = ?, valor_unitario = ?, valor_total = ?
-        WHERE cpf = ?
-    ''', (nome, data_nascimento, data_compra, serie, tipo, marca, modelo, quantidade, valor_unitario, valor_total, cpf))
+        print("Venda não encontrada.")
+        return "Venda não encontrada."
 
-    conn.commit()
-    print("Produto atualizado com sucesso!")
-    return "Produto atualizado com sucesso!"
 
+# Função: vendas_do_cliente
+# Descrição: Retorna a lista de vendas do cliente com o CPF informado, em ordem de id.
+def vendas_do_cliente(cpf):
+    return list(iterar_vendas(cpf=cpf))
 
-# Função: deletar_produto
-# Descrição: Exclui um produto da tabela 'mercadoria' com base no CPF informado.
-# Verifica se o produto existe antes de tentar a exclusão.
-def deletar_produto(cpf):
-    cursor.execute("SELECT * FROM mercadoria WHERE cpf = ?", (cpf,))
-    if not cursor.fetchone():
-        print("Produto não encontrado.")
-        return "Produto não encontrado."
 
-    cursor.execute("DELETE FROM mercadoria WHERE cpf = ?", (cpf,))
-    conn.commit()
-    print("Produto excluído com sucesso!")
-    return "Produto excluído com sucesso!"
+# Função: atualizar_venda
+# Descrição: Atualiza a venda de id 'id_venda'. Apenas os campos informados serão atualizados; os demais
+# permanecem com os valores atuais. Nome e data de nascimento são do cliente e tipo, marca e modelo são
+# do produto (série), então a alteração vale para todas as vendas deles. Trocar a série aponta a venda
+# para outro produto, que precisa existir no cadastro de produtos ou no estoque.
+def atualizar_venda(id_venda, nome=None, data_nascimento=None, serie=None, tipo=None, marca=None, modelo=None, quantidade=None, valor_unitario=None, data_compra=None):
+    conn, cursor = conectar()
+    cursor.execute("SELECT * FROM mercadoria WHERE id = ?", (id_venda,))
+    venda = cursor.fetchone()
+    if not venda:
+        print("Venda não encontrada.")
+        return "Venda não encontrada."
+
+    # Se algum valor não for informado, mantém o valor atual; ao trocar de série, o do produto novo,
+    # do cadastro de produtos ou, se a série ainda não foi vendida, do estoque
+    produto = venda[6:9]
+    if serie is not None and serie != venda[5]:
+        cursor.execute("SELECT tipo, marca, modelo FROM produtos WHERE serie = ?", (serie,))
+        produto = cursor.fetchone()
+        if not produto:
+            produto = estoque_def.consultar_produto_por_serie(serie)
+            produto = produto and produto[1:4]
+        if not produto:
+            print("Erro: Produto não encontrado.")
+            return "Erro: Produto não encontrado."
+    serie = serie if serie is not None else venda[5]
+    tipo = tipo if tipo is not None else produto[0]
+    marca = marca if marca is not None else produto[1]
+    modelo = modelo if modelo is not None else produto[2]
+    nome = nome if nome is not None else venda[2]
+    data_nascimento = data_nascimento if data_nascimento is not None else venda[3]
+    quantidade = quantidade if quantidade is not None else venda[9]
+    valor_unitario = valor_unitario if valor_unitario is not None else venda[10]
+    data_compra = data_compra if data_compra is not None else venda[4]
+    data_compra_iso = data_iso(data_compra)
+
+    try:
+        cursor.execute(SQL_EDITAR_CLIENTE, (venda[1], nome, data_nascimento))
+        cursor.execute(SQL_EDITAR_PRODUTO, (serie, tipo, marca, modelo))
+        cursor.execute('''
+            UPDATE vendas
+            SET id_produto = (SELECT id FROM produtos WHERE serie = ?), quantidade = ?, valor_unitario = ?, data_compra_iso = ?, data_compra_texto = ?
+            WHERE id = ?
+        ''', (serie, quantidade, valor_unitario, data_compra_iso, None if data_compra_iso else data_compra, id_venda))
+        confirmar(conn)
+    except sqlite3.Error as e:
+        desfazer(conn)
+        print(f"Erro ao atualizar a venda: {e}")
+        return f"Erro ao atualizar a venda: {e}"
+    print("Venda atualizada com sucesso!")
+    return "Venda atualizada com sucesso!"
+
+
+# Função: atualizar_cliente
+# Descrição: Atualiza nome e/ou data de nascimento do cliente com o CPF informado. Como os dados ficam
+# só na tabela 'clientes', a alteração é uma única linha, qualquer que seja o número de vendas.
+def atualizar_cliente(cpf, nome=None, data_nascimento=None):
+    conn, cursor = conectar()
+    cursor.execute('''
+        UPDATE clientes SET nome = COALESCE(?, nome), data_nascimento = COALESCE(?, data_nascimento) WHERE cpf = ?
+    ''', (nome, data_nascimento, cpf))
+    confirmar(conn)
+    if not cursor.rowcount:
+        print("Cliente não encontrado.")
+        return "Cliente não encontrado."
+
+    print("Cliente atualizado com sucesso!")
+    return "Cliente atualizado com sucesso!"
+
+
+# Função: deletar_venda
+# Descrição: Exclui a venda de id 'id_venda'. O cadastro do cliente e do produto é mantido.
+# Se nenhuma linha for removida, informa que a venda não foi encontrada.
+def deletar_venda(id_venda):
+    conn, cursor = conectar()
+    cursor.execute("DELETE FROM vendas WHERE id = ?", (id_venda,))
+    confirmar(conn)
+    if not cursor.rowcount:
+        print("Venda não encontrada.")
+        return "Venda não encontrada."
+
+    print("Venda excluída com sucesso!")
+    return "Venda excluída com sucesso!"
+
+
+# Função: por_periodo
+# Descrição: Retorna as vendas com data da compra entre 'inicio' e 'fim' (inclusive), em ordem
+# cronológica. As datas podem ser datetime, date ou texto em um dos FORMATOS_DATA; se 'fim' vier
+# sem horário (date ou texto só com o dia), o dia inteiro é incluído. A consulta usa o índice de data_compra_iso (busca por faixa).
+def por_periodo(inicio, fim):
+    conn, cursor = conectar()
+    inicio_iso, fim_iso = data_iso(inicio), data_iso(fim)
+    if not inicio_iso or not fim_iso:
+        print("Erro: Data inválida. Use DD/MM/AAAA ou DD/MM/AAAA HH:MM:SS.")
+        return []
+    if sem_horario(fim):
+        fim_iso = fim_iso[:10] + ' 23:59:59'
+    cursor.execute(
+        "SELECT * FROM mercadoria WHERE data_compra_iso BETWEEN ? AND ? ORDER BY data_compra_iso",
+        (inicio_iso, fim_iso))
+    return cursor.fetchall()
@@ -0,0 +1,239 @@
+import os
+import sqlite3
+import threading
+import weakref
+
+# ---------------------------------------------------------------------------
+# Gerenciador de conexões.
+# Cada thread recebe a sua própria conexão com cada banco (o sqlite3 não permite
+# usar uma conexão em outra thread), criada na primeira vez que é pedida e
+# reaproveitada depois; quando a thread termina, as conexões dela são fechadas. Todas as conexões saem com os mesmos PRAGMAs de
+# desempenho e com cache de comandos preparados.
+# Nada é aberto ao importar os módulos: o banco só é aberto na primeira consulta,
+# e o esquema de cada arquivo (tabelas e migrações) é conferido uma única vez
+# por processo, pela função registrada em registrar_preparo.
+# ---------------------------------------------------------------------------
+
+# Arquivo de cada banco, pelo nome usado em obter_conexao
+ARQUIVOS = {
+    'cliente': 'cliente.db',
+    'estoque': 'estoque.db',
+}
+
+# Diretório dos bancos: a variável de ambiente SQL_PROJETO_BANCOS ou, sem ela,
+# o diretório atual. Altere com configurar(caminho).
+DIRETORIO_PADRAO = os.environ.get('SQL_PROJETO_BANCOS', '')
+
+# Caminho de cada banco, pelo nome usado em obter_conexao
+BANCOS = {nome: os.path.join(DIRETORIO_PADRAO, arquivo) for nome, arquivo in ARQUIVOS.items()}
+
+# Opções aplicadas a toda conexão nova (altere com configurar_conexoes):
+#   wal               - passa o arquivo para journal_mode=WAL (leitores não bloqueiam
+#                       escritores). O modo fica gravado no arquivo. Com WAL, uma
+#                       transação que envolve bancos anexados deixa de ser atômica
+#                       entre os arquivos, por isso vem desligado.
+#   synchronous       - None escolhe NORMAL com WAL e FULL sem WAL
+#   cache_size        - páginas (positivo) ou KiB (negativo) de cache por conexão
+#   mmap_size         - bytes do arquivo lidos via mmap (0 desliga)
+#   cached_statements - quantos comandos preparados cada conexão guarda
+#   timeout           - segundos esperando um bloqueio antes de SQLITE_BUSY
+#   fabrica           - classe da conexão (metricas.ativar troca pela versão instrumentada)
+CONFIGURACAO = {
+    'wal': False,
+    'synchronous': None,
+    'cache_size': -16000,
+    'mmap_size': 64 * 2 ** 20,
+    'cached_statements': 256,
+    'timeout': 5.0,
+    'fabrica': sqlite3.Connection,
+}
+
+_locais = threading.local()
+_trava = threading.Lock()
+
+
+# Conexões de uma thread (chave de obter_conexao -> conexão). Fica no
+# threading.local da thread, que o Python descarta quando ela termina; nesse
+# momento o finalizador fecha as conexões (e os arquivos) que ela abriu.
+class _ConexoesDaThread(dict):
+    def __init__(self):
+        super().__init__()
+        self.abertas = []
+        weakref.finalize(self, _fechar_abertas, self.abertas)
+
+
+def _fechar_abertas(abertas):
+    for conn in abertas:
+        conn.close()
+    abertas.clear()
+
+
+# Conexões de cada thread viva, pelo identificador da thread (para fechar_conexoes)
+_todas = weakref.WeakValueDictionary()
+
+# Preparo do esquema: função de cada banco e os caminhos (banco, arquivo) já
+# preparados neste processo
+_preparos = {}
+_preparados = set()
+_em_preparo = set()
+_trava_preparo = threading.RLock()
+
+
+# ---------------------------------------------------------------------------
+# Função: configurar(caminho)
+# Descrição: Passa a usar os bancos do diretório 'caminho' (cliente.db e
+# estoque.db), fechando as conexões abertas. O esquema dos novos arquivos é
+# conferido na primeira consulta a cada um.
+# ---------------------------------------------------------------------------
+def configurar(caminho):
+    fechar_conexoes()
+    BANCOS.update({nome: os.path.join(caminho, arquivo) for nome, arquivo in ARQUIVOS.items()})
+
+
+# ---------------------------------------------------------------------------
+# Função: registrar_preparo(nome, funcao)
+# Descrição: Registra a função que cria as tabelas e aplica as migrações do
+# banco 'nome'. Ela roda uma vez por processo e por arquivo, antes da primeira
+# conexão com o banco (ou da primeira que o anexa).
+# ---------------------------------------------------------------------------
+def registrar_preparo(nome, funcao):
+    _preparos[nome] = funcao
+
+
+# ---------------------------------------------------------------------------
+# Função: preparar(nome)
+# Descrição: Prepara o esquema do banco 'nome' agora, se ainda não foi preparado
+# neste processo. Útil antes de abrir o arquivo diretamente com sqlite3.connect.
+# ---------------------------------------------------------------------------
+def preparar(nome):
+    chave = (nome, BANCOS[nome])
+    if chave in _preparados or nome not in _preparos:
+        return
+    with _trava_preparo:
+        # A própria função de preparo abre conexões com o banco: dentro dela
+        # (mesma thread) o preparo não é repetido; as outras threads esperam.
+        if chave in _preparados or chave in _em_preparo:
+            return
+        _em_preparo.add(chave)
+        try:
+            _preparos[nome]()
+        finally:
+            _em_preparo.discard(chave)
+        _preparados.add(chave)
+
+
+# ---------------------------------------------------------------------------
+# Função: configurar_conexoes(**opcoes)
+# Descrição: Altera as opções de CONFIGURACAO e fecha as conexões abertas, para
+# que as próximas já sejam criadas com as novas opções.
+# ---------------------------------------------------------------------------
+def configurar_conexoes(**opcoes):
+    desconhecidas = set(opcoes) - set(CONFIGURACAO)
+    if desconhecidas:
+        raise ValueError(f"Opção desconhecida: {', '.join(sorted(desconhecidas))}")
+    CONFIGURACAO.update(opcoes)
+    fechar_conexoes()
+
+
+# ---------------------------------------------------------------------------
+# Função: nova_conexao(nome, anexos=(), autocommit=False)
+# Descrição: Abre uma conexão com o banco 'nome' aplicando os PRAGMAs de
+# CONFIGURACAO, preparando antes o esquema dos bancos envolvidos, se preciso. 'anexos' é uma sequência de pares (banco, apelido) anexados com
+# ATTACH. Com autocommit=True as transações são controladas manualmente (BEGIN/COMMIT).
+# ---------------------------------------------------------------------------
+def nova_conexao(nome, anexos=(), autocommit=False):
+    for banco in [nome] + [banco for banco, _ in anexos]:
+        preparar(banco)
+    conn = sqlite3.connect(
+        BANCOS[nome],
+        timeout=CONFIGURACAO['timeout'],
+        cached_statements=CONFIGURACAO['cached_statements'],
+        check_same_thread=False,
+        isolation_level=None if autocommit else '',
+        factory=CONFIGURACAO['fabrica'],
+    )
+    for banco, apelido in anexos:
+        conn.execute('ATTACH DATABASE ? AS ' + apelido, (BANCOS[banco],))
+
+    wal = CONFIGURACAO['wal']
+    synchronous = CONFIGURACAO['synchronous'] or ('NORMAL' if wal else 'FULL')
+    for esquema in ['main'] + [apelido for _, apelido in anexos]:
+        if wal:
+            conn.execute(f'PRAGMA {esquema}.journal_mode = WAL')
+        conn.execute(f'PRAGMA {esquema}.synchronous = {synchronous}')
+        conn.execute(f'PRAGMA {esquema}.cache_size = {int(CONFIGURACAO["cache_size"])}')
+        conn.execute(f'PRAGMA {esquema}.mmap_size = {int(CONFIGURACAO["mmap_size"])}')
+    return conn
+
+
+# ---------------------------------------------------------------------------
+# Função: obter_conexao(nome, anexos=(), autocommit=False)
+# Descrição: Retorna a conexão da thread atual com o banco 'nome' (mesmos
+# parâmetros de nova_conexao), criando-a na primeira chamada. A conexão é
+# fechada quando a thread termina.
+# ---------------------------------------------------------------------------
+def obter_conexao(nome, anexos=(), autocommit=False):
+    chave = (nome, tuple(anexos), autocommit)
+    conexoes = getattr(_locais, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _locais.conexoes = _ConexoesDaThread()
+        with _trava:
+            _todas[threading.get_ident()] = conexoes
+    conn = conexoes.get(chave)
+    if conn is None:
+        conn = conexoes[chave] = nova_conexao(nome, anexos, autocommit)
+        conexoes.abertas.append(conn)
+    return conn
+
+
+# ---------------------------------------------------------------------------
+# Função: fechar_conexoes()
+# Descrição: Fecha as conexões abertas por todas as threads. A próxima chamada de
+# obter_conexao em cada thread abre uma conexão nova.
+# ---------------------------------------------------------------------------
+def fechar_conexoes():
+    with _trava:
+        for conexoes in list(_todas.values()):
+            conexoes.clear()
+            _fechar_abertas(conexoes.abertas)
+
+
+# ---------------------------------------------------------------------------
+# Função: confirmar(conn)
+# Descrição: Faz o commit da transação atual, exceto quando a thread está
+# aplicando um grupo de operações do escritor agrupado (ver escritor.py); nesse
+# caso o commit único do grupo é feito pelo escritor.
+# ---------------------------------------------------------------------------
+def confirmar(conn):
+    if not em_grupo():
+        conn.commit()
+
+
+# ---------------------------------------------------------------------------
+# Função: desfazer(conn)
+# Descrição: Desfaz a transação atual. Dentro de um grupo do escritor agrupado,
+# desfaz apenas a operação corrente (SAVEPOINT 'operacao'), sem afetar as demais.
+# ---------------------------------------------------------------------------
+def desfazer(conn):
+    if em_grupo():
+        conn.execute('ROLLBACK TO operacao')
+    else:
+        conn.rollback()
+
+
+# ---------------------------------------------------------------------------
+# Função: marcar_grupo(ativo)
+# Descrição: Indica que a thread atual está (ou deixou de estar) aplicando um
+# grupo de operações em uma única transação. Usada pelo escritor agrupado.
+# ---------------------------------------------------------------------------
+def marcar_grupo(ativo):
+    _locais.em_grupo = ativo
+
+
+# ---------------------------------------------------------------------------
+# Função: em_grupo()
+# Descrição: Indica se a thread atual está aplicando um grupo do escritor
+# agrupado, ou seja, se as alterações ainda podem ser desfeitas antes do commit.
+# ---------------------------------------------------------------------------
+def em_grupo():
+    return getattr(_locais, 'em_grupo', False)
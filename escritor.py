@@ -0,0 +1,130 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from conexao import CONFIGURACAO, marcar_grupo, obter_conexao
+
+# ---------------------------------------------------------------------------
+# Escritor agrupado (group commit).
+# Em vez de cada alteração fazer o seu próprio commit (um fsync por operação),
+# as operações são enfileiradas e uma única thread escritora as aplica em
+# grupos: a cada 'janela_ms' milissegundos ou 'max_operacoes' operações, o que
+# vier primeiro, todas rodam em uma só transação com um único commit. Com
+# janela_ms=0 o grupo é formado pelo que já estiver na fila (o que chega durante
+# um commit entra no próximo grupo), sem espera adicional. Cada
+# chamador recebe um Future, resolvido só depois do commit do seu grupo.
+#
+# Exemplo:
+#     escritor = EscritorAgrupado('estoque')
+#     futuro = escritor.enviar(estoque_def.adicionar_produto, 'S1', 'CELULAR', 'SAMSUNG', 'S23', 10, 4000.0)
+#     futuro.result()
+#
+# As operações enviadas devem escrever apenas no banco do escritor ('cliente'
+# ou 'estoque'), usando as funções de cliente_def/estoque_def ou conexao.confirmar.
+# Para as vendas, que escrevem nos dois bancos, use o escritor da conexão de
+# venda_def (banco 'cliente' com anexos=(('estoque', 'est'),) e autocommit=True).
+# O modo do diário segue conexao.CONFIGURACAO['wal'] (desligado por padrão).
+# Com wal=True o arquivo passa, de forma permanente, para journal_mode=WAL, para
+# que as leituras das outras threads e processos não esperem pelos commits do
+# escritor; mas aí as vendas (venda_def.vender), que anexam 'estoque.db' à
+# 'cliente.db', deixam de ser atômicas entre os dois arquivos (veja a observação
+# sobre WAL e bancos anexados em conexao.CONFIGURACAO). Use só em bancos que não
+# participam de vendas, como os de teste.
+# ---------------------------------------------------------------------------
+class EscritorAgrupado:
+    def __init__(self, banco, janela_ms=0, max_operacoes=500, tamanho_fila=10000, wal=None, anexos=(), autocommit=False):
+        self.banco = banco
+        self.anexos = anexos
+        self.autocommit = autocommit
+        self.janela = janela_ms / 1000
+        self.max_operacoes = max_operacoes
+        self.wal = CONFIGURACAO['wal'] if wal is None else wal
+        self._fila = queue.Queue(tamanho_fila)
+        self._thread = threading.Thread(target=self._executar, name=f'escritor-{banco}', daemon=True)
+        self._thread.start()
+
+    # -----------------------------------------------------------------------
+    # Método: enviar(funcao, *args, bloquear=True, **kwargs)
+    # Descrição: Enfileira a chamada funcao(*args, **kwargs) e retorna um Future
+    # com o valor retornado por ela (ou a exceção levantada). Bloqueia se a fila
+    # estiver cheia, limitando a memória usada sob carga; com bloquear=False
+    # levanta queue.Full, para que o chamador recuse a operação.
+    # -----------------------------------------------------------------------
+    def enviar(self, funcao, *args, bloquear=True, **kwargs):
+        futuro = Future()
+        self._fila.put((funcao, args, kwargs, futuro), block=bloquear)
+        return futuro
+
+    # -----------------------------------------------------------------------
+    # Método: executar(funcao, *args, **kwargs)
+    # Descrição: Igual a enviar, mas espera o commit e retorna o resultado.
+    # -----------------------------------------------------------------------
+    def executar(self, funcao, *args, **kwargs):
+        return self.enviar(funcao, *args, **kwargs).result()
+
+    # -----------------------------------------------------------------------
+    # Método: pendentes()
+    # Descrição: Retorna quantas operações aguardam na fila.
+    # -----------------------------------------------------------------------
+    def pendentes(self):
+        return self._fila.qsize()
+
+    # -----------------------------------------------------------------------
+    # Método: parar()
+    # Descrição: Aplica as operações que ainda estão na fila e encerra a thread.
+    # -----------------------------------------------------------------------
+    def parar(self):
+        self._fila.put(None)
+        self._thread.join()
+
+    def _executar(self):
+        conn = obter_conexao(self.banco, anexos=self.anexos, autocommit=self.autocommit)
+        if self.wal:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+        ativo = True
+        while ativo:
+            grupo = [self._fila.get()]
+            limite = time.monotonic() + self.janela
+            while len(grupo) < self.max_operacoes and grupo[-1] is not None:
+                try:
+                    espera = limite - time.monotonic()
+                    grupo.append(self._fila.get(timeout=espera) if espera > 0 else self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            if grupo[-1] is None:
+                ativo = False
+                grupo.pop()
+            if grupo:
+                self._aplicar_grupo(conn, grupo)
+
+    def _aplicar_grupo(self, conn, grupo):
+        resultados = []
+        marcar_grupo(True)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for funcao, args, kwargs, _ in grupo:
+                conn.execute('SAVEPOINT operacao')
+                try:
+                    resultados.append((True, funcao(*args, **kwargs)))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO operacao')
+                    resultados.append((False, e))
+                conn.execute('RELEASE operacao')
+            conn.commit()
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for *_, futuro in grupo:
+                futuro.set_exception(e)
+            return
+        finally:
+            marcar_grupo(False)
+
+        for (sucesso, valor), (*_, futuro) in zip(resultados, grupo):
+            if sucesso:
+                futuro.set_result(valor)
+            else:
+                futuro.set_exception(valor)
@@ -1,9 +1,22 @@
+import csv
+import json
 import sqlite3
+import threading
 from datetime import datetime
+from itertools import islice
 
-# Conectando ao banco de dados 'estoque.db' e criando o cursor
-conn = sqlite3.connect('estoque.db')
-cursor = conn.cursor()
+from cache import CacheLRU
+from conexao import confirmar, desfazer, em_grupo, obter_conexao, registrar_preparo
+from migracoes import aplicar_migracoes, dividir_comandos, migracao_fts5
+
+# ---------------------------------------------------------------------------
+# Função: conectar()
+# Descrição: Retorna a conexão da thread atual com 'estoque.db' (ver conexao.py)
+# e um cursor novo.
+# ---------------------------------------------------------------------------
+def conectar():
+    conn = obter_conexao('estoque')
+    return conn, conn.cursor()
 
 # ---------------------------------------------------------------------------
 # Função: criar_tabela()
@@ -11,6 +24,7 @@ cursor = conn.cursor()
 #           série (chave primária), tipo, marca, modelo, quantidade, preço, e data/hora.
 # ---------------------------------------------------------------------------
 def criar_tabela():
+    conn, cursor = conectar()
     cursor.execute(''' 
     CREATE TABLE IF NOT EXISTS estoque ( 
         serie VARCHAR(40) PRIMARY KEY, 
@@ -24,8 +38,194 @@ def criar_tabela():
     ''')
     conn.commit()
 
-# Chamar a função para garantir que a tabela exista
-criar_tabela()
+# Tabela de resumo do estoque, lida pelo módulo relatorios: uma única linha com
+# o número de produtos, o total de unidades e o valor (quantidade * preço) do
+# estoque, atualizada pelos gatilhos a cada inclusão, alteração ou exclusão.
+SQL_RESUMOS = '''
+    CREATE TABLE IF NOT EXISTS resumo_estoque (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        produtos INTEGER NOT NULL,
+        quantidade INTEGER NOT NULL,
+        valor REAL NOT NULL
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_estoque_insert AFTER INSERT ON estoque BEGIN
+        UPDATE resumo_estoque SET produtos = produtos + 1, quantidade = quantidade + NEW.quantidade,
+            valor = valor + NEW.quantidade * NEW.preco WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_estoque_delete AFTER DELETE ON estoque BEGIN
+        UPDATE resumo_estoque SET produtos = produtos - 1, quantidade = quantidade - OLD.quantidade,
+            valor = valor - OLD.quantidade * OLD.preco WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_resumo_estoque_update AFTER UPDATE OF quantidade, preco ON estoque BEGIN
+        UPDATE resumo_estoque SET quantidade = quantidade - OLD.quantidade + NEW.quantidade,
+            valor = valor - OLD.quantidade * OLD.preco + NEW.quantidade * NEW.preco WHERE id = 1;
+    END;
+'''
+# Recalcula o resumo a partir da tabela 'estoque' (usado na migração e por relatorios)
+SQL_RECONSTRUIR_RESUMOS = '''
+    INSERT OR REPLACE INTO resumo_estoque (id, produtos, quantidade, valor)
+    SELECT 1, COUNT(*), COALESCE(SUM(quantidade), 0), COALESCE(SUM(quantidade * preco), 0) FROM estoque;
+'''
+
+# Índice de busca textual (FTS5) sobre série, tipo, marca e modelo, usado pelo
+# módulo busca. Ele não guarda cópia dos textos (content='estoque'): os
+# gatilhos só atualizam o índice quando um desses campos muda, então as baixas
+# de quantidade das vendas não mexem nele. 'busca_estoque_termos' lista os
+# termos indexados, usada na busca aproximada. O índice aponta para o rowid
+# implícito de 'estoque', que um VACUUM completo pode renumerar: depois de um
+# VACUUM rode busca.reconstruir_busca().
+SQL_BUSCA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS busca_estoque USING fts5(
+        serie, tipo, marca, modelo,
+        content='estoque', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS busca_estoque_termos USING fts5vocab(busca_estoque, 'row');
+    CREATE TRIGGER IF NOT EXISTS trg_busca_estoque_insert AFTER INSERT ON estoque BEGIN
+        INSERT INTO busca_estoque (rowid, serie, tipo, marca, modelo)
+        VALUES (NEW.rowid, NEW.serie, NEW.tipo, NEW.marca, NEW.modelo);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_busca_estoque_delete AFTER DELETE ON estoque BEGIN
+        INSERT INTO busca_estoque (busca_estoque, rowid, serie, tipo, marca, modelo)
+        VALUES ('delete', OLD.rowid, OLD.serie, OLD.tipo, OLD.marca, OLD.modelo);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_busca_estoque_update AFTER UPDATE OF serie, tipo, marca, modelo ON estoque BEGIN
+        INSERT INTO busca_estoque (busca_estoque, rowid, serie, tipo, marca, modelo)
+        VALUES ('delete', OLD.rowid, OLD.serie, OLD.tipo, OLD.marca, OLD.modelo);
+        INSERT INTO busca_estoque (rowid, serie, tipo, marca, modelo)
+        VALUES (NEW.rowid, NEW.serie, NEW.tipo, NEW.marca, NEW.modelo);
+    END;
+'''
+# Refaz o índice de busca a partir da tabela 'estoque' (usado na migração e por busca)
+SQL_RECONSTRUIR_BUSCA = "INSERT INTO busca_estoque (busca_estoque) VALUES ('rebuild');"
+
+# Livro de movimentos do estoque: cada alteração de quantidade é uma linha
+# (venda, cancelamento, reposição ou ajuste) com a variação 'delta', e o gatilho
+# trg_movimentos_aplicar soma essa variação ao produto na mesma transação.
+# O livro só aceita inclusões. 'token' é a chave de idempotência: um segundo
+# movimento com o mesmo token é ignorado, então repetir uma operação não
+# altera o estoque duas vezes. As fotos (fotos_estoque) guardam a quantidade
+# de cada produto em um instante e o último movimento já incluído; o estoque em
+# uma data é a foto anterior mais os movimentos seguintes (ver estoque_em).
+SQL_MOVIMENTOS = '''
+    CREATE TABLE IF NOT EXISTS movimentos_estoque (
+        id INTEGER PRIMARY KEY,
+        token TEXT UNIQUE,
+        tipo TEXT NOT NULL CHECK (tipo IN ('venda', 'cancelamento', 'reposicao', 'ajuste')),
+        serie TEXT NOT NULL,
+        delta INTEGER NOT NULL,
+        id_venda INTEGER,
+        data_hora TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_movimentos_estoque_data_hora ON movimentos_estoque (data_hora);
+    CREATE INDEX IF NOT EXISTS idx_movimentos_estoque_serie ON movimentos_estoque (serie, id);
+    CREATE TRIGGER IF NOT EXISTS trg_movimentos_aplicar AFTER INSERT ON movimentos_estoque BEGIN
+        UPDATE estoque SET quantidade = quantidade + NEW.delta WHERE serie = NEW.serie;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_movimentos_sem_alteracao BEFORE UPDATE ON movimentos_estoque BEGIN
+        SELECT RAISE(ABORT, 'movimentos_estoque só aceita inclusões');
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_movimentos_sem_exclusao BEFORE DELETE ON movimentos_estoque BEGIN
+        SELECT RAISE(ABORT, 'movimentos_estoque só aceita inclusões');
+    END;
+    CREATE TABLE IF NOT EXISTS fotos_estoque (
+        id INTEGER PRIMARY KEY,
+        data_hora TEXT NOT NULL,
+        ultimo_movimento INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_fotos_estoque_data_hora ON fotos_estoque (data_hora);
+    CREATE TABLE IF NOT EXISTS fotos_estoque_itens (
+        id_foto INTEGER NOT NULL REFERENCES fotos_estoque (id),
+        serie TEXT NOT NULL,
+        quantidade INTEGER NOT NULL,
+        PRIMARY KEY (id_foto, serie)
+    ) WITHOUT ROWID;
+'''
+# Tira uma foto do estoque atual (a primeira, feita na migração, é a base do livro)
+SQL_FOTO_ESTOQUE = '''
+    INSERT INTO fotos_estoque (data_hora, ultimo_movimento)
+    SELECT strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'), COALESCE(MAX(id), 0) FROM movimentos_estoque;
+    INSERT INTO fotos_estoque_itens (id_foto, serie, quantidade)
+    SELECT last_insert_rowid(), serie, quantidade FROM estoque;
+'''
+
+# Migrações de esquema da 'estoque.db', aplicadas em ordem conforme PRAGMA user_version.
+# Novas alterações de esquema entram sempre no final da lista.
+MIGRACOES = [
+    # 1: índice para consultar_produto_por_tipo (a série já é chave primária)
+    'CREATE INDEX IF NOT EXISTS idx_estoque_tipo ON estoque (tipo)',
+    # 2: índice para consultas por período de entrada (data_hora já é AAAA-MM-DD HH:MM:SS)
+    'CREATE INDEX IF NOT EXISTS idx_estoque_data_hora ON estoque (data_hora)',
+    # 3: resumo do valor do estoque usado pelo módulo relatorios, mantido por gatilhos (ver abaixo)
+    SQL_RESUMOS + SQL_RECONSTRUIR_RESUMOS,
+    # 4: índice de busca textual usado pelo módulo busca (ignorado se o SQLite não tiver FTS5)
+    migracao_fts5(SQL_BUSCA + SQL_RECONSTRUIR_BUSCA),
+    # 5: livro de movimentos e fotos do estoque (ver acima), começando por uma foto do estoque atual
+    SQL_MOVIMENTOS + SQL_FOTO_ESTOQUE,
+    # 6: índice para o cancelamento achar o movimento da venda (venda_def.cancelar_venda)
+    'CREATE INDEX IF NOT EXISTS idx_movimentos_estoque_id_venda ON movimentos_estoque (id_venda) WHERE id_venda IS NOT NULL',
+]
+
+# ---------------------------------------------------------------------------
+# Função: preparar_banco()
+# Descrição: Garante que a tabela exista e que o esquema esteja atualizado.
+# Não roda ao importar o módulo: conexao a chama uma vez por processo, antes da
+# primeira conexão com cada arquivo 'estoque.db' (ver conexao.registrar_preparo).
+# ---------------------------------------------------------------------------
+def preparar_banco():
+    criar_tabela()
+    aplicar_migracoes(conectar()[0], MIGRACOES)
+
+registrar_preparo('estoque', preparar_banco)
+
+# ---------------------------------------------------------------------------
+# Cache de produtos por série, usado por consultar_produto_por_serie e
+# produto_existe. adicionar_produto, atualizar_produto e excluir_produto
+# invalidam a série alterada. Para enxergar alterações feitas por outras
+# conexões (outras threads ou processos), o modo de coerência 'data_version'
+# confere PRAGMA data_version a cada consulta e esvazia o cache quando o banco
+# mudou; no modo 'ttl' vale apenas a validade dos itens.
+# ---------------------------------------------------------------------------
+CACHE = CacheLRU(tamanho_maximo=4096, ttl=30.0)
+COERENCIA = 'data_version'
+_versao_vista = threading.local()
+
+# ---------------------------------------------------------------------------
+# Função: configurar_cache(tamanho_maximo, ttl, coerencia)
+# Descrição: Recria o cache de produtos. tamanho_maximo=0 desliga o cache;
+# coerencia é 'data_version' ou 'ttl'.
+# ---------------------------------------------------------------------------
+def configurar_cache(tamanho_maximo=4096, ttl=30.0, coerencia='data_version'):
+    global CACHE, COERENCIA
+    if coerencia not in ('data_version', 'ttl'):
+        raise ValueError(f"Modo de coerência inválido: {coerencia}")
+    CACHE = CacheLRU(tamanho_maximo, ttl)
+    COERENCIA = coerencia
+
+# ---------------------------------------------------------------------------
+# Função: invalidar_cache(serie=None)
+# Descrição: Remove uma série do cache, ou o cache inteiro se nenhuma for informada.
+# Deve ser chamada por quem alterar a tabela 'estoque' sem passar por este módulo.
+# ---------------------------------------------------------------------------
+def invalidar_cache(serie=None):
+    if serie is None:
+        CACHE.limpar()
+    else:
+        CACHE.remover(serie)
+
+# ---------------------------------------------------------------------------
+# Função: estatisticas_cache()
+# Descrição: Retorna acertos, faltas, taxa de acerto e tamanho do cache.
+# ---------------------------------------------------------------------------
+def estatisticas_cache():
+    return CACHE.estatisticas()
+
+def _conferir_versao(conn):
+    versao = conn.execute('PRAGMA data_version').fetchone()[0]
+    if getattr(_versao_vista, 'valor', None) != (conn, versao):
+        if getattr(_versao_vista, 'valor', None) is not None:
+            CACHE.limpar()
+        _versao_vista.valor = (conn, versao)
 
 # ---------------------------------------------------------------------------
 # Função: produto_existe(serie)
@@ -33,17 +233,18 @@ criar_tabela()
 # Retorna True se existir, caso contrário False.
 # ---------------------------------------------------------------------------
 def produto_existe(serie):
-    cursor.execute('SELECT 1 FROM estoque WHERE serie = ?', (serie,))
-    return cursor.fetchone() is not None
+    return consultar_produto_por_serie(serie) is not None
 
 # ---------------------------------------------------------------------------
 # Função: adicionar_produto(serie, tipo, marca, modelo, quantidade, preco)
 # Descrição: Adiciona um novo produto ao estoque, após realizar as validações:
 #           - Verifica se o produto já existe (pela série).
 #           - Verifica se quantidade e preço são maiores que zero.
-#           - Insere o produto com a data/hora atual.
+#           - Insere o produto com a data/hora atual e registra a quantidade
+#             inicial como uma reposição no livro de movimentos.
 # ---------------------------------------------------------------------------
 def adicionar_produto(serie, tipo, marca, modelo, quantidade, preco):
+    conn, cursor = conectar()
     if produto_existe(serie):
         print("Erro: Produto com essa série já existe!")
         return
@@ -55,29 +256,70 @@ def adicionar_produto(serie, tipo, marca, modelo, quantidade, preco):
     data_hora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     cursor.execute(''' 
     INSERT INTO estoque (serie, tipo, marca, modelo, quantidade, preco, data_hora) 
-    VALUES (?, ?, ?, ?, ?, ?, ?) 
-    ''', (serie, tipo, marca, modelo, quantidade, preco, data_hora))
-    conn.commit()
+    VALUES (?, ?, ?, ?, 0, ?, ?) 
+    ''', (serie, tipo, marca, modelo, preco, data_hora))
+    cursor.execute("INSERT INTO movimentos_estoque (tipo, serie, delta) VALUES ('reposicao', ?, ?)", (serie, quantidade))
+    confirmar(conn)
+    invalidar_cache(serie)
     print("Produto adicionado com sucesso!")
 
+# Colunas da tabela 'estoque', na ordem do SELECT *
+COLUNAS_ESTOQUE = ('serie', 'tipo', 'marca', 'modelo', 'quantidade', 'preco', 'data_hora')
+
+# ---------------------------------------------------------------------------
+# Função: iterar_estoque(colunas, tamanho_pagina, apos, **filtros)
+# Descrição: Percorre os produtos do estoque em ordem de série, uma página de
+# 'tamanho_pagina' linhas por vez (paginação por chave: WHERE serie > última
+# série lida), sem carregar a tabela toda na memória. 'colunas' limita as
+# colunas retornadas e os filtros nomeados (ex.: tipo='CELULAR') são comparados
+# por igualdade. Com 'apos', começa depois dessa série (a última de uma página
+# anterior). Gera uma tupla por produto.
+# ---------------------------------------------------------------------------
+def iterar_estoque(colunas=None, tamanho_pagina=500, apos=None, **filtros):
+    colunas = tuple(colunas or COLUNAS_ESTOQUE)
+    invalidas = [c for c in colunas + tuple(filtros) if c not in COLUNAS_ESTOQUE]
+    if invalidas:
+        raise ValueError(f"Coluna inválida: {', '.join(invalidas)}")
+
+    selecionadas = colunas if 'serie' in colunas else colunas + ('serie',)
+    posicao_serie = selecionadas.index('serie')
+    consulta = f"SELECT {', '.join(selecionadas)} FROM estoque WHERE serie > ?"
+    consulta += ''.join(f" AND {coluna} = ?" for coluna in filtros)
+    consulta += " ORDER BY serie LIMIT ?"
+
+    conn, cursor = conectar()
+    ultima_serie = apos or ''
+    while True:
+        cursor.execute(consulta, (ultima_serie, *filtros.values(), tamanho_pagina))
+        pagina = cursor.fetchall()
+        if not pagina:
+            return
+        ultima_serie = pagina[-1][posicao_serie]
+        for linha in pagina:
+            yield linha if len(selecionadas) == len(colunas) else linha[:-1]
+        if len(pagina) < tamanho_pagina:
+            return
+
 # ---------------------------------------------------------------------------
 # Função: listar_produtos()
-# Descrição: Recupera e imprime todos os produtos cadastrados na tabela 'estoque'.
-# Retorna uma lista de todos os produtos encontrados.
+# Descrição: Imprime todos os produtos cadastrados na tabela 'estoque', lidos
+# página a página por iterar_estoque. Retorna a quantidade de produtos listados.
 # ---------------------------------------------------------------------------
 def listar_produtos():
-    cursor.execute('SELECT * FROM estoque')
-    produtos = cursor.fetchall()
-    for produto in produtos:
+    encontrados = 0
+    for produto in iterar_estoque():
         print(produto)
-    return produtos
+        encontrados += 1
+    return encontrados
 
 # ---------------------------------------------------------------------------
 # Função: atualizar_produto(serie, tipo, marca, modelo, quantidade, preco)
 # Descrição: Atualiza os dados de um produto específico no estoque.
 #           Apenas atualiza os campos que forem informados; os demais permanecem inalterados.
+#           Uma nova quantidade é registrada como ajuste (a diferença) no livro de movimentos.
 # ---------------------------------------------------------------------------
 def atualizar_produto(serie, tipo=None, marca=None, modelo=None, quantidade=None, preco=None):
+    conn, cursor = conectar()
     if not produto_existe(serie):
         print("Erro: Produto não encontrado!")
         return
@@ -94,9 +336,6 @@ def atualizar_produto(serie, tipo=None, marca=None, modelo=None, quantidade=None
     if modelo:
         query += ' modelo = ?,'
         params.append(modelo)
-    if quantidade is not None:
-        query += ' quantidade = ?,'
-        params.append(quantidade)
     if preco is not None:
         query += ' preco = ?,'
         params.append(preco)
@@ -106,32 +345,63 @@ def atualizar_produto(serie, tipo=None, marca=None, modelo=None, quantidade=None
     params.append(serie)
 
     try:
-        cursor.execute(query, tuple(params))
-        conn.commit()
+        if quantidade is not None:
+            cursor.execute('''
+            INSERT INTO movimentos_estoque (tipo, serie, delta)
+            SELECT 'ajuste', serie, ? - quantidade FROM estoque WHERE serie = ? AND quantidade <> ?
+            ''', (quantidade, serie, quantidade))
+        if params[:-1]:
+            cursor.execute(query, tuple(params))
+        confirmar(conn)
+        invalidar_cache(serie)
         print("Produto atualizado com sucesso!")
     except sqlite3.Error as e:
+        desfazer(conn)
         print(f"Erro ao atualizar o produto: {e}")
 
 # ---------------------------------------------------------------------------
 # Função: excluir_produto(serie)
 # Descrição: Exclui um produto do estoque com base na série informada.
-#           Valida se o produto existe antes de tentar a exclusão.
+#           Valida se o produto existe antes de tentar a exclusão. A quantidade
+#           restante sai do estoque como um ajuste no livro de movimentos.
 # ---------------------------------------------------------------------------
 def excluir_produto(serie):
+    conn, cursor = conectar()
     if not produto_existe(serie):
         print("Erro: Produto não encontrado!")
         return
+    cursor.execute('''
+    INSERT INTO movimentos_estoque (tipo, serie, delta)
+    SELECT 'ajuste', serie, -quantidade FROM estoque WHERE serie = ? AND quantidade <> 0
+    ''', (serie,))
     cursor.execute('DELETE FROM estoque WHERE serie = ?', (serie,))
-    conn.commit()
+    confirmar(conn)
+    invalidar_cache(serie)
     print("Produto excluído do estoque com sucesso!")
 
 # ---------------------------------------------------------------------------
 # Função: consultar_produto_por_serie(serie)
 # Descrição: Consulta e retorna um produto específico do estoque com base na série.
+# Usa o cache de produtos; dentro de um grupo do escritor agrupado lê direto do
+# banco, pois as alterações do grupo ainda podem ser desfeitas.
 # ---------------------------------------------------------------------------
 def consultar_produto_por_serie(serie):
+    conn, cursor = conectar()
+    usar_cache = not em_grupo()
+    if usar_cache:
+        if COERENCIA == 'data_version':
+            _conferir_versao(conn)
+        encontrado, produto = CACHE.obter(serie)
+        if encontrado:
+            return produto
+        # Uma alteração confirmada por outra thread entre esta leitura e o guardar
+        # invalida o cache depois do commit; a geração impede guardar o valor antigo
+        geracao = CACHE.geracao
+
     cursor.execute('SELECT * FROM estoque WHERE serie = ?', (serie,))
     produto = cursor.fetchone()
+    if usar_cache:
+        CACHE.guardar(serie, produto, geracao)
     return produto
 
 # ---------------------------------------------------------------------------
@@ -140,6 +410,7 @@ def consultar_produto_por_serie(serie):
 # Se nenhum produto for encontrado, exibe mensagem correspondente.
 # ---------------------------------------------------------------------------
 def consultar_produto_por_tipo(tipo):
+    conn, cursor = conectar()
     cursor.execute('SELECT * FROM estoque WHERE tipo = ?', (tipo,))
     produtos = cursor.fetchall()
     if produtos:
@@ -147,3 +418,334 @@ def consultar_produto_por_tipo(tipo):
             print(produto)
     else:
         print("Nenhum produto encontrado para esse tipo.")
+
+# ---------------------------------------------------------------------------
+# Função: por_periodo(inicio, fim)
+# Descrição: Retorna os produtos com data/hora de entrada entre 'inicio' e 'fim'
+# (inclusive), em ordem cronológica. As datas são aceitas como em
+# cliente_def.por_periodo (datetime, date ou texto em um dos FORMATOS_DATA);
+# se 'fim' vier sem horário, o dia inteiro é incluído. A consulta usa o
+# índice de data_hora (busca por faixa).
+# ---------------------------------------------------------------------------
+def por_periodo(inicio, fim):
+    from cliente_def import data_iso, sem_horario
+
+    conn, cursor = conectar()
+    inicio_iso, fim_iso = data_iso(inicio), data_iso(fim)
+    if not inicio_iso or not fim_iso:
+        print("Erro: Data inválida. Use DD/MM/AAAA ou DD/MM/AAAA HH:MM:SS.")
+        return []
+    if sem_horario(fim):
+        fim_iso = fim_iso[:10] + ' 23:59:59'
+    cursor.execute('SELECT * FROM estoque WHERE data_hora BETWEEN ? AND ? ORDER BY data_hora', (inicio_iso, fim_iso))
+    return cursor.fetchall()
+
+# ---------------------------------------------------------------------------
+# Função: registrar_movimento(serie, delta, tipo='ajuste', token=None)
+# Descrição: Soma 'delta' à quantidade do produto registrando o movimento no
+# livro ('reposicao' ou 'ajuste'; vendas e cancelamentos ficam em venda_def).
+# Com 'token', repetir a chamada com o mesmo token não altera o estoque de novo.
+# Recusa movimentos que deixariam a quantidade negativa.
+# ---------------------------------------------------------------------------
+def registrar_movimento(serie, delta, tipo='ajuste', token=None):
+    if tipo not in ('reposicao', 'ajuste'):
+        print("Erro: Tipo de movimento inválido.")
+        return "Erro: Tipo de movimento inválido."
+    conn, cursor = conectar()
+    # O token é conferido pela própria inclusão (UNIQUE), e não por uma consulta
+    # antes dela: dois processos com o mesmo token não passam os dois pela conferência
+    cursor.execute('''
+    INSERT INTO movimentos_estoque (token, tipo, serie, delta)
+    SELECT ?, ?, serie, ? FROM estoque WHERE serie = ? AND quantidade + ? >= 0
+    ON CONFLICT (token) DO NOTHING
+    ''', (token, tipo, delta, serie, delta))
+    if not cursor.rowcount:
+        desfazer(conn)
+        if token is not None and cursor.execute('SELECT 1 FROM movimentos_estoque WHERE token = ?', (token,)).fetchone():
+            print("Movimento já registrado anteriormente.")
+            return "Movimento já registrado anteriormente."
+        if not produto_existe(serie):
+            print("Erro: Produto não encontrado!")
+            return "Erro: Produto não encontrado!"
+        print("Erro: Quantidade insuficiente no estoque.")
+        return "Erro: Quantidade insuficiente no estoque."
+    confirmar(conn)
+    invalidar_cache(serie)
+    print("Movimento registrado com sucesso!")
+    return "Movimento registrado com sucesso!"
+
+# ---------------------------------------------------------------------------
+# Função: repor_estoque(serie, quantidade, token=None)
+# Descrição: Entrada de mercadoria: soma 'quantidade' ao produto (reposição).
+# ---------------------------------------------------------------------------
+def repor_estoque(serie, quantidade, token=None):
+    if quantidade <= 0:
+        print("Erro: A quantidade deve ser positiva.")
+        return "Erro: Quantidade inválida."
+    return registrar_movimento(serie, quantidade, 'reposicao', token)
+
+# Tabela temporária (só da conexão) com o arquivo do fornecedor na reconciliação.
+# 'situacao' é o resultado da comparação com o estoque: inserido, atualizado ou inalterado.
+SQL_TABELA_IMPORTACAO = '''
+    CREATE TEMP TABLE IF NOT EXISTS importacao_estoque (
+        serie TEXT PRIMARY KEY,
+        tipo TEXT NOT NULL,
+        marca TEXT NOT NULL,
+        modelo TEXT NOT NULL,
+        quantidade INTEGER NOT NULL,
+        preco REAL NOT NULL,
+        situacao TEXT
+    );
+    DELETE FROM importacao_estoque;
+'''
+SQL_CLASSIFICAR_IMPORTACAO = '''
+    UPDATE importacao_estoque SET situacao = COALESCE((
+        SELECT CASE WHEN e.tipo = importacao_estoque.tipo AND e.marca = importacao_estoque.marca
+                     AND e.modelo = importacao_estoque.modelo AND e.quantidade = importacao_estoque.quantidade
+                     AND e.preco = importacao_estoque.preco
+               THEN 'inalterado' ELSE 'atualizado' END
+        FROM estoque e WHERE e.serie = importacao_estoque.serie), 'inserido');
+'''
+# Aplica a reconciliação. As quantidades mudam só pelo livro de movimentos (ajuste
+# da diferença nos produtos existentes, reposição da quantidade nos novos). O
+# upsert grava os produtos novos e as mudanças de descrição; as mudanças só de
+# preço vão por UPDATE, para não reindexar a busca sem necessidade.
+SQL_APLICAR_IMPORTACAO = '''
+    INSERT INTO movimentos_estoque (tipo, serie, delta)
+    SELECT 'ajuste', i.serie, i.quantidade - e.quantidade FROM importacao_estoque i JOIN estoque e ON e.serie = i.serie
+    WHERE i.situacao = 'atualizado' AND i.quantidade <> e.quantidade;
+    INSERT INTO estoque (serie, tipo, marca, modelo, quantidade, preco, data_hora)
+    SELECT serie, tipo, marca, modelo, 0, preco, strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')
+    FROM importacao_estoque WHERE situacao <> 'inalterado'
+    ON CONFLICT (serie) DO UPDATE SET
+        tipo = excluded.tipo, marca = excluded.marca, modelo = excluded.modelo, preco = excluded.preco
+    WHERE tipo <> excluded.tipo OR marca <> excluded.marca OR modelo <> excluded.modelo;
+    UPDATE estoque SET preco = i.preco FROM importacao_estoque i
+    WHERE i.serie = estoque.serie AND i.situacao = 'atualizado' AND estoque.preco <> i.preco;
+    INSERT INTO movimentos_estoque (tipo, serie, delta)
+    SELECT 'reposicao', serie, quantidade FROM importacao_estoque WHERE situacao = 'inserido' AND quantidade > 0;
+'''
+# Produtos do estoque que não vieram no arquivo: a quantidade sai como ajuste e o produto é excluído
+SQL_REMOVER_AUSENTES = '''
+    INSERT INTO movimentos_estoque (tipo, serie, delta)
+    SELECT 'ajuste', serie, -quantidade FROM estoque
+    WHERE serie NOT IN (SELECT serie FROM importacao_estoque) AND quantidade <> 0;
+    DELETE FROM estoque WHERE serie NOT IN (SELECT serie FROM importacao_estoque);
+'''
+
+# Campos de um produto no arquivo do fornecedor
+CAMPOS_ESTOQUE = ('serie', 'tipo', 'marca', 'modelo', 'quantidade', 'preco')
+
+# ---------------------------------------------------------------------------
+# Função: ler_registros_estoque(caminho)
+# Descrição: Lê produtos de um arquivo CSV (com cabeçalho) ou JSONL, um por
+# vez, sem carregar o arquivo inteiro. Cada registro é devolvido como dicionário;
+# uma linha JSON malformada é devolvida como o próprio erro (ValueError), para
+# que validar_registro_estoque a conte como registro inválido.
+# ---------------------------------------------------------------------------
+def ler_registros_estoque(caminho):
+    with open(caminho, newline='', encoding='utf-8') as arquivo:
+        if caminho.lower().endswith('.csv'):
+            yield from csv.DictReader(arquivo)
+            return
+        for linha in arquivo:
+            if not linha.strip():
+                continue
+            try:
+                yield json.loads(linha)
+            except ValueError as e:
+                yield e
+
+# ---------------------------------------------------------------------------
+# Função: validar_registro_estoque(registro)
+# Descrição: Confere um produto do arquivo (dicionário ou tupla na ordem de
+# CAMPOS_ESTOQUE): todos os campos preenchidos, quantidade inteira não
+# negativa e preço positivo. Retorna (tupla de parâmetros, None) ou (None, erro).
+# ---------------------------------------------------------------------------
+def validar_registro_estoque(registro):
+    if isinstance(registro, Exception):
+        return None, f"Erro: Registro malformado ({registro})."
+    if isinstance(registro, (list, tuple)):
+        registro = dict(zip(CAMPOS_ESTOQUE, registro))
+    if not isinstance(registro, dict):
+        return None, "Erro: Registro malformado."
+    serie, tipo, marca, modelo, quantidade, preco = (registro.get(campo) for campo in CAMPOS_ESTOQUE)
+
+    if not all([serie, tipo, marca, modelo]) or quantidade in (None, '') or preco in (None, ''):
+        return None, "Erro: Dados obrigatórios não preenchidos."
+    if not all(isinstance(valor, (str, int, float)) for valor in (serie, tipo, marca, modelo)):
+        return None, "Erro: Registro malformado."
+    try:
+        quantidade = int(quantidade)
+        preco = float(preco)
+    except (TypeError, ValueError):
+        return None, "Erro: Quantidade ou preço inválido."
+    if quantidade < 0 or preco <= 0:
+        return None, "Erro: Quantidade ou preço inválido."
+    return (serie, tipo, marca, modelo, quantidade, preco), None
+
+# ---------------------------------------------------------------------------
+# Função: reconciliar_estoque(registros, simular=False, remover_ausentes=False, tamanho_lote=10000)
+# Descrição: Acerta o estoque pelo arquivo do fornecedor (caminho de um CSV/JSONL
+# ou iterável de dicionários/tuplas), que traz a quantidade e o preço atuais de
+# cada produto. A regra é a da opção 5 do menu, mas tudo roda em uma transação:
+#           - Os registros válidos vão, em blocos de 'tamanho_lote', para a
+#             tabela temporária importacao_estoque (uma série repetida vale pela
+#             última ocorrência).
+#           - A comparação com o estoque classifica cada série em inserida,
+#             atualizada ou inalterada; as séries do estoque que não estão no
+#             arquivo são as ausentes.
+#           - SQL_APLICAR_IMPORTACAO grava as diferenças; com remover_ausentes,
+#             os produtos ausentes são excluídos.
+# Com simular=True tudo é desfeito no final, só para ver as diferenças.
+# Retorna um dicionário com as contagens e a lista 'erros' (índice, mensagem)
+# dos registros inválidos.
+# ---------------------------------------------------------------------------
+def reconciliar_estoque(registros, simular=False, remover_ausentes=False, tamanho_lote=10000):
+    conn, cursor = conectar()
+    if isinstance(registros, str):
+        registros = ler_registros_estoque(registros)
+
+    erros = []
+    registros = iter(registros)
+    indice = 0
+    try:
+        if not em_grupo():
+            conn.commit()
+            cursor.execute('BEGIN IMMEDIATE')
+        for comando in dividir_comandos(SQL_TABELA_IMPORTACAO):
+            cursor.execute(comando)
+        while True:
+            bloco = list(islice(registros, tamanho_lote))
+            if not bloco:
+                break
+            validos = []
+            for registro in bloco:
+                parametros, erro = validar_registro_estoque(registro)
+                if erro:
+                    erros.append((indice, erro))
+                else:
+                    validos.append(parametros)
+                indice += 1
+            cursor.executemany('''
+            INSERT OR REPLACE INTO importacao_estoque (serie, tipo, marca, modelo, quantidade, preco)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', validos)
+
+        cursor.execute(SQL_CLASSIFICAR_IMPORTACAO)
+        cursor.execute('SELECT situacao, COUNT(*) FROM importacao_estoque GROUP BY situacao')
+        situacoes = dict(cursor.fetchall())
+        cursor.execute('SELECT COUNT(*) FROM estoque WHERE serie NOT IN (SELECT serie FROM importacao_estoque)')
+        diferencas = {
+            'inseridos': situacoes.get('inserido', 0),
+            'atualizados': situacoes.get('atualizado', 0),
+            'inalterados': situacoes.get('inalterado', 0),
+            'ausentes': cursor.fetchone()[0],
+            'invalidos': len(erros),
+        }
+
+        script = SQL_APLICAR_IMPORTACAO + (SQL_REMOVER_AUSENTES if remover_ausentes else '')
+        for comando in dividir_comandos(script):
+            cursor.execute(comando)
+        cursor.execute('DELETE FROM importacao_estoque')
+        if simular:
+            desfazer(conn)
+        else:
+            confirmar(conn)
+    except sqlite3.Error as e:
+        desfazer(conn)
+        print(f"Erro ao reconciliar o estoque: {e}")
+        return {'erro': str(e), 'erros': erros}
+    except BaseException:
+        # Erro de leitura do arquivo ou interrupção: não deixa a transação aberta
+        # (e o banco travado para os outros escritores)
+        desfazer(conn)
+        raise
+    invalidar_cache()
+
+    print(f"Reconciliação do estoque{' (simulação, nada foi gravado)' if simular else ''}: "
+          f"{diferencas['inseridos']} inseridos, {diferencas['atualizados']} atualizados, "
+          f"{diferencas['inalterados']} inalterados, {diferencas['ausentes']} ausentes"
+          f"{' (excluídos)' if remover_ausentes and not simular else ''}, {diferencas['invalidos']} inválidos.")
+    return {**diferencas, 'erros': erros}
+
+# Movimentos depois da última foto a partir dos quais fotografar_se_preciso tira outra
+FOTO_A_CADA = 50000
+
+# ---------------------------------------------------------------------------
+# Função: tirar_foto_estoque(conn=None)
+# Descrição: Grava a quantidade atual de cada produto em fotos_estoque, para
+# que estoque_em não precise refazer o livro desde o início. Com 'conn', usa
+# essa conexão em vez da do estoque: por exemplo a de venda_def, no escritor
+# do serviço, que tem 'estoque.db' anexado (os nomes sem esquema chegam às
+# tabelas do banco anexado, que não existem em 'cliente.db').
+# ---------------------------------------------------------------------------
+def tirar_foto_estoque(conn=None):
+    if conn is None:
+        conn = conectar()[0]
+    cursor = conn.cursor()
+    for comando in dividir_comandos(SQL_FOTO_ESTOQUE):
+        cursor.execute(comando)
+    confirmar(conn)
+    print("Foto do estoque registrada com sucesso!")
+
+# ---------------------------------------------------------------------------
+# Função: fotografar_se_preciso(a_cada=FOTO_A_CADA, conn=None)
+# Descrição: Tira uma foto se houver mais de 'a_cada' movimentos depois da
+# última. Chamada periodicamente pelo serviço (servico.py, no escritor, com a
+# conexão 'conn' dele) e pela manutenção (python manutencao.py fotografar).
+# Como o livro só aceita inclusões, a conta é a diferença entre os ids, sem
+# percorrer os movimentos. Retorna True se fotografou.
+# ---------------------------------------------------------------------------
+def fotografar_se_preciso(a_cada=FOTO_A_CADA, conn=None):
+    if conn is None:
+        conn = conectar()[0]
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT COALESCE((SELECT MAX(id) FROM movimentos_estoque), 0)
+         - COALESCE((SELECT MAX(ultimo_movimento) FROM fotos_estoque), 0)
+    ''')
+    if cursor.fetchone()[0] <= a_cada:
+        return False
+    tirar_foto_estoque(conn)
+    return True
+
+# ---------------------------------------------------------------------------
+# Função: estoque_em(data, serie=None)
+# Descrição: Retorna o estoque como estava em 'data' (datetime, date ou texto
+# DD/MM/AAAA [HH:MM:SS] ou AAAA-MM-DD [HH:MM:SS]; sem horário, vale o fim do
+# dia): a última foto tirada até essa data mais os movimentos registrados entre a foto e a data. Sem 'serie',
+# retorna um dicionário série -> quantidade; com 'serie', só a quantidade
+# (None se o produto não existia). Levanta ValueError se a data for inválida
+# ou anterior à primeira foto (a do início do livro).
+# ---------------------------------------------------------------------------
+def estoque_em(data, serie=None):
+    from cliente_def import data_iso, sem_horario
+
+    limite = data_iso(data)
+    if limite is None:
+        raise ValueError(f"Data inválida: {data}")
+    if sem_horario(data):
+        limite = limite[:10] + ' 23:59:59'
+    limite += '.999'
+
+    conn, cursor = conectar()
+    cursor.execute('SELECT id, ultimo_movimento FROM fotos_estoque WHERE data_hora <= ? ORDER BY data_hora DESC LIMIT 1',
+                   (limite,))
+    foto = cursor.fetchone()
+    if foto is None:
+        raise ValueError(f"Não há registro do estoque em {data} (anterior ao início do livro de movimentos).")
+    id_foto, ultimo_movimento = foto
+
+    filtro, parametros = (' AND serie = ?', (serie,)) if serie is not None else ('', ())
+    cursor.execute(f'SELECT serie, quantidade FROM fotos_estoque_itens WHERE id_foto = ?{filtro}', (id_foto, *parametros))
+    quantidades = dict(cursor.fetchall())
+    cursor.execute(f'''
+    SELECT serie, SUM(delta) FROM movimentos_estoque
+    WHERE id > ? AND data_hora <= ?{filtro} GROUP BY serie
+    ''', (ultimo_movimento, limite, *parametros))
+    for serie_movimento, delta in cursor.fetchall():
+        quantidades[serie_movimento] = quantidades.get(serie_movimento, 0) + delta
+    if serie is not None:
+        return quantidades.get(serie)
+    return quantidades
@@ -0,0 +1,335 @@
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+import cliente_def
+import conexao
+import estoque_def
+from cliente_def import COLUNAS_MERCADORIA, data_iso
+from migracoes import dividir_comandos
+
+# ---------------------------------------------------------------------------
+# Manutenção dos bancos, feita com o sistema no ar:
+#   - copiar_bancos: cópia de segurança com a API de backup do SQLite, alguns
+#     blocos de páginas por vez, sem parar os escritores;
+#   - arquivar_vendas: move as vendas anteriores a uma data para arquivos por
+#     ano (vendas_arquivo_AAAA.db, ao lado de 'cliente.db'), em lotes, cada
+#     lote em uma transação curta que grava no arquivo e apaga da 'cliente.db';
+#   - compactar: devolve ao sistema as páginas livres deixadas pelas exclusões
+#     (auto_vacuum incremental), alguns blocos por vez;
+#   - fotografar: tira uma foto do estoque (estoque_def.fotografar_se_preciso)
+#     quando o livro de movimentos cresceu, para que estoque_em não refaça o
+#     livro desde o início;
+#   - conectar_historico / vendas_historicas: consultam as vendas atuais e as
+#     arquivadas juntas, pela view temporária 'vendas_historico', que une
+#     'mercadoria' às tabelas dos arquivos anexados com ATTACH.
+#
+# As vendas arquivadas saem da 'cliente.db' como se tivessem sido excluídas:
+# deixam os resumos (relatorios) e o índice de busca, e não podem mais ser
+# alteradas ou canceladas. Clientes e produtos continuam na 'cliente.db'.
+#
+# Uso: python manutencao.py copiar | arquivar 01/01/2025 | compactar | historico --cpf ...
+# ---------------------------------------------------------------------------
+
+MODULOS = {'cliente': cliente_def, 'estoque': estoque_def}
+
+# Nome dos arquivos de vendas arquivadas; o ano é o da data da compra
+ARQUIVO_VENDAS = 'vendas_arquivo_{ano}.db'
+
+# Tabela das vendas em cada arquivo: as colunas de 'mercadoria' (cliente e
+# produto como estavam ao arquivar) e a data do arquivamento
+SQL_ARQUIVO = '''
+    CREATE TABLE IF NOT EXISTS arquivo.vendas_arquivadas (
+        id INTEGER PRIMARY KEY,
+        cpf TEXT NOT NULL,
+        nome TEXT NOT NULL,
+        data_nascimento TEXT NOT NULL,
+        data_compra TEXT,
+        serie TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        marca TEXT NOT NULL,
+        modelo TEXT NOT NULL,
+        quantidade INTEGER NOT NULL,
+        valor_unitario REAL NOT NULL,
+        valor_total REAL NOT NULL,
+        data_compra_iso TEXT,
+        cancelada_em TEXT,
+        arquivada_em TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS arquivo.idx_vendas_arquivadas_cpf ON vendas_arquivadas (cpf);
+    CREATE INDEX IF NOT EXISTS arquivo.idx_vendas_arquivadas_data_compra_iso ON vendas_arquivadas (data_compra_iso);
+'''
+
+# ---------------------------------------------------------------------------
+# Função: copiar_banco(nome, destino, paginas_por_passo=1024, pausa=0.001, max_reinicios=3)
+# Descrição: Copia o banco 'nome' para o arquivo 'destino' com a API de backup,
+# 'paginas_por_passo' páginas por vez, esperando 'pausa' segundos entre os
+# passos. Com o banco em WAL, a cópia lê uma foto fixa do banco (transação de
+# leitura aberta) e os escritores nunca esperam. Sem WAL, o banco só fica
+# bloqueado durante cada passo, mas uma gravação de outra conexão faz o SQLite
+# recomeçar a cópia; depois de 'max_reinicios' recomeços o restante é copiado
+# de uma vez, segurando os escritores só pelo tempo dessa cópia. A cópia é
+# gravada em um arquivo temporário, conferida (PRAGMA quick_check) e só então
+# renomeada para 'destino'.
+# ---------------------------------------------------------------------------
+def copiar_banco(nome, destino, paginas_por_passo=1024, pausa=0.001, max_reinicios=3):
+    conexao.preparar(nome)
+    temporario = destino + '.parcial'
+    origem = sqlite3.connect(conexao.BANCOS[nome], timeout=conexao.CONFIGURACAO['timeout'], isolation_level=None)
+    copia = sqlite3.connect(temporario)
+    reinicios, restantes = 0, [None]
+
+    def progresso(situacao, faltam, total):
+        nonlocal reinicios
+        if restantes[0] is not None and faltam >= restantes[0]:
+            reinicios += 1
+            if reinicios > max_reinicios:
+                raise _CopiaReiniciada
+        restantes[0] = faltam
+        time.sleep(pausa)
+
+    try:
+        if origem.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            origem.execute('BEGIN')
+            origem.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        try:
+            origem.backup(copia, pages=paginas_por_passo, progress=progresso)
+        except _CopiaReiniciada:
+            origem.backup(copia, pages=-1)
+        situacao = copia.execute('PRAGMA quick_check').fetchone()[0]
+    finally:
+        copia.close()
+        origem.close()
+    if situacao != 'ok':
+        os.remove(temporario)
+        raise sqlite3.DatabaseError(f"Cópia de '{nome}' corrompida: {situacao}")
+    os.replace(temporario, destino)
+    return destino
+
+
+class _CopiaReiniciada(Exception):
+    pass
+
+# ---------------------------------------------------------------------------
+# Função: copiar_bancos(diretorio=None, **opcoes)
+# Descrição: Copia 'cliente.db' e 'estoque.db' (ver copiar_banco) para
+# 'diretorio', por padrão backups/AAAAMMDD_HHMMSS ao lado dos bancos. Os
+# arquivos de vendas arquivadas não mudam depois de gravados e não são
+# copiados. Retorna o diretório da cópia.
+# ---------------------------------------------------------------------------
+def copiar_bancos(diretorio=None, **opcoes):
+    if diretorio is None:
+        diretorio = os.path.join(_diretorio_bancos(), 'backups', datetime.now().strftime('%Y%m%d_%H%M%S'))
+    os.makedirs(diretorio, exist_ok=True)
+    for nome in MODULOS:
+        copiar_banco(nome, os.path.join(diretorio, os.path.basename(conexao.BANCOS[nome])), **opcoes)
+    print(f"Cópia de segurança gravada em {diretorio}")
+    return diretorio
+
+# ---------------------------------------------------------------------------
+# Função: arquivar_vendas(antes, tamanho_lote=5000, pausa=0.0)
+# Descrição: Move as vendas com data da compra anterior a 'antes' (datetime ou
+# texto DD/MM/AAAA, AAAA-MM-DD...) para os arquivos do ano de cada uma. Cada
+# lote de até 'tamanho_lote' vendas é copiado para o arquivo e apagado de
+# 'vendas' na mesma transação (BEGIN IMMEDIATE com o arquivo anexado), então
+# uma queda no meio não perde nem duplica vendas (com WAL a transação não é
+# atômica entre os arquivos: o lote pode ficar nos dois até o próximo
+# arquivamento, que o refaz). Entre os lotes espera 'pausa' segundos, deixando
+# os outros escritores avançarem. Vendas sem data reconhecida não são
+# arquivadas. Retorna a quantidade de vendas arquivadas.
+# ---------------------------------------------------------------------------
+def arquivar_vendas(antes, tamanho_lote=5000, pausa=0.0):
+    corte = data_iso(antes)
+    if not corte:
+        print("Erro: Data inválida. Use DD/MM/AAAA ou AAAA-MM-DD.")
+        return 0
+
+    colunas = ', '.join(COLUNAS_MERCADORIA)
+    arquivadas = 0
+    conn = conexao.nova_conexao('cliente', autocommit=True)
+    try:
+        conn.execute('CREATE TEMP TABLE lote_arquivamento (id INTEGER PRIMARY KEY)')
+        anos = [linha[0] for linha in conn.execute(
+            "SELECT DISTINCT substr(data_compra_iso, 1, 4) FROM vendas WHERE data_compra_iso < ?", (corte,))]
+        for ano in anos:
+            conn.execute('ATTACH DATABASE ? AS arquivo', (caminho_arquivo(ano),))
+            for comando in dividir_comandos(SQL_ARQUIVO):
+                conn.execute(comando)
+            faixa = (f'{ano}-01-01', min(corte, f'{int(ano) + 1}-01-01'))
+            while True:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.execute('DELETE FROM lote_arquivamento')
+                    movidas = conn.execute('''
+                        INSERT INTO lote_arquivamento (id) SELECT id FROM vendas
+                        WHERE data_compra_iso >= ? AND data_compra_iso < ? ORDER BY data_compra_iso LIMIT ?
+                    ''', (*faixa, tamanho_lote)).rowcount
+                    if movidas:
+                        conn.execute(f'''
+                            INSERT OR REPLACE INTO arquivo.vendas_arquivadas ({colunas}, arquivada_em)
+                            SELECT {colunas}, ? FROM mercadoria WHERE id IN (SELECT id FROM lote_arquivamento)
+                        ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),))
+                        conn.execute('DELETE FROM vendas WHERE id IN (SELECT id FROM lote_arquivamento)')
+                    conn.execute('COMMIT')
+                except sqlite3.Error:
+                    conn.execute('ROLLBACK')
+                    raise
+                arquivadas += movidas
+                if movidas < tamanho_lote:
+                    break
+                time.sleep(pausa)
+            conn.execute('DETACH DATABASE arquivo')
+    finally:
+        conn.close()
+    print(f"{arquivadas} vendas arquivadas.")
+    return arquivadas
+
+# ---------------------------------------------------------------------------
+# Função: compactar(nome='cliente', paginas_por_passo=1000, pausa=0.0)
+# Descrição: Libera as páginas vazias do banco 'nome' com PRAGMA
+# incremental_vacuum, 'paginas_por_passo' por transação. Na primeira vez o
+# banco é passado para auto_vacuum=INCREMENTAL, o que exige um VACUUM completo
+# (bloqueia o banco enquanto reescreve o arquivo); no 'estoque.db' o índice de
+# busca é refeito em seguida, pois o VACUUM pode renumerar os rowids de
+# 'estoque'. Retorna a quantidade de páginas liberadas.
+# ---------------------------------------------------------------------------
+def compactar(nome='cliente', paginas_por_passo=1000, pausa=0.0):
+    conn = conexao.obter_conexao(nome)
+    conn.commit()
+    livres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        if nome == 'estoque' and conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'busca_estoque'").fetchone():
+            conn.execute(estoque_def.SQL_RECONSTRUIR_BUSCA)
+            conn.commit()
+        print(f"Banco '{nome}' reescrito com auto_vacuum incremental: {livres} páginas liberadas.")
+        return livres
+
+    liberadas = 0
+    while True:
+        conn.execute(f'PRAGMA incremental_vacuum({int(paginas_por_passo)})').fetchall()
+        restantes = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if restantes >= livres:
+            break
+        liberadas += livres - restantes
+        livres = restantes
+        time.sleep(pausa)
+    print(f"Banco '{nome}' compactado: {liberadas} páginas liberadas.")
+    return liberadas
+
+# ---------------------------------------------------------------------------
+# Função: caminho_arquivo(ano)
+# Descrição: Caminho do arquivo das vendas arquivadas do ano, ao lado de 'cliente.db'.
+# ---------------------------------------------------------------------------
+def caminho_arquivo(ano):
+    return os.path.join(_diretorio_bancos(), ARQUIVO_VENDAS.format(ano=ano))
+
+# ---------------------------------------------------------------------------
+# Função: arquivos_de_vendas()
+# Descrição: Retorna {ano: caminho} dos arquivos de vendas existentes.
+# ---------------------------------------------------------------------------
+def arquivos_de_vendas():
+    padrao = os.path.join(_diretorio_bancos(), ARQUIVO_VENDAS.format(ano='*'))
+    arquivos = {}
+    for caminho in sorted(glob.glob(padrao)):
+        encontrado = re.search(r'(\d{4})\.db$', caminho)
+        if encontrado:
+            arquivos[encontrado.group(1)] = caminho
+    return arquivos
+
+# ---------------------------------------------------------------------------
+# Função: conectar_historico(anos=None)
+# Descrição: Abre uma conexão nova com 'cliente.db', anexa os arquivos de
+# vendas (todos ou só os de 'anos') e cria a view temporária 'vendas_historico',
+# com as colunas de 'mercadoria', unindo as vendas atuais às arquivadas. Os
+# filtros sobre a view chegam a cada tabela e usam os índices delas. O SQLite
+# anexa no máximo 10 bancos por conexão; com mais anos, informe 'anos'.
+# Quem chama deve fechar a conexão.
+# ---------------------------------------------------------------------------
+def conectar_historico(anos=None):
+    colunas = ', '.join(COLUNAS_MERCADORIA)
+    conn = conexao.nova_conexao('cliente')
+    partes = [f'SELECT {colunas} FROM main.mercadoria']
+    for ano, caminho in arquivos_de_vendas().items():
+        if anos is None or ano in anos:
+            conn.execute(f'ATTACH DATABASE ? AS arquivo_{ano}', (caminho,))
+            partes.append(f'SELECT {colunas} FROM arquivo_{ano}.vendas_arquivadas')
+    conn.execute('CREATE TEMP VIEW vendas_historico AS ' + ' UNION ALL '.join(partes))
+    return conn
+
+# ---------------------------------------------------------------------------
+# Função: vendas_historicas(cpf=None, inicio=None, fim=None)
+# Descrição: Retorna as vendas, atuais e arquivadas, do cliente 'cpf' e/ou com
+# data da compra entre 'inicio' e 'fim' (inclusive), em ordem cronológica.
+# Só são anexados os arquivos dos anos do período.
+# ---------------------------------------------------------------------------
+def vendas_historicas(cpf=None, inicio=None, fim=None):
+    inicio_iso = data_iso(inicio) if inicio else '0000'
+    fim_iso = data_iso(fim) if fim else '9999'
+    if not inicio_iso or not fim_iso:
+        print("Erro: Data inválida. Use DD/MM/AAAA ou AAAA-MM-DD.")
+        return []
+    if isinstance(fim, str) and len(fim.strip()) == 10:
+        fim_iso = fim_iso[:10] + ' 23:59:59'
+
+    consulta = 'SELECT * FROM vendas_historico WHERE data_compra_iso BETWEEN ? AND ?'
+    parametros = [inicio_iso, fim_iso]
+    if not inicio and not fim:
+        consulta = 'SELECT * FROM vendas_historico WHERE 1 = 1'
+        parametros = []
+    if cpf:
+        consulta += ' AND cpf = ?'
+        parametros.append(cpf)
+
+    anos = [ano for ano in arquivos_de_vendas() if inicio_iso[:4] <= ano <= fim_iso[:4]]
+    conn = conectar_historico(anos)
+    try:
+        return conn.execute(consulta + ' ORDER BY data_compra_iso, id', parametros).fetchall()
+    finally:
+        conn.close()
+
+
+def _diretorio_bancos():
+    return os.path.dirname(conexao.BANCOS['cliente']) or '.'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cópia de segurança, arquivamento, compactação e fotos dos bancos.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    copiar = comandos.add_parser('copiar', help="cópia de segurança dos bancos, sem parar o sistema")
+    copiar.add_argument('--destino', help="diretório da cópia (padrão: backups/AAAAMMDD_HHMMSS)")
+    arquivar = comandos.add_parser('arquivar', help="move as vendas anteriores a uma data para os arquivos por ano")
+    arquivar.add_argument('antes', help="data de corte (DD/MM/AAAA ou AAAA-MM-DD)")
+    arquivar.add_argument('--lote', type=int, default=5000, help="vendas por transação")
+    compactar_ = comandos.add_parser('compactar', help="libera as páginas vazias dos bancos")
+    compactar_.add_argument('--banco', choices=sorted(MODULOS), help="só este banco")
+    fotografar = comandos.add_parser('fotografar', help="tira uma foto do estoque se o livro de movimentos cresceu")
+    fotografar.add_argument('--a-cada', type=int, default=estoque_def.FOTO_A_CADA,
+                            help="movimentos depois da última foto (0 fotografa sempre que houver algum)")
+    historico = comandos.add_parser('historico', help="vendas atuais e arquivadas")
+    historico.add_argument('--cpf')
+    historico.add_argument('--inicio')
+    historico.add_argument('--fim')
+    args = parser.parse_args()
+
+    if args.comando == 'copiar':
+        copiar_bancos(args.destino)
+    elif args.comando == 'arquivar':
+        arquivar_vendas(args.antes, args.lote)
+    elif args.comando == 'compactar':
+        for nome in [args.banco] if args.banco else MODULOS:
+            compactar(nome)
+    elif args.comando == 'fotografar':
+        if not estoque_def.fotografar_se_preciso(args.a_cada):
+            print("Nenhuma foto necessária.")
+    else:
+        vendas = vendas_historicas(args.cpf, args.inicio, args.fim)
+        for venda in vendas:
+            print(venda)
+        if not vendas:
+            print("Nenhuma venda encontrada.")
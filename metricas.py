@@ -0,0 +1,270 @@
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import conexao
+
+# ---------------------------------------------------------------------------
+# Instrumentação das consultas.
+# Com ativar(), as conexões passam a ser criadas com ConexaoInstrumentada, que
+# mede cada comando (do execute/executemany até a leitura da última linha) e
+# cada commit: histograma de latência e linhas retornadas por comando SQL, e
+# tempo de commit (onde ocorre o fsync).
+# Comandos acima de 'limite_lento_ms' vão para o log de consultas lentas junto
+# com o EXPLAIN QUERY PLAN. As métricas podem ser exportadas no formato texto
+# do Prometheus, para um arquivo ou por HTTP.
+# Desativada (o padrão), as conexões são sqlite3.Connection comuns, sem
+# nenhum custo adicional.
+# ---------------------------------------------------------------------------
+
+# Limites (em segundos) dos intervalos do histograma de latência
+INTERVALOS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONFIGURACAO = {
+    'limite_lento_ms': 100.0,
+    'arquivo_lento': 'consultas_lentas.log',
+}
+
+_metricas = {}
+_trava = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Função: ativar(limite_lento_ms=None, arquivo_lento=None)
+# Descrição: Liga a instrumentação. As conexões abertas são fechadas para que
+# as próximas já sejam criadas instrumentadas.
+# ---------------------------------------------------------------------------
+def ativar(limite_lento_ms=None, arquivo_lento=None):
+    if limite_lento_ms is not None:
+        CONFIGURACAO['limite_lento_ms'] = limite_lento_ms
+    if arquivo_lento is not None:
+        CONFIGURACAO['arquivo_lento'] = arquivo_lento
+    conexao.configurar_conexoes(fabrica=ConexaoInstrumentada)
+
+
+# ---------------------------------------------------------------------------
+# Função: desativar()
+# Descrição: Volta a usar conexões comuns. As métricas já coletadas são mantidas.
+# ---------------------------------------------------------------------------
+def desativar():
+    conexao.configurar_conexoes(fabrica=sqlite3.Connection)
+
+
+# ---------------------------------------------------------------------------
+# Função: zerar()
+# Descrição: Descarta todas as métricas coletadas.
+# ---------------------------------------------------------------------------
+def zerar():
+    with _trava:
+        _metricas.clear()
+
+
+# ---------------------------------------------------------------------------
+# Função: normalizar(sql)
+# Descrição: Reduz o texto do comando a uma linha com espaços simples, usada
+# como chave das métricas.
+# ---------------------------------------------------------------------------
+def normalizar(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def _registrar(sql, duracao, conn=None, parametros=(), linhas=0):
+    comando = normalizar(sql)
+    with _trava:
+        metrica = _metricas.get(comando)
+        if metrica is None:
+            metrica = _metricas[comando] = {'contagens': [0] * (len(INTERVALOS) + 1), 'soma': 0.0, 'linhas': 0}
+        metrica['soma'] += duracao
+        metrica['linhas'] += linhas
+        for i, limite in enumerate(INTERVALOS):
+            if duracao <= limite:
+                metrica['contagens'][i] += 1
+                break
+        else:
+            metrica['contagens'][-1] += 1
+    if duracao * 1000 >= CONFIGURACAO['limite_lento_ms']:
+        _registrar_lenta(comando, duracao, conn, parametros)
+    return comando
+
+
+def _registrar_lenta(comando, duracao, conn, parametros):
+    plano = ''
+    if conn is not None and comando.split(' ', 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+        try:
+            linhas = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + comando, parametros).fetchall()
+            plano = ''.join(f"\n    {linha[-1]}" for linha in linhas)
+        except sqlite3.Error as e:
+            plano = f"\n    (plano indisponível: {e})"
+    with _trava, open(CONFIGURACAO['arquivo_lento'], 'a', encoding='utf-8') as arquivo:
+        arquivo.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} {duracao * 1000:.2f} ms {comando}{plano}\n")
+
+
+# ---------------------------------------------------------------------------
+# Classe: CursorInstrumentado
+# Descrição: Cursor que mede cada comando e conta as linhas lidas. Em um
+# SELECT o SQLite faz boa parte do trabalho ao avançar pelas linhas, então o
+# tempo dos fetch* e da iteração soma ao do execute, e o comando só é
+# registrado (histograma e log de lentas) quando termina: ao ler a última
+# linha, ao executar outro comando no mesmo cursor, ao fechá-lo ou quando ele
+# é descartado. Comandos sem linhas de resultado são registrados no execute.
+# ---------------------------------------------------------------------------
+class CursorInstrumentado(sqlite3.Cursor):
+    _pendente = None
+
+    def execute(self, sql, parametros=()):
+        return self._executar(super().execute, sql, parametros, True)
+
+    def executemany(self, sql, sequencia):
+        return self._executar(super().executemany, sql, sequencia, False)
+
+    def _executar(self, funcao, sql, parametros, explicar):
+        self._encerrar()
+        self._pendente = {'sql': sql, 'parametros': parametros if explicar else (), 'explicar': explicar,
+                          'duracao': 0.0, 'linhas': 0}
+        try:
+            resultado = self._medir(funcao, sql, parametros)
+        except BaseException:
+            self._encerrar()
+            raise
+        if self.description is None:
+            self._pendente['linhas'] = max(self.rowcount, 0)
+            self._encerrar()
+        return resultado
+
+    def _medir(self, funcao, *args):
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args)
+        finally:
+            if self._pendente is not None:
+                self._pendente['duracao'] += time.perf_counter() - inicio
+
+    def _lidas(self, linhas, esgotado):
+        if self._pendente is not None:
+            self._pendente['linhas'] += linhas
+            if esgotado:
+                self._encerrar()
+
+    def _encerrar(self):
+        pendente, self._pendente = self._pendente, None
+        if pendente is not None:
+            _registrar(pendente['sql'], pendente['duracao'], self.connection if pendente['explicar'] else None,
+                       pendente['parametros'], pendente['linhas'])
+
+    def fetchone(self):
+        linha = self._medir(super().fetchone)
+        self._lidas(linha is not None, esgotado=linha is None)
+        return linha
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        linhas = self._medir(super().fetchmany, size)
+        self._lidas(len(linhas), esgotado=len(linhas) < size)
+        return linhas
+
+    def fetchall(self):
+        linhas = self._medir(super().fetchall)
+        self._lidas(len(linhas), esgotado=True)
+        return linhas
+
+    def __next__(self):
+        try:
+            linha = self._medir(super().__next__)
+        except StopIteration:
+            self._encerrar()
+            raise
+        self._lidas(1, esgotado=False)
+        return linha
+
+    def close(self):
+        self._encerrar()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._encerrar()
+        except (sqlite3.Error, OSError):
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Classe: ConexaoInstrumentada
+# Descrição: Conexão cujos cursores são instrumentados e cujo commit é medido
+# (registrado como o comando 'COMMIT').
+# ---------------------------------------------------------------------------
+class ConexaoInstrumentada(sqlite3.Connection):
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _registrar('COMMIT', time.perf_counter() - inicio)
+
+
+# ---------------------------------------------------------------------------
+# Função: exportar_prometheus(caminho=None)
+# Descrição: Retorna as métricas no formato texto do Prometheus e, se 'caminho'
+# for informado, grava-as nesse arquivo (para o coletor de arquivos do node_exporter).
+# ---------------------------------------------------------------------------
+def exportar_prometheus(caminho=None):
+    linhas = [
+        '# HELP sqlite_consulta_segundos Latência de cada comando SQL.',
+        '# TYPE sqlite_consulta_segundos histogram',
+    ]
+    linhas_lidas = [
+        '# HELP sqlite_consulta_linhas_total Linhas retornadas ou alteradas por comando SQL.',
+        '# TYPE sqlite_consulta_linhas_total counter',
+    ]
+    with _trava:
+        for comando, metrica in sorted(_metricas.items()):
+            rotulo = 'comando="' + comando.replace('\\', '\\\\').replace('"', '\\"') + '"'
+            acumulado = 0
+            for limite, contagem in zip(INTERVALOS + ('+Inf',), metrica['contagens']):
+                acumulado += contagem
+                linhas.append(f'sqlite_consulta_segundos_bucket{{{rotulo},le="{limite}"}} {acumulado}')
+            linhas.append(f'sqlite_consulta_segundos_sum{{{rotulo}}} {metrica["soma"]}')
+            linhas.append(f'sqlite_consulta_segundos_count{{{rotulo}}} {acumulado}')
+            linhas_lidas.append(f'sqlite_consulta_linhas_total{{{rotulo}}} {metrica["linhas"]}')
+    texto = '\n'.join(linhas + linhas_lidas) + '\n'
+    if caminho:
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto)
+    return texto
+
+
+# ---------------------------------------------------------------------------
+# Função: servir_metricas(porta=9464, endereco='127.0.0.1')
+# Descrição: Inicia, em uma thread, um servidor HTTP local que responde as
+# métricas em /metrics. Retorna o servidor (use .shutdown() para parar).
+# ---------------------------------------------------------------------------
+def servir_metricas(porta=9464, endereco='127.0.0.1'):
+    class Manipulador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            corpo = exportar_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((endereco, porta), Manipulador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
@@ -0,0 +1,70 @@
+import sqlite3
+
+# ---------------------------------------------------------------------------
+# Função: aplicar_migracoes(conn, migracoes)
+# Descrição: Aplica, em ordem, as migrações de esquema ainda não executadas no banco.
+# A versão atual do esquema fica em PRAGMA user_version: a migração de índice i
+# leva o banco para a versão i + 1. Cada migração pode ser um script SQL ou uma
+# função que recebe a conexão; ela e a atualização da versão rodam na mesma
+# transação (BEGIN IMMEDIATE), então uma falha não deixa o banco pela metade e
+# dois processos abrindo o banco ao mesmo tempo não repetem a mesma migração.
+# ---------------------------------------------------------------------------
+def aplicar_migracoes(conn, migracoes):
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= len(migracoes):
+        return len(migracoes)
+
+    conn.commit()
+    while True:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            versao = conn.execute('PRAGMA user_version').fetchone()[0]
+            if versao >= len(migracoes):
+                conn.commit()
+                return versao
+            migracao = migracoes[versao]
+            if callable(migracao):
+                migracao(conn)
+            else:
+                for comando in dividir_comandos(migracao):
+                    conn.execute(comando)
+            conn.execute(f'PRAGMA user_version = {versao + 1}')
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+
+# ---------------------------------------------------------------------------
+# Função: dividir_comandos(script)
+# Descrição: Separa um script SQL em comandos completos, respeitando ';' dentro
+# de gatilhos (BEGIN ... END) e de textos entre aspas.
+# ---------------------------------------------------------------------------
+def dividir_comandos(script):
+    comando = ''
+    for trecho in script.split(';'):
+        comando += trecho + ';'
+        if sqlite3.complete_statement(comando):
+            if comando.strip(' \n\t;'):
+                yield comando.strip()
+            comando = ''
+
+
+# ---------------------------------------------------------------------------
+# Função: tem_fts5(conn)
+# Descrição: Indica se o SQLite em uso foi compilado com a busca textual FTS5.
+# ---------------------------------------------------------------------------
+def tem_fts5(conn):
+    return bool(conn.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0])
+
+
+# ---------------------------------------------------------------------------
+# Função: migracao_fts5(script)
+# Descrição: Retorna uma migração que aplica 'script' só se o SQLite tiver FTS5;
+# sem ele a versão avança mesmo assim e a busca usa LIKE (ver busca.py).
+# ---------------------------------------------------------------------------
+def migracao_fts5(script):
+    def migrar(conn):
+        if tem_fts5(conn):
+            for comando in dividir_comandos(script):
+                conn.execute(comando)
+    return migrar
@@ -0,0 +1,167 @@
+import argparse
+
+import cliente_def
+import estoque_def
+from cliente_def import data_iso
+from migracoes import dividir_comandos
+
+# ---------------------------------------------------------------------------
+# Relatórios de vendas e estoque.
+# Os relatórios leem as tabelas de resumo (resumo_vendas_diario,
+# resumo_clientes e resumo_estoque), mantidas por gatilhos em cliente_def e
+# estoque_def, então o custo depende do número de grupos e não do número de
+# vendas. reconstruir_resumos() recalcula os resumos a partir das tabelas
+# originais e verificar_resumos() confere se eles batem com elas.
+# ---------------------------------------------------------------------------
+
+# Colunas pelas quais a receita pode ser agrupada
+GRUPOS_RECEITA = ('dia', 'tipo', 'marca', 'modelo')
+
+# Diferença máxima aceita entre valores somados (evita acusar arredondamentos)
+TOLERANCIA = 0.005
+
+# ---------------------------------------------------------------------------
+# Função: receita_por_grupo(agrupar=('tipo',), inicio=None, fim=None)
+# Descrição: Retorna vendas, unidades e receita agrupadas pelas colunas de
+# 'agrupar' (dia, tipo, marca e/ou modelo), opcionalmente entre as datas
+# 'inicio' e 'fim' (inclusive, DD/MM/AAAA ou AAAA-MM-DD). Cada linha é
+# (valores do grupo..., vendas, quantidade, receita), em ordem de receita.
+# Levanta ValueError se o agrupamento ou uma das datas for inválido.
+# ---------------------------------------------------------------------------
+def receita_por_grupo(agrupar=('tipo',), inicio=None, fim=None):
+    agrupar = tuple(agrupar)
+    invalidas = [c for c in agrupar if c not in GRUPOS_RECEITA]
+    if invalidas or not agrupar:
+        raise ValueError(f"Agrupamento inválido: {', '.join(invalidas) or 'vazio'}")
+
+    consulta = f"SELECT {', '.join(agrupar)}, SUM(vendas), SUM(quantidade), SUM(receita) FROM resumo_vendas_diario WHERE 1 = 1"
+    parametros = []
+    for data, comparacao in ((inicio, '>='), (fim, '<=')):
+        if not data:
+            continue
+        dia = data_iso(data)
+        if dia is None:
+            raise ValueError(f"Data inválida: {data}")
+        consulta += f" AND dia {comparacao} ?"
+        parametros.append(dia[:10])
+    consulta += f" GROUP BY {', '.join(agrupar)} ORDER BY SUM(receita) DESC"
+
+    conn, cursor = cliente_def.conectar()
+    cursor.execute(consulta, parametros)
+    return cursor.fetchall()
+
+# ---------------------------------------------------------------------------
+# Função: totais_por_cliente(cpf=None, limite=None)
+# Descrição: Retorna (cpf, vendas, quantidade, total) por cliente, do maior
+# para o menor total. Com 'cpf', retorna só a linha daquele cliente (ou None).
+# ---------------------------------------------------------------------------
+def totais_por_cliente(cpf=None, limite=None):
+    conn, cursor = cliente_def.conectar()
+    if cpf is not None:
+        cursor.execute("SELECT cpf, vendas, quantidade, total FROM resumo_clientes WHERE cpf = ?", (cpf,))
+        return cursor.fetchone()
+    consulta = "SELECT cpf, vendas, quantidade, total FROM resumo_clientes ORDER BY total DESC"
+    if limite:
+        consulta += f" LIMIT {int(limite)}"
+    cursor.execute(consulta)
+    return cursor.fetchall()
+
+# ---------------------------------------------------------------------------
+# Função: valor_estoque()
+# Descrição: Retorna (produtos, quantidade, valor) do estoque atual, onde valor
+# é a soma de quantidade * preço de todos os produtos.
+# ---------------------------------------------------------------------------
+def valor_estoque():
+    conn, cursor = estoque_def.conectar()
+    cursor.execute("SELECT produtos, quantidade, valor FROM resumo_estoque WHERE id = 1")
+    return cursor.fetchone() or (0, 0, 0.0)
+
+# ---------------------------------------------------------------------------
+# Função: reconstruir_resumos()
+# Descrição: Recalcula todas as tabelas de resumo a partir de 'mercadoria' e
+# 'estoque', cada banco em uma transação.
+# ---------------------------------------------------------------------------
+def reconstruir_resumos():
+    for modulo in (cliente_def, estoque_def):
+        conn, cursor = modulo.conectar()
+        try:
+            for comando in dividir_comandos(modulo.SQL_RECONSTRUIR_RESUMOS):
+                cursor.execute(comando)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    print("Resumos reconstruídos com sucesso!")
+
+# ---------------------------------------------------------------------------
+# Função: verificar_resumos()
+# Descrição: Compara as tabelas de resumo com o cálculo feito direto sobre
+# 'mercadoria' e 'estoque'. Imprime e retorna a lista de divergências
+# encontradas (vazia quando tudo confere).
+# ---------------------------------------------------------------------------
+def verificar_resumos():
+    divergencias = []
+
+    conn, cursor = cliente_def.conectar()
+    consultas = [
+        ('resumo_vendas_diario',
+         "SELECT dia, tipo, marca, modelo, vendas, quantidade, receita FROM resumo_vendas_diario",
+         """SELECT COALESCE(substr(data_compra_iso, 1, 10), ''), tipo, marca, modelo, COUNT(*), SUM(quantidade), SUM(valor_total)
+            FROM mercadoria WHERE cancelada_em IS NULL GROUP BY 1, 2, 3, 4""", 4),
+        ('resumo_clientes',
+         "SELECT cpf, vendas, quantidade, total FROM resumo_clientes",
+         "SELECT cpf, COUNT(*), SUM(quantidade), SUM(valor_total) FROM mercadoria WHERE cancelada_em IS NULL GROUP BY cpf", 1),
+    ]
+    for tabela, consulta_resumo, consulta_original, tamanho_chave in consultas:
+        resumo = {linha[:tamanho_chave]: linha[tamanho_chave:] for linha in cursor.execute(consulta_resumo)}
+        original = {linha[:tamanho_chave]: linha[tamanho_chave:] for linha in cursor.execute(consulta_original)}
+        for chave in resumo.keys() | original.keys():
+            if not _valores_iguais(resumo.get(chave), original.get(chave)):
+                divergencias.append(f"{tabela} {chave}: resumo={resumo.get(chave)} calculado={original.get(chave)}")
+
+    conn, cursor = estoque_def.conectar()
+    resumo = valor_estoque()
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(quantidade), 0), COALESCE(SUM(quantidade * preco), 0) FROM estoque")
+    original = cursor.fetchone()
+    if not _valores_iguais(resumo, original):
+        divergencias.append(f"resumo_estoque: resumo={resumo} calculado={original}")
+
+    for divergencia in divergencias:
+        print(divergencia)
+    if not divergencias:
+        print("Resumos conferem com as tabelas.")
+    return divergencias
+
+def _valores_iguais(a, b):
+    if a is None or b is None:
+        return a == b
+    return all(abs(x - y) <= TOLERANCIA for x, y in zip(a, b))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relatórios de vendas e estoque.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    receita = comandos.add_parser('receita', help="receita agrupada por dia/tipo/marca/modelo")
+    receita.add_argument('--por', nargs='+', default=['tipo'], choices=GRUPOS_RECEITA)
+    receita.add_argument('--inicio')
+    receita.add_argument('--fim')
+    clientes = comandos.add_parser('clientes', help="totais por cliente")
+    clientes.add_argument('--limite', type=int, default=20)
+    comandos.add_parser('estoque', help="valor total do estoque")
+    comandos.add_parser('reconstruir', help="recalcula os resumos")
+    comandos.add_parser('verificar', help="confere os resumos com as tabelas")
+    args = parser.parse_args()
+
+    if args.comando == 'receita':
+        for linha in receita_por_grupo(args.por, args.inicio, args.fim):
+            print(linha)
+    elif args.comando == 'clientes':
+        for linha in totais_por_cliente(limite=args.limite):
+            print(linha)
+    elif args.comando == 'estoque':
+        produtos, quantidade, valor = valor_estoque()
+        print(f"Produtos: {produtos}  Unidades: {quantidade}  Valor: R${valor:.2f}")
+    elif args.comando == 'reconstruir':
+        reconstruir_resumos()
+    else:
+        raise SystemExit(1 if verificar_resumos() else 0)
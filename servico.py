@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import cliente_def
+import estoque_def
+import venda_def
+from escritor import EscritorAgrupado
+
+# ---------------------------------------------------------------------------
+# Serviço HTTP local (asyncio, só biblioteca padrão) para os terminais de venda.
+# Em vez de cada terminal abrir os arquivos SQLite, todos falam com este
+# processo, que concentra o acesso aos bancos:
+#   - as leituras rodam em um pool limitado de threads leitoras; consultas
+#     simultâneas pela mesma série são agrupadas em uma única ida ao banco;
+#   - vendas e cancelamentos vão para um único escritor (EscritorAgrupado na
+#     conexão de venda_def), que aplica em uma transação o que estiver na
+#     fila; com a fila cheia a requisição é recusada com 503 e Retry-After.
+#
+# Rotas (respostas em JSON):
+#     GET    /estoque/<serie>                     produto do estoque
+#     GET    /estoque?limite=50&apos=<serie>&tipo=...   página do estoque
+#     POST   /vendas   {"serie", "cpf", "nome", "data_nascimento", "quantidade", "data_compra"?, "token"?}
+#     DELETE /vendas/<id>                         cancela a venda
+#     POST   /vendas/cancelamentos   {"ids": [...]}   cancela várias vendas em uma transação
+#     GET    /vendas?limite=50&apos=<id>&cpf=...  página das vendas
+#     GET    /status                              fila do escritor e contadores
+#
+# O "token" de POST /vendas é a chave de idempotência: reenviar a mesma venda
+# com o mesmo token (ex.: após perder a resposta) não a registra de novo.
+#
+# Uso: python servico.py --porta 8080
+# ---------------------------------------------------------------------------
+
+MOTIVOS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 409: 'Conflict',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+# Maior página aceita nas listagens
+LIMITE_PAGINA = 1000
+
+
+class Ocupado(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Função: _registrar_venda(serie, cpf, nome, data_nascimento, quantidade, data_compra, token)
+# Descrição: Roda na thread do escritor: chama vender() com o token de
+# idempotência e, se a venda foi registrada (agora ou antes, com o mesmo
+# token), retorna também o id dela, lido no livro de movimentos.
+# ---------------------------------------------------------------------------
+def _registrar_venda(serie, cpf, nome, data_nascimento, quantidade, data_compra, token):
+    mensagem = venda_def.vender(serie, cpf, nome, data_nascimento, quantidade, data_compra, token=token)
+    if mensagem.startswith('Erro'):
+        return mensagem, None
+    linha = venda_def.conectar_venda().execute(
+        'SELECT id_venda FROM est.movimentos_estoque WHERE token = ?', (token,)).fetchone()
+    return mensagem, linha[0] if linha else None
+
+
+# ---------------------------------------------------------------------------
+# Função: _fotografar_estoque()
+# Descrição: Roda na thread do escritor: tira a foto do estoque, se preciso,
+# pela conexão de venda_def (a do escritor), dentro do grupo de operações.
+# ---------------------------------------------------------------------------
+def _fotografar_estoque():
+    return estoque_def.fotografar_se_preciso(conn=venda_def.conectar_venda())
+
+
+def _status_da_mensagem(mensagem, sucesso=200):
+    if not mensagem.startswith('Erro'):
+        return sucesso
+    if 'não encontrad' in mensagem:
+        return 404
+    if 'ocupado' in mensagem:
+        return 503
+    if 'insuficiente' in mensagem:
+        return 409
+    return 400
+
+
+# ---------------------------------------------------------------------------
+# Classe: Servico
+# Descrição: Estado do serviço: pool de leitura (limitado a 'leitores' threads
+# e 'max_leituras' leituras pendentes), escritor único com fila de
+# 'tamanho_fila' operações e as consultas por série em andamento.
+# ---------------------------------------------------------------------------
+class Servico:
+    def __init__(self, leitores=8, max_leituras=256, tamanho_fila=1000, max_operacoes=500):
+        self.leitores = ThreadPoolExecutor(leitores, thread_name_prefix='leitor')
+        self.escritor = EscritorAgrupado('cliente', max_operacoes=max_operacoes, tamanho_fila=tamanho_fila,
+                                         wal=False, anexos=(('estoque', 'est'),), autocommit=True)
+        self._vagas = asyncio.Semaphore(max_leituras)
+        self._em_andamento = {}
+        self.contadores = {'requisicoes': 0, 'coalescidas': 0, 'recusadas': 0}
+
+    def fechar(self):
+        self.escritor.parar()
+        self.leitores.shutdown()
+
+    async def _ler(self, funcao, *args):
+        async with self._vagas:
+            return await asyncio.get_running_loop().run_in_executor(self.leitores, funcao, *args)
+
+    async def _escrever(self, funcao, *args):
+        try:
+            futuro = self.escritor.enviar(funcao, *args, bloquear=False)
+        except queue.Full:
+            self.contadores['recusadas'] += 1
+            raise Ocupado
+        return await asyncio.wrap_future(futuro)
+
+    # -----------------------------------------------------------------------
+    # Método: consultar(serie)
+    # Descrição: Busca o produto pela série. Se já houver uma busca pela mesma
+    # série em andamento, aguarda o resultado dela em vez de ir ao banco.
+    # -----------------------------------------------------------------------
+    async def consultar(self, serie):
+        tarefa = self._em_andamento.get(serie)
+        if tarefa is not None:
+            self.contadores['coalescidas'] += 1
+        else:
+            tarefa = asyncio.ensure_future(self._ler(estoque_def.consultar_produto_por_serie, serie))
+            self._em_andamento[serie] = tarefa
+            tarefa.add_done_callback(lambda _: self._em_andamento.pop(serie, None))
+        return await asyncio.shield(tarefa)
+
+    # -----------------------------------------------------------------------
+    # Método: fotografar_periodicamente(intervalo)
+    # Descrição: A cada 'intervalo' segundos, tira uma foto do estoque se o livro
+    # de movimentos cresceu (estoque_def.fotografar_se_preciso), para que
+    # estoque_em continue rápido. A foto grava no banco, então vai pelo escritor
+    # único, como as vendas; com a fila cheia fica para o próximo intervalo.
+    # -----------------------------------------------------------------------
+    async def fotografar_periodicamente(self, intervalo):
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                await self._escrever(_fotografar_estoque)
+            except Ocupado:
+                continue
+            except sqlite3.Error as e:
+                print(f"Erro ao fotografar o estoque: {e}", file=sys.stderr, flush=True)
+
+    async def _pagina(self, iterar, colunas, chave, parametros):
+        limite = min(int(parametros.pop('limite', 50)), LIMITE_PAGINA)
+        if limite < 1:
+            raise ValueError("o limite deve ser pelo menos 1")
+        apos = parametros.pop('apos', None)
+        if apos is not None and chave == 'id':
+            apos = int(apos)
+        linhas = await self._ler(lambda: list(islice(iterar(tamanho_pagina=limite, apos=apos, **parametros), limite)))
+        itens = [dict(zip(colunas, linha)) for linha in linhas]
+        return {'itens': itens, 'proximo': itens[-1][chave] if len(itens) == limite else None}
+
+    # -----------------------------------------------------------------------
+    # Método: rotear(metodo, caminho, parametros, corpo)
+    # Descrição: Executa a rota e retorna (status HTTP, resposta).
+    # -----------------------------------------------------------------------
+    async def rotear(self, metodo, caminho, parametros, corpo):
+        partes = [unquote(parte) for parte in caminho.strip('/').split('/')]
+        if metodo == 'GET' and partes[0] == 'estoque' and len(partes) == 2:
+            produto = await self.consultar(partes[1])
+            if produto is None:
+                return 404, {'mensagem': "Produto não encontrado no estoque."}
+            return 200, dict(zip(estoque_def.COLUNAS_ESTOQUE, produto))
+        if metodo == 'GET' and partes == ['estoque']:
+            return 200, await self._pagina(estoque_def.iterar_estoque, estoque_def.COLUNAS_ESTOQUE, 'serie', parametros)
+        if metodo == 'GET' and partes == ['vendas']:
+            return 200, await self._pagina(cliente_def.iterar_vendas, cliente_def.COLUNAS_MERCADORIA, 'id', parametros)
+        if metodo == 'POST' and partes == ['vendas']:
+            venda = json.loads(corpo or b'{}')
+            mensagem, id_venda = await self._escrever(
+                _registrar_venda, venda['serie'], venda['cpf'], venda['nome'], venda['data_nascimento'],
+                int(venda['quantidade']), venda.get('data_compra'), venda.get('token') or uuid.uuid4().hex)
+            resposta = {'mensagem': mensagem}
+            if id_venda is not None:
+                resposta['id'] = id_venda
+            return _status_da_mensagem(mensagem, 201), resposta
+        if metodo == 'POST' and partes == ['vendas', 'cancelamentos']:
+            ids = [int(id_venda) for id_venda in json.loads(corpo or b'{}')['ids']]
+            resultados = await self._escrever(venda_def.cancelar_vendas, ids)
+            return 200, {'resultados': [{'id': id_venda, 'mensagem': mensagem, 'status': _status_da_mensagem(mensagem)}
+                                        for id_venda, mensagem in resultados]}
+        if metodo == 'DELETE' and partes[0] == 'vendas' and len(partes) == 2:
+            mensagem = await self._escrever(venda_def.cancelar_venda, int(partes[1]))
+            return _status_da_mensagem(mensagem), {'mensagem': mensagem}
+        if metodo == 'GET' and partes == ['status']:
+            return 200, {'fila_escritor': self.escritor.pendentes(), **self.contadores}
+        return 404, {'mensagem': "Rota não encontrada."}
+
+    # -----------------------------------------------------------------------
+    # Método: atender(leitor, escritor)
+    # Descrição: Atende uma conexão HTTP/1.1, com keep-alive, uma requisição
+    # por vez.
+    # -----------------------------------------------------------------------
+    async def atender(self, leitor, escritor):
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha.strip():
+                    break
+                metodo, alvo, versao = linha.decode('latin-1').split()
+                cabecalhos = {}
+                while True:
+                    linha = await leitor.readline()
+                    if not linha.strip():
+                        break
+                    nome, _, valor = linha.decode('latin-1').partition(':')
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                corpo = await leitor.readexactly(int(cabecalhos.get('content-length') or 0))
+
+                self.contadores['requisicoes'] += 1
+                extras = ''
+                url = urlsplit(alvo)
+                try:
+                    status, resposta = await self.rotear(metodo.upper(), url.path, dict(parse_qsl(url.query)), corpo)
+                except Ocupado:
+                    status, resposta = 503, {'mensagem': "Fila de escrita cheia. Tente novamente."}
+                    extras = 'Retry-After: 1\r\n'
+                except (ValueError, KeyError, TypeError) as e:
+                    status, resposta = 400, {'mensagem': f"Requisição inválida: {e}"}
+                except sqlite3.Error as e:
+                    status, resposta = 500, {'mensagem': f"Erro no banco de dados: {e}"}
+
+                manter = versao.upper() == 'HTTP/1.1' and cabecalhos.get('connection', '').lower() != 'close'
+                dados = json.dumps(resposta, ensure_ascii=False).encode('utf-8')
+                escritor.write(
+                    f"HTTP/1.1 {status} {MOTIVOS[status]}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(dados)}\r\n{extras}"
+                    f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n".encode('latin-1') + dados)
+                await escritor.drain()
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            escritor.close()
+
+
+# ---------------------------------------------------------------------------
+# Função: servir(endereco='127.0.0.1', porta=8080, intervalo_foto=60.0, **opcoes)
+# Descrição: Sobe o serviço e atende até ser interrompido. 'opcoes' vão para
+# Servico (leitores, max_leituras, tamanho_fila, max_operacoes). A cada
+# 'intervalo_foto' segundos confere se é hora de fotografar o estoque.
+# ---------------------------------------------------------------------------
+async def servir(endereco='127.0.0.1', porta=8080, intervalo_foto=60.0, **opcoes):
+    servico = Servico(**opcoes)
+    servidor = await asyncio.start_server(servico.atender, endereco, porta, backlog=1024)
+    fotos = asyncio.ensure_future(servico.fotografar_periodicamente(intervalo_foto))
+    print(f"Servindo em http://{endereco}:{porta}", file=sys.stderr, flush=True)
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        fotos.cancel()
+        servico.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço HTTP de estoque e vendas.")
+    parser.add_argument('--endereco', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--leitores', type=int, default=8, help="threads de leitura")
+    parser.add_argument('--tamanho-fila', type=int, default=1000, help="operações aguardando o escritor")
+    args = parser.parse_args()
+    # As funções de cliente_def/estoque_def/venda_def imprimem mensagens para o
+    # menu; no serviço elas voltam só nas respostas.
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        try:
+            asyncio.run(servir(args.endereco, args.porta, leitores=args.leitores, tamanho_fila=args.tamanho_fila))
+        except KeyboardInterrupt:
+            pass
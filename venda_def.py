@@ -0,0 +1,182 @@
+import random
+import sqlite3
+import time
+from datetime import datetime
+
+from conexao import em_grupo, marcar_grupo, obter_conexao
+
+# Registra o preparo de 'estoque.db', anexado à conexão de venda (ver conexao.registrar_preparo)
+import estoque_def
+from cliente_def import inserir_venda
+
+
+# ---------------------------------------------------------------------------
+# Função: conectar_venda()
+# Descrição: Retorna a conexão da thread atual com 'cliente.db' tendo 'estoque.db'
+# anexado como 'est', para que a baixa no estoque e o registro da venda ocorram
+# na mesma transação. A conexão usa controle manual de transações (BEGIN/COMMIT).
+# ---------------------------------------------------------------------------
+def conectar_venda():
+    return obter_conexao('cliente', anexos=(('estoque', 'est'),), autocommit=True)
+
+
+# ---------------------------------------------------------------------------
+# Função: vender(serie, cpf, nome, data_nascimento, quantidade, data_compra, tentativas, token)
+# Descrição: Realiza uma venda de forma atômica. Dentro de um único BEGIN IMMEDIATE:
+#           - Registra a venda (cliente_def.inserir_venda) com tipo, marca, modelo e preço do estoque.
+#           - Registra a saída no livro de movimentos do estoque (est.movimentos_estoque),
+#             cujo gatilho baixa a quantidade; a inclusão só ocorre se houver
+#             quantidade suficiente, evitando a corrida entre vários terminais.
+# Com 'token' (chave de idempotência), repetir a chamada não registra a venda de novo.
+# Se o banco estiver ocupado (SQLITE_BUSY), tenta novamente até 'tentativas' vezes.
+# Quando a thread já está dentro de uma transação agrupada (conexao.em_grupo),
+# a venda usa um SAVEPOINT dentro dela e o commit fica a cargo do grupo.
+# ---------------------------------------------------------------------------
+def vender(serie, cpf, nome, data_nascimento, quantidade, data_compra=None, tentativas=5, token=None):
+    if not all([serie, cpf, nome, data_nascimento, quantidade]):
+        print("Erro: Todos os campos são obrigatórios.")
+        return "Erro: Dados obrigatórios não preenchidos."
+
+    if quantidade <= 0:
+        print("Erro: A quantidade deve ser positiva.")
+        return "Erro: Quantidade inválida."
+
+    if not data_compra:
+        data_compra = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+
+    return _com_tentativas(tentativas, _vender_transacao, serie, cpf, nome, data_nascimento, quantidade, data_compra, token)
+
+
+# ---------------------------------------------------------------------------
+# Função: cancelar_venda(id_venda, tentativas=5)
+# Descrição: Cancela a venda de id 'id_venda' de forma atômica: marca a venda
+# como cancelada (vendas.cancelada_em) e devolve ao estoque, com um movimento
+# de cancelamento na mesma transação, a série e a quantidade baixadas pelo
+# movimento da venda, mesmo que a venda tenha sido editada depois (uma venda
+# gravada sem baixa no estoque é cancelada sem devolução). O movimento usa
+# o token 'cancelamento:<id>', então cancelar de novo a mesma venda não devolve
+# a quantidade outra vez. Se o produto não existir mais no estoque, nada é alterado.
+# ---------------------------------------------------------------------------
+def cancelar_venda(id_venda, tentativas=5):
+    return _com_tentativas(tentativas, _cancelar_transacao, id_venda)
+
+
+# ---------------------------------------------------------------------------
+# Função: cancelar_vendas(ids_venda, tentativas=5)
+# Descrição: Cancela várias vendas em uma única transação (um commit só). Cada
+# venda é tratada como em cancelar_venda, dentro do seu SAVEPOINT, então uma
+# venda inexistente não impede as demais. Retorna a lista (id, mensagem).
+# ---------------------------------------------------------------------------
+def cancelar_vendas(ids_venda, tentativas=5):
+    return _com_tentativas(tentativas, _cancelar_lote, list(ids_venda))
+
+
+def _com_tentativas(tentativas, transacao, *args):
+    conn = conectar_venda()
+    for tentativa in range(tentativas):
+        try:
+            return transacao(conn, *args)
+        except sqlite3.OperationalError as e:
+            if em_grupo():
+                raise
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            time.sleep(random.uniform(0, 0.05 * 2 ** tentativa))
+    print("Erro: Banco de dados ocupado. Tente novamente.")
+    return "Erro: Banco de dados ocupado."
+
+
+def _vender_transacao(conn, serie, cpf, nome, data_nascimento, quantidade, data_compra, token):
+    agrupado = em_grupo()
+    conn.execute('SAVEPOINT venda' if agrupado else 'BEGIN IMMEDIATE')
+    if token is not None and conn.execute('SELECT 1 FROM est.movimentos_estoque WHERE token = ?', (token,)).fetchone():
+        _encerrar(conn, agrupado, sucesso=False)
+        print("Venda já registrada anteriormente.")
+        return "Venda já registrada anteriormente."
+
+    produto = conn.execute(
+        'SELECT tipo, marca, modelo, preco FROM est.estoque WHERE serie = ?', (serie,)).fetchone()
+    if not produto:
+        _encerrar(conn, agrupado, sucesso=False)
+        print("Erro: Produto não encontrado no estoque.")
+        return "Erro: Produto não encontrado no estoque."
+
+    tipo, marca, modelo, preco = produto
+    id_venda = inserir_venda(conn, cpf, nome, data_nascimento, serie, tipo, marca, modelo, data_compra, quantidade, preco)
+    baixado = conn.execute('''
+        INSERT INTO est.movimentos_estoque (token, tipo, serie, delta, id_venda)
+        SELECT ?, 'venda', serie, ?, ? FROM est.estoque WHERE serie = ? AND quantidade >= ?
+    ''', (token, -quantidade, id_venda, serie, quantidade)).rowcount
+    if not baixado:
+        _encerrar(conn, agrupado, sucesso=False)
+        print("Erro: Quantidade insuficiente no estoque.")
+        return "Erro: Quantidade insuficiente no estoque."
+
+    _encerrar(conn, agrupado, sucesso=True)
+    estoque_def.invalidar_cache(serie)
+    print("Venda realizada com sucesso!")
+    return "Venda realizada com sucesso!"
+
+
+def _cancelar_transacao(conn, id_venda):
+    agrupado = em_grupo()
+    conn.execute('SAVEPOINT venda' if agrupado else 'BEGIN IMMEDIATE')
+    venda = conn.execute('SELECT cancelada_em FROM vendas WHERE id = ?', (id_venda,)).fetchone()
+    if not venda:
+        _encerrar(conn, agrupado, sucesso=False)
+        print("Erro: Venda não encontrada.")
+        return "Erro: Venda não encontrada."
+
+    token = f'cancelamento:{id_venda}'
+    if venda[0] or conn.execute('SELECT 1 FROM est.movimentos_estoque WHERE token = ?', (token,)).fetchone():
+        _encerrar(conn, agrupado, sucesso=False)
+        print("Venda já cancelada anteriormente.")
+        return "Venda já cancelada anteriormente."
+
+    # Devolve o que a venda de fato baixou (o movimento gravado na venda), e não a
+    # série e a quantidade atuais da venda, que podem ter sido editadas depois
+    baixa = conn.execute('''
+        SELECT serie, -delta FROM est.movimentos_estoque WHERE id_venda = ? AND tipo = 'venda'
+    ''', (id_venda,)).fetchone()
+    serie, quantidade = baixa if baixa else (None, 0)
+    if baixa:
+        devolvido = conn.execute('''
+            INSERT INTO est.movimentos_estoque (token, tipo, serie, delta, id_venda)
+            SELECT ?, 'cancelamento', serie, ?, ? FROM est.estoque WHERE serie = ?
+        ''', (token, quantidade, id_venda, serie)).rowcount
+        if not devolvido:
+            _encerrar(conn, agrupado, sucesso=False)
+            print("Erro: Produto não encontrado no estoque.")
+            return "Erro: Produto não encontrado no estoque."
+
+    conn.execute('UPDATE vendas SET cancelada_em = ? WHERE id = ?',
+                 (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), id_venda))
+    _encerrar(conn, agrupado, sucesso=True)
+    if serie is not None:
+        estoque_def.invalidar_cache(serie)
+    print(f"Venda cancelada. {quantidade} unidades retornaram ao estoque.")
+    return "Venda cancelada com sucesso!"
+
+
+def _cancelar_lote(conn, ids_venda):
+    agrupado = em_grupo()
+    conn.execute('SAVEPOINT lote' if agrupado else 'BEGIN IMMEDIATE')
+    marcar_grupo(True)
+    try:
+        resultados = [(id_venda, _cancelar_transacao(conn, id_venda)) for id_venda in ids_venda]
+    finally:
+        marcar_grupo(agrupado)
+    conn.execute('RELEASE lote' if agrupado else 'COMMIT')
+    estoque_def.invalidar_cache()
+    return resultados
+
+
+def _encerrar(conn, agrupado, sucesso):
+    if agrupado:
+        if not sucesso:
+            conn.execute('ROLLBACK TO venda')
+        conn.execute('RELEASE venda')
+    else:
+        conn.execute('COMMIT' if sucesso else 'ROLLBACK')